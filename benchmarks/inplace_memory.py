@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直接書き込み (in-place) モードのメモリ使用量ベンチマーク
+小さな範囲の塗りつぶし・モザイクで、画像全体のコピーの有無によるピークメモリを比較する
+
+Pillowの画素データはPythonのメモリ管理の外で確保されるため、
+条件ごとに子プロセスを起動し、最大常駐メモリ (ru_maxrss) で比較する (Linux/macOS)
+
+使用方法:
+    python benchmarks/inplace_memory.py [--size 6000x4000]
+"""
+
+import sys
+import argparse
+import resource
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+# (ツール, 色) の組み合わせ
+CASES = [
+    ('paint', '#FF0000'),
+    ('paint', '#FF000080'),
+    ('mosaic', None),
+]
+AREA = (100, 100, 300, 200)
+
+
+def peak_rss_mb():
+    """このプロセスの最大常駐メモリ (MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux はKB単位、macOS はバイト単位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(tool_name, color, width, height, inplace):
+    """子プロセスで1条件だけ実行し、画像作成後と処理後の最大常駐メモリを表示"""
+    from tools.mosaic import MosaicTool
+    from tools.painter import PaintTool
+
+    # ツールの初期化 (NumPyの読み込みなど) は計測の前に済ませる
+    tool = PaintTool() if tool_name == 'paint' else MosaicTool()
+    image = Image.new('RGB', (width, height), (40, 80, 120))
+    before = peak_rss_mb()
+
+    if tool_name == 'paint':
+        result = tool.process(image, AREA, color, inplace=inplace)
+    else:
+        result = tool.process(image, AREA, 10, inplace=inplace)
+
+    print(f"{before:.1f} {peak_rss_mb():.1f} {result.mode} {int(result is image)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='直接書き込みモードのメモリ使用量ベンチマーク')
+    parser.add_argument('--size', default='6000x4000', help='画像サイズ (幅x高さ)')
+    parser.add_argument('--case', nargs=3, metavar=('TOOL', 'COLOR', 'INPLACE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    if args.case:
+        tool_name, color, inplace = args.case
+        run_case(tool_name, color, width, height, inplace == '1')
+        return 0
+
+    image_mb = width * height * 3 / (1024 * 1024)
+    print(f"画像サイズ: {width}x{height} (RGB {image_mb:.1f}MB) / 処理範囲: {AREA}")
+    print(f"{'処理':<18} {'in-place':>8} | {'増加量':>9} {'結果モード':>10} {'同一画像':>8}")
+    for tool_name, color in CASES:
+        label = f"{tool_name} {color}" if color else tool_name
+        for inplace in (False, True):
+            output = subprocess.run(
+                [sys.executable, __file__, '--size', args.size,
+                 '--case', tool_name, color or '-', '1' if inplace else '0'],
+                capture_output=True, text=True, check=True
+            ).stdout.split()
+            before, after, mode, same = float(output[0]), float(output[1]), output[2], output[3] == '1'
+            print(f"{label:<18} {'yes' if inplace else 'no':>8} | {after - before:>7.1f}MB "
+                  f"{mode:>10} {'yes' if same else 'no':>8}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
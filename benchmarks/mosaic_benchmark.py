@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+モザイク処理のベンチマーク - PIL (Image.reduce) と NumPy のブロック平均の比較
+
+使用方法:
+    python benchmarks/mosaic_benchmark.py [--size 6000x4000] [--repeat 5]
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+from tools.mosaic import MosaicTool
+
+REGION_SIZES = [(50, 50), (200, 200), (1000, 1000), (3000, 2000)]
+STRENGTHS = [5, 10, 25, 50]
+
+
+def measure(tool, image, area, strength, repeat, inplace):
+    """処理時間の最小値 (ミリ秒) を返す"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tool.process(image, area, strength, inplace=inplace)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='モザイク処理のベンチマーク')
+    parser.add_argument('--size', default='6000x4000', help='画像サイズ (幅x高さ)')
+    parser.add_argument('--repeat', type=int, default=5, help='各条件の繰り返し回数')
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    image = Image.effect_noise((width, height), 64).convert('RGB')
+
+    numpy_tool = MosaicTool(engine='numpy')
+    pil_tool = MosaicTool(engine='pil')
+    if numpy_tool.engine != 'numpy':
+        print("NumPyがインストールされていないため比較できません")
+        return 1
+
+    print(f"画像サイズ: {width}x{height} / 繰り返し: {args.repeat}回 (最小値)")
+    print(f"{'領域':>11} {'強度':>4} | {'PIL':>9} {'NumPy':>9} {'NumPy(in-place)':>16}")
+    for region_width, region_height in REGION_SIZES:
+        area = (10, 10, 10 + region_width, 10 + region_height)
+        for strength in STRENGTHS:
+            pil_ms = measure(pil_tool, image, area, strength, args.repeat, inplace=False)
+            numpy_ms = measure(numpy_tool, image, area, strength, args.repeat, inplace=False)
+            inplace_ms = measure(numpy_tool, image.copy(), area, strength, args.repeat, inplace=True)
+            print(f"{region_width:>5}x{region_height:<5} {strength:>4} | "
+                  f"{pil_ms:>7.1f}ms {numpy_ms:>7.1f}ms {inplace_ms:>14.1f}ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
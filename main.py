@@ -5,53 +5,151 @@
 QuickSnap - クイック画像加工ツール
 """
 
+import time
+
+# 起動時間の計測開始 (ほかのモジュールの読み込みより前)
+STARTUP_TIME = time.perf_counter()
+
 import os
 import sys
 import json
+import queue
 import traceback
+import multiprocessing
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 
 # アプリケーションのルートパスを設定
 ROOT_DIR = Path(__file__).parent
 TOOLS_DIR = ROOT_DIR / "tools"
 UI_DIR = ROOT_DIR / "ui"
 SETTINGS_FILE = ROOT_DIR / "settings.json"
+CACHE_DIR = ROOT_DIR / "cache"
+LOG_DIR = ROOT_DIR / "logs"
+INSTANCE_KEY_FILE = CACHE_DIR / "instance.key"
 
 # パスをシステムパスに追加
 sys.path.insert(0, str(ROOT_DIR))
 
-# UIとツールモジュールをインポート
-from ui.quick_ui import QuickEditorGUI
+# ツールモジュールをインポート (UIはバッチモードで不要なためGUI起動時に読み込む)
+# rembg・NumPy などの重いライブラリは各ツールが最初に使うときに読み込むため、ここでは読み込まれない
 from tools.io_utils import ImageIO
+from tools.encoder import parse_save_setting
 from tools.bg_remover import BackgroundRemover
+from tools.result_cache import ResultCache
+from tools.save_queue import SaveQueue
 from tools.mosaic import MosaicTool
 from tools.painter import PaintTool
 from tools.trimmer import TrimTool
+from tools.history import EditHistory
+from tools.operations import ToolSet
+from tools.edit_session import EditSession, EXPENSIVE_OPERATIONS, changed_box
+from tools.geometry import clip_box
+from tools.latency import LatencyRecorder
+from tools.startup import loaded_heavy_modules
+from tools.instance import InstanceServer, instance_address, send_to_instance, stream_replies
+
+# モジュールの読み込み完了
+IMPORTED_TIME = time.perf_counter()
 
 class QuickImageEditor:
     """QuickSnapアプリケーションのメインクラス"""
 
-    def __init__(self):
-        """初期化"""
+    def __init__(self, resident=None, startup_command=None):
+        """
+        初期化
+
+        Args:
+            resident: 常駐モードにするか (None の場合は設定の resident に従う)
+            startup_command: ウィンドウ表示後に実行するコマンド (parse_launch_args() の戻り値)
+        """
         # 設定をロード
         self.settings = self._load_settings()
 
+        # 常駐モード: ウィンドウを閉じてもプロセスを残し、後から起動したプロセスのコマンドを受け付ける
+        self.resident = self.settings.get("resident", False) if resident is None else resident
+
+        # 保存形式とプロファイル (例: "png:fast")
+        self.save_extension, save_profile = parse_save_setting(self.settings.get("default_save_format", "png"))
+
         # 各ツールの初期化
-        self.image_io = ImageIO()
-        self.bg_remover = BackgroundRemover()
+        self.image_io = ImageIO(
+            save_profile=save_profile,
+            save_workers=self.settings.get("save_workers", 1)
+        )
+        self.bg_cache = ResultCache(
+            max_bytes=self.settings.get("bg_cache_mb", 256) * 1024 * 1024,
+            disk_dir=CACHE_DIR / "bg_remove" if self.settings.get("bg_cache_disk", True) else None
+        )
+        self.bg_remover = BackgroundRemover(
+            model_name=self.settings.get("bg_model", "u2net"),
+            intra_op_threads=self.settings.get("bg_intra_op_threads"),
+            inter_op_threads=self.settings.get("bg_inter_op_threads"),
+            prewarm=False,  # 起動を遅くしないよう、ウィンドウ表示後に事前読み込みを開始する
+            cache=self.bg_cache
+        )
         self.mosaic_tool = MosaicTool()
+        self.preview_mosaic_tool = MosaicTool()  # 表示解像度でのプレビュー用
+        self.session_tools = ToolSet(bg_remover=self.bg_remover)  # 編集セッションの再計算用
         self.paint_tool = PaintTool()
         self.trim_tool = TrimTool()
 
+        # 元に戻す・やり直しの履歴 (変更領域のみ記録)
+        self.history = EditHistory(
+            max_bytes=self.settings.get("undo_budget_mb", 64) * 1024 * 1024,
+            max_steps=self.settings.get("undo_max_steps", 100)
+        )
+
+        # レイテンシ計測 (無効の場合もメニューの「レイテンシ表示」で有効にできる)
+        self.profiler = LatencyRecorder(
+            capacity=self.settings.get("profiling_samples", 1000),
+            enabled=self.settings.get("profiling", False)
+        )
+
         # GUIの初期化
-        self.gui = QuickEditorGUI(self._handle_events)
+        from ui.quick_ui import QuickEditorGUI
+        self.gui = QuickEditorGUI(self._handle_events, profiler=self.profiler, resident=self.resident)
 
         # 現在の画像とモード
         self.current_image = None
         self.original_image = None
+        self.edit_session = None  # 元画像に適用した操作の記録
         self.current_mode = None
         self.selection_area = None
 
+        # 重い処理はワーカースレッドで実行し、イベントループを止めない
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quicksnap-worker")
+        self.image_version = 0  # 画像が変更されるたびに増える (古い処理結果の判定用)
+        self._job_counter = 0
+        self._active_job = None  # (ジョブID, 開始時の画像バージョン, 完了時の処理)
+        self._running_jobs = 0   # ワーカースレッドで実行中の処理の数 (キャンセル済みも含む)
+
+        # 保存は専用のワーカースレッドで行い、編集を止めない
+        self.save_queue = SaveQueue(
+            self.image_io,
+            on_done=lambda *result: self.gui.post_event("保存完了", result)
+        )
+
+        # プレビューのみ表示し、元画像への適用を保留しているモザイク強度
+        self._pending_mosaic_strength = None
+
+        # 起動時間 (モジュールの読み込み・ウィンドウ表示まで、秒)
+        self.startup_stats = None
+        self._startup_command = startup_command
+
+        # 常駐モードのコマンド受付 (ほかのプロセスが常駐している場合は受け付けない)
+        self.instance_server = None
+        self._batch_executor = None  # 転送されたバッチ処理用のスレッド
+        self._remote_batches = 0     # 実行中・実行待ちの転送されたバッチ処理の数
+        if self.resident:
+            self.instance_server = InstanceServer(
+                instance_address(ROOT_DIR), INSTANCE_KEY_FILE, handler=self._accept_remote_command
+            )
+            if not self.instance_server.start():
+                print("ほかのQuickSnapが常駐しているため、このプロセスは常駐しません")
+                self.instance_server = None
+
     def run(self):
         """アプリケーションの実行"""
         try:
@@ -62,12 +160,30 @@ class QuickImageEditor:
             self.gui.show_error(error_msg)
             print(error_msg)
         finally:
+            # 常駐モードのコマンド受付を終了
+            if self.instance_server is not None:
+                self.instance_server.close()
+            # 転送されたバッチ処理は実行中のものだけ終えてから終了
+            if self._batch_executor is not None:
+                if self._remote_batches:
+                    print("実行中のバッチ処理を終えてから終了します...")
+                self._batch_executor.shutdown(wait=True, cancel_futures=True)
+            # 実行中の処理は待たずに終了
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            # 保存待ちの画像は書き込みを終えてから終了
+            if self.save_queue.pending_count():
+                print("保存待ちの画像を書き込んでいます...")
+            self.save_queue.shutdown(wait=True)
             # 設定を保存
             self._save_settings()
 
     def _handle_events(self, event, values):
         """GUIイベントハンドラー"""
         try:
+            # 他の操作の前に、保留中の元画像への適用を済ませておく
+            if self._has_pending_render() and event not in ("モザイク強度", "アイドル"):
+                self._flush_pending_render()
+
             # ファイル読み込み関連イベント
             if event == "開く":
                 self._load_image_from_file()
@@ -96,6 +212,12 @@ class QuickImageEditor:
             elif event == "垂直反転":
                 self._flip_image("vertical")
 
+            # 元に戻す・やり直し
+            elif event == "元に戻す":
+                self._undo()
+            elif event == "やり直し":
+                self._redo()
+
             # 保存関連
             elif event == "保存":
                 self._save_image()
@@ -114,7 +236,29 @@ class QuickImageEditor:
             elif event == "モザイク強度":
                 if self.current_mode == "mosaic" and self.selection_area:
                     strength = values.get("モザイク強度", 10)
-                    self._apply_mosaic(strength)
+                    self._preview_mosaic(strength)
+
+            # ウィンドウ表示完了 (起動時間を記録し、重い処理の準備を始める)
+            elif event == "ウィンドウ表示":
+                self._on_window_shown()
+
+            # 常駐モード: 閉じるボタンではウィンドウを隠すだけにする
+            elif event == "ウィンドウを閉じる":
+                if self.instance_server is None:
+                    return False
+                self.gui.hide_window()
+
+            # 後から起動したプロセスから転送されたコマンド
+            elif event == "転送コマンド":
+                return self._run_command(values["転送コマンド"])
+            elif event == "バッチ完了":
+                self._on_remote_batch_done(values["バッチ完了"])
+
+            # 操作が落ち着いたら保留中の処理を元画像に適用
+            elif event == "アイドル":
+                if self._has_pending_render():
+                    self._flush_pending_render()
+                self._release_idle_model()
 
             # 色選択
             elif event == "色選択":
@@ -122,6 +266,18 @@ class QuickImageEditor:
                     color = values.get("色選択")
                     self.paint_tool.set_color(color)
 
+            # ワーカースレッドの処理完了・キャンセル
+            elif event == "非同期処理完了":
+                self._on_background_done(*values["非同期処理完了"])
+            elif event == "キャンセル":
+                self._cancel_background()
+            elif event == "保存完了":
+                self._on_save_done(*values["保存完了"])
+
+            # レイテンシの記録をJSONに書き出し
+            elif event == "レイテンシを保存":
+                self._dump_latency()
+
             # 終了イベント
             elif event in (None, "終了"):
                 return False
@@ -137,33 +293,265 @@ class QuickImageEditor:
         """ファイル選択から画像を読み込む"""
         file_path = self.gui.get_file_path()
         if file_path:
-            image = self.image_io.load_from_file(file_path)
-            if image:
-                self._set_current_image(image)
-                self.settings["last_directory"] = os.path.dirname(file_path)
+            self._open_image_file(file_path)
 
     def _load_image_from_clipboard(self):
         """クリップボードから画像を読み込む"""
-        image = self.image_io.load_from_clipboard()
+        image = self.image_io.load_from_clipboard(tk_root=self.gui.get_tk_root())
         if image:
             self._set_current_image(image)
+            self.gui.show_info(f"クリップボードから読み込みました: {image.width}x{image.height} "
+                               f"({self.image_io.format_paste_stats()})")
 
     def _load_image_from_drop(self, file_path):
         """ドラッグ&ドロップから画像を読み込む"""
         if file_path and os.path.isfile(file_path):
-            image = self.image_io.load_from_file(file_path)
-            if image:
-                self._set_current_image(image)
-                self.settings["last_directory"] = os.path.dirname(file_path)
+            self._open_image_file(file_path)
+
+    def _open_image_file(self, file_path):
+        """
+        画像ファイルを開く
+        縮小デコードしたプレビューを先に表示してから、フル解像度で読み込む
+        """
+        lazy_image = self.image_io.open_lazy(file_path)
+        if lazy_image is None:
+            return
+
+        preview = lazy_image.preview(self.gui.image_display_size)
+        self.gui.show_preview(preview)
+        self.gui.show_processing("画像を読み込み中...")
+
+        try:
+            image = lazy_image.load()
+        except Exception as e:
+            self.gui.hide_processing("画像を読み込めませんでした")
+            raise
+
+        self._set_current_image(image, proxy=preview)
+        self.settings["last_directory"] = os.path.dirname(file_path)
+        self.gui.hide_processing(
+            self.image_io.report_load_timings(lazy_image) or f'画像サイズ: {image.width}x{image.height} ピクセル'
+        )
 
-    def _set_current_image(self, image):
+    def _set_current_image(self, image, proxy=None):
         """現在の画像を設定し、GUIを更新"""
         self.current_image = image
         self.original_image = image.copy()
-        self.gui.update_image(image)
+        self.edit_session = EditSession(
+            self.original_image, self.session_tools,
+            max_cache_bytes=self.settings.get("session_cache_mb", 256) * 1024 * 1024
+        )
+        self.image_version += 1
+        self.history.clear()
+        self.mosaic_tool.clear_source()
+        self.gui.update_image(image, proxy=proxy)
         self.current_mode = None
         self.selection_area = None
 
+    def _update_current_image(self, image, changed_box=None):
+        """
+        編集結果を現在の画像に反映し、GUIを更新
+
+        Args:
+            image: 編集後の PIL.Image オブジェクト
+            changed_box: 変更された矩形 (指定時はその範囲だけ再描画する)
+        """
+        self.current_image = image
+        self.image_version += 1
+        if changed_box:
+            self.gui.update_region(image, changed_box)
+        else:
+            # 編集中は高速な縮小で表示し、操作が落ち着いたら高品質な縮小で作り直す
+            self.gui.update_image(image, interactive=True)
+
+    def _run_in_background(self, message, func, on_done, *args):
+        """
+        処理をワーカースレッドで実行
+
+        完了時は write_event_value 経由でイベントループに通知され、
+        その時点で画像が変更されていなければ on_done(結果) が呼ばれる
+
+        Args:
+            message: 処理中に表示するメッセージ
+            func: ワーカースレッドで実行する関数
+            on_done: 結果を受け取る関数 (イベントループのスレッドで呼ばれる)
+            args: func に渡す引数
+        """
+        self._job_counter += 1
+        job_id = self._job_counter
+        self._active_job = (job_id, self.image_version, on_done)
+        self._running_jobs += 1
+        self.gui.show_processing(message, cancellable=True)
+
+        future = self.executor.submit(self._timed, getattr(func, "__name__", "tool"), func, *args)
+        future.add_done_callback(
+            lambda f: self.gui.post_event("非同期処理完了", (job_id, f))
+        )
+
+    def _on_window_shown(self):
+        """ウィンドウ表示後の処理 (起動時間の記録と背景透過モデルの事前読み込み)"""
+        self.startup_stats = {
+            "import_seconds": IMPORTED_TIME - STARTUP_TIME,
+            "window_seconds": time.perf_counter() - STARTUP_TIME,
+            "heavy_modules": loaded_heavy_modules()
+        }
+        print(f"起動完了: ウィンドウ表示まで {self.startup_stats['window_seconds']:.2f}秒 "
+              f"(モジュールの読み込み {self.startup_stats['import_seconds']:.2f}秒)")
+
+        # モデルの読み込み (rembg・onnxruntime) はウィンドウ表示後にバックグラウンドで行う
+        self._prewarm_model()
+
+        # 起動時の引数で指定されたファイルを開く・貼り付ける
+        if self._startup_command is not None:
+            command, self._startup_command = self._startup_command, None
+            self._run_command(command)
+
+    def _prewarm_model(self):
+        """背景透過モデルが読み込まれていなければ、バックグラウンドで読み込んでおく"""
+        if self.settings.get("bg_prewarm", True) and self.bg_remover.is_ready() and self.bg_remover.session is None:
+            self.bg_remover.prewarm()
+
+    def _accept_remote_command(self, message):
+        """
+        後から起動したプロセスのコマンドを受け付ける (受付スレッドで呼ばれ、実行はイベントループで行う)
+
+        Returns:
+            送り元のプロセスに返す応答 (バッチ処理は進捗と終了コードを順に返すジェネレーター)
+        """
+        if message["command"] == "batch":
+            replies = queue.Queue()
+            self.gui.post_event("転送コマンド", dict(message, replies=replies))
+            return stream_replies(replies)
+        self.gui.post_event("転送コマンド", message)
+        return {"ok": True, "message": "常駐中のQuickSnapに送りました"}
+
+    def _run_command(self, message):
+        """
+        起動時の引数・転送されたコマンドを実行
+
+        Args:
+            message: {'command', 'args', 'cwd'} の辞書
+
+        Returns:
+            イベントループを続ける場合は True ('quit' の場合は False)
+        """
+        command, args = message["command"], message.get("args") or []
+        if command == "quit":
+            return False
+
+        # アイドル時に解放したモデルは次の操作に備えて読み込み直す
+        self._prewarm_model()
+
+        if command == "batch":
+            self._run_remote_batch(args, message.get("cwd"), message.get("replies"))
+            return True
+
+        self.gui.show_window()
+        if command == "open" and args:
+            self._open_image_file(args[0])
+        elif command == "paste":
+            self._load_image_from_clipboard()
+        return True
+
+    def _run_remote_batch(self, argv, cwd, replies=None):
+        """
+        転送されたバッチ処理を、読み込み済みの背景透過モデルを使って専用のスレッドで実行
+
+        Args:
+            argv: バッチ処理の引数
+            cwd: 転送元のプロセスの作業フォルダ
+            replies: 進捗 {'output'} と最後の応答 {'ok', 'message', 'exit_code'} を入れるキュー
+                     (転送元のプロセスに送られる)
+        """
+        from tools.batch import main as batch_main
+        if self._batch_executor is None:
+            self._batch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quicksnap-batch")
+        self._remote_batches += 1
+        print(f"転送されたバッチ処理を開始します: {' '.join(argv)}")
+        output = print if replies is None else (lambda line: replies.put({"output": line}))
+
+        def on_done(future):
+            self.gui.post_event("バッチ完了", future)
+            if replies is not None:
+                replies.put(self._batch_reply(future))
+
+        future = self._batch_executor.submit(batch_main, argv, ToolSet(bg_remover=self.bg_remover), cwd, output)
+        future.add_done_callback(on_done)
+
+    @staticmethod
+    def _batch_reply(future):
+        """転送されたバッチ処理の結果を転送元のプロセスへの応答にする"""
+        try:
+            exit_code = future.result()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 2
+        except Exception as e:
+            return {"ok": False, "message": f"バッチ処理でエラーが発生しました: {str(e)}", "exit_code": 1}
+        return {"ok": exit_code == 0, "message": "", "exit_code": exit_code}
+
+    def _on_remote_batch_done(self, future):
+        """転送されたバッチ処理の完了時の処理"""
+        self._remote_batches -= 1
+        try:
+            print(f"転送されたバッチ処理が終了しました (終了コード {future.result()})")
+        except (Exception, SystemExit) as e:
+            print(f"転送されたバッチ処理でエラーが発生しました: {str(e)}")
+
+    def _release_idle_model(self):
+        """常駐モードで一定時間操作がない場合は背景透過モデルを解放してメモリを返す"""
+        idle_minutes = self.settings.get("resident_idle_minutes", 10)
+        if self.instance_server is None or not idle_minutes or self._running_jobs or self._remote_batches:
+            return
+        if time.monotonic() - self.gui.last_event_time >= idle_minutes * 60:
+            self.bg_remover.release()
+
+    def _timed(self, label, func, *args):
+        """ツールの処理時間を label として記録しながら func(*args) を実行"""
+        start = self.profiler.start()
+        try:
+            return func(*args)
+        finally:
+            self.profiler.stop("tool", start, label)
+
+    def _dump_latency(self):
+        """レイテンシの記録を logs フォルダにJSONで書き出す"""
+        file_path = LOG_DIR / f"latency_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        if self.profiler.dump(file_path):
+            self.gui.show_info(f"レイテンシの記録を保存しました:\n{file_path}")
+        else:
+            self.gui.show_error("レイテンシの記録を保存できませんでした")
+
+    def _on_background_done(self, job_id, future):
+        """ワーカースレッドの処理完了時の処理"""
+        self._running_jobs -= 1
+
+        # キャンセル済み、または後から別の処理が開始された場合は破棄
+        if not self._active_job or self._active_job[0] != job_id:
+            return
+
+        _, version, on_done = self._active_job
+        self._active_job = None
+
+        # 処理中に画像が変更された場合は古い結果として破棄
+        if version != self.image_version:
+            self.gui.hide_processing("画像が変更されたため処理結果を破棄しました")
+            return
+
+        try:
+            result = future.result()
+        except Exception as e:
+            self.gui.hide_processing("処理に失敗しました")
+            raise
+
+        self.gui.hide_processing()
+        on_done(result)
+
+    def _cancel_background(self):
+        """実行中の処理をキャンセル (結果は破棄される)"""
+        if self._active_job:
+            self._active_job = None
+            self.gui.hide_processing("キャンセルしました")
+
     def _set_mode(self, mode):
         """編集モードを設定"""
         self.current_mode = mode
@@ -174,11 +562,21 @@ class QuickImageEditor:
     def _process_bg_remove(self):
         """背景透過処理を適用"""
         if self.current_image:
-            self.gui.show_processing("背景透過処理中...")
-            result = self.bg_remover.process(self.current_image)
-            self.current_image = result
-            self.gui.update_image(result)
-            self.gui.hide_processing()
+            self._run_in_background(
+                "背景透過処理中...",
+                self.bg_remover.process,
+                self._on_bg_removed,
+                self.current_image
+            )
+
+    def _on_bg_removed(self, result):
+        """背景透過の完了時の処理"""
+        if result is not self.current_image:
+            operation = ("bg_remove", {"model": self.bg_remover.model_name})
+            self._commit_operation(
+                operation, result,
+                self.history.record_full(self.current_image, "背景透過", **self._session_hooks(operation))
+            )
 
     def _process_selection(self, start_pos, end_pos):
         """選択領域に対する処理を実行"""
@@ -203,71 +601,270 @@ class QuickImageEditor:
         elif self.current_mode == "trim":
             self._apply_trim(area)
 
-    def _apply_mosaic(self, strength, area=None):
+    def _session_hooks(self, operation):
+        """操作の追加を元に戻す・やり直すときに編集セッションを同期させる関数"""
+        session = self.edit_session
+        return {
+            "on_undo": session.pop,
+            "on_redo": lambda: session.append(operation),
+        }
+
+    def _can_edit_inplace(self):
+        """
+        現在の画像に直接書き込んでよいか
+
+        ワーカースレッドが画像を読んでいる間と、重い操作 (背景透過) の出力を
+        メモ化から消してしまう場合は書き込まない
+        """
+        if self._running_jobs or not self.edit_session:
+            return False
+        operations = self.edit_session.operations
+        return not operations or operations[-1][0] not in EXPENSIVE_OPERATIONS
+
+    def _edit_region(self, label, box, apply, hooks, tool):
+        """
+        矩形領域を変更する編集を実行し、変更前の画素を履歴に記録
+
+        直接書き込める場合は先に変更前の画素を取っておき、
+        画像全体をコピーせずに現在の画像を書き換える
+        履歴に追加するのは編集が成功して画素が変わった場合だけ (失敗・透明色の塗りつぶしなどは記録しない)
+
+        Args:
+            label: 履歴の操作名
+            box: 変更される矩形
+            apply: apply(画像, inplace) で編集後の画像を返す関数
+            hooks: 履歴の on_undo / on_redo
+            tool: 編集に使うツール (last_changed_box が None の場合は変更なしとして扱う)
+
+        Returns:
+            (編集後の PIL.Image オブジェクト, 履歴に記録されたか)
+        """
+        if box and self._can_edit_inplace():
+            step = self.history.capture_region(self.current_image, box, label)
+            result = self._timed(label, apply, self.current_image, True)
+        else:
+            step = None
+            result = self._timed(label, apply, self.current_image, False)
+
+        if tool.last_changed_box is None:
+            return result, False
+        if step is None:
+            step = self.history.capture_region(self.current_image, box, label)
+        return result, self.history.record_captured(step, **hooks)
+
+    def _commit_operation(self, operation, result, recorded, changed_box=None):
+        """
+        操作の結果を確定し、編集セッションに記録して表示を更新
+
+        Args:
+            operation: (操作名, パラメータ辞書)
+            result: 操作後の PIL.Image オブジェクト
+            recorded: 履歴に記録されたか (変更がなく記録されなかった場合は何もしない)
+            changed_box: 変更された矩形
+        """
+        if recorded:
+            self.edit_session.append(operation, result)
+            self._update_current_image(result, changed_box)
+
+    def _apply_mosaic(self, strength, area):
         """モザイク処理を適用"""
         if self.current_image:
-            if area:
-                result = self.mosaic_tool.process(self.current_image, area, strength)
-            else:
-                # 以前の選択領域に新しい強度を適用
-                result = self.mosaic_tool.process(
-                    self.current_image,
-                    self.mosaic_tool.last_area,
-                    strength
-                )
-            self.current_image = result
-            self.gui.update_image(result)
+            operation = ("mosaic", {"area": area, "strength": strength})
+            box = self.mosaic_tool.target_box(self.current_image, area)
+            result, recorded = self._edit_region(
+                "モザイク", box,
+                lambda image, inplace: self.mosaic_tool.process(image, area, strength, inplace=inplace),
+                self._session_hooks(operation), self.mosaic_tool
+            )
+            self._commit_operation(operation, result, recorded, box)
+
+    def _update_mosaic_strength(self, strength):
+        """
+        最後のモザイク操作の強度を変更
+        記録済みの操作のうち、そのモザイク以降だけを再計算する
+        """
+        index = self.edit_session.find_last("mosaic")
+        if not self.current_image or index is None:
+            return
+
+        session = self.edit_session
+        params = session.get_params(index)
+        if params.get("strength") == strength:
+            return
+        area = params["area"]
+        new_params = dict(params, strength=strength)
+        hooks = {
+            "on_undo": lambda: session.update(index, **params),
+            "on_redo": lambda: session.update(index, **new_params),
+        }
+
+        # 最後の操作なら、モザイク前の領域から再計算する (重ね掛けせず、領域だけを処理)
+        if index == len(session.operations) - 1 and self.mosaic_tool.has_source(self.current_image, area):
+            box = self.mosaic_tool.target_box(self.current_image, area)
+            result, recorded = self._edit_region(
+                "モザイク強度", box,
+                lambda image, inplace: self.mosaic_tool.reapply(image, area, strength, inplace=inplace),
+                hooks, self.mosaic_tool
+            )
+            if recorded:
+                session.update(index, output=result, strength=strength)
+        else:
+            session.update(index, strength=strength)
+            result = session.render()
+            box = changed_box(self.current_image, result)
+            recorded = self.history.record_region(self.current_image, box, "モザイク強度", **hooks)
+
+        if recorded:
+            self._update_current_image(result, box)
+
+    def _preview_mosaic(self, strength):
+        """
+        モザイク強度の変更を表示解像度の画像で即時プレビュー
+        元画像への適用はアイドル時または次の操作の前まで保留する
+        """
+        index = self.edit_session.find_last("mosaic") if self.edit_session else None
+        if index is None:
+            return
+
+        self._pending_mosaic_strength = strength
+
+        # 最後の操作でない場合 (後から回転した場合など) は表示と座標が一致しないため、
+        # プレビューせずにアイドル時の再計算に任せる
+        proxy, scale = self.gui.get_proxy()
+        if proxy is None or index != len(self.edit_session.operations) - 1:
+            return
+
+        # モザイク適用前の画素がなければプレビューできない (重ね掛けになるため)
+        area = self.edit_session.get_params(index)["area"]
+        source_region = self.mosaic_tool.get_source_region(self.current_image, area)
+        source = self.edit_session.get_input(index)
+        box = clip_box(area, self.current_image.size)
+        if (source_region is None and source is None) or box is None:
+            return
+
+        # 領域とブロックの大きさを表示解像度に合わせる
+        px1, py1 = int(box[0] * scale), int(box[1] * scale)
+        px2, py2 = max(px1 + 1, int(box[2] * scale)), max(py1 + 1, int(box[3] * scale))
+        block_size = max(1, int(50 / strength)) * scale
+        preview_strength = max(1, min(50, 50 / block_size))
+
+        # モザイク適用前の領域を表示解像度で切り出してモザイクをかけ、プロキシに貼り付ける
+        if source_region is not None:
+            region = source_region.resize((px2 - px1, py2 - py1), Image.BILINEAR)
+        else:
+            region = source.resize((px2 - px1, py2 - py1), Image.BILINEAR, box=box)
+        region = self.preview_mosaic_tool.process(region, (0, 0) + region.size, preview_strength)
+        proxy.paste(region, (px1, py1))
+        self.gui.show_preview(proxy)
+
+    def _has_pending_render(self):
+        """プレビューだけで元画像に適用していない編集があるか"""
+        return self._pending_mosaic_strength is not None
+
+    def _flush_pending_render(self):
+        """プレビューのみの編集を元画像に適用"""
+        if self._pending_mosaic_strength is not None:
+            strength = self._pending_mosaic_strength
+            self._pending_mosaic_strength = None
+            self._update_mosaic_strength(strength)
 
     def _apply_paint(self, area):
         """塗りつぶし処理を適用"""
         if self.current_image:
             color = self.paint_tool.get_color()
-            result = self.paint_tool.process(self.current_image, area, color)
-            self.current_image = result
-            self.gui.update_image(result)
+            operation = ("paint", {"area": area, "color": color})
+            box = self.paint_tool.target_box(self.current_image, area)
+            result, recorded = self._edit_region(
+                "塗りつぶし", box,
+                lambda image, inplace: self.paint_tool.process(image, area, color, inplace=inplace),
+                self._session_hooks(operation), self.paint_tool
+            )
+            self._commit_operation(operation, result, recorded, box)
 
     def _apply_trim(self, area):
         """トリミング処理を適用"""
         if self.current_image:
             result = self.trim_tool.process(self.current_image, area)
-            self.current_image = result
-            self.gui.update_image(result)
+            operation = ("trim", {"area": area})
+            self._commit_operation(
+                operation, result,
+                self.history.record_crop(self.current_image, self.trim_tool.last_crop_box, "トリミング",
+                                         **self._session_hooks(operation))
+            )
 
     def _rotate_image(self, angle):
         """画像を回転"""
         if self.current_image:
-            from PIL import Image
-            rotated = self.current_image.rotate(angle, expand=True)
-            self.current_image = rotated
-            self.gui.update_image(rotated)
+            # 90度単位の回転は transpose で行い、履歴には変換の種類だけを記録
+            method = Image.ROTATE_90 if angle == 90 else Image.ROTATE_270
+            rotated = self.current_image.transpose(method)
+            operation = ("rotate", {"angle": angle})
+            self._commit_operation(
+                operation, rotated,
+                self.history.record_transpose(method, "回転", **self._session_hooks(operation))
+            )
 
     def _flip_image(self, direction):
         """画像を反転"""
         if self.current_image:
-            from PIL import Image
             if direction == "horizontal":
-                flipped = self.current_image.transpose(Image.FLIP_LEFT_RIGHT)
+                method = Image.FLIP_LEFT_RIGHT
+            else:
+                method = Image.FLIP_TOP_BOTTOM
+            flipped = self.current_image.transpose(method)
+            operation = ("flip", {"direction": direction})
+            self._commit_operation(
+                operation, flipped,
+                self.history.record_transpose(method, "反転", **self._session_hooks(operation))
+            )
+
+    def _undo(self):
+        """直前の操作を元に戻す"""
+        if self.current_image:
+            restored = self.history.undo(self.current_image)
+            if restored:
+                # 保持しているモザイク前の画素は現在の画像と対応しなくなる
+                self.mosaic_tool.clear_source()
+                self._update_current_image(*restored)
+            else:
+                self.gui.show_info("元に戻せる操作はありません")
+
+    def _redo(self):
+        """元に戻した操作をやり直す"""
+        if self.current_image:
+            restored = self.history.redo(self.current_image)
+            if restored:
+                # 保持しているモザイク前の画素は現在の画像と対応しなくなる
+                self.mosaic_tool.clear_source()
+                self._update_current_image(*restored)
             else:
-                flipped = self.current_image.transpose(Image.FLIP_TOP_BOTTOM)
-            self.current_image = flipped
-            self.gui.update_image(flipped)
+                self.gui.show_info("やり直せる操作はありません")
 
     def _save_image(self):
         """画像をファイルに保存"""
         if self.current_image:
             file_path = self.gui.get_save_path(
-                initial_dir=self.settings.get("last_directory", "")
+                initial_dir=self.settings.get("last_directory", ""),
+                default_extension=self.save_extension
             )
             if file_path:
-                success = self.image_io.save_to_file(self.current_image, file_path)
-                if success:
-                    self.gui.show_info(f"画像を保存しました: {file_path}")
-                    self.settings["last_directory"] = os.path.dirname(file_path)
+                # 画像の複製を渡してワーカースレッドで保存し、すぐに編集に戻る
+                pending = self.save_queue.submit(self.current_image, file_path)
+                self.settings["last_directory"] = os.path.dirname(file_path)
+                waiting = f" (待機中 {pending - 1}件)" if pending > 1 else ""
+                self.gui.show_info(f"保存中: {os.path.basename(file_path)}{waiting}")
+
+    def _on_save_done(self, file_path, success, message):
+        """ワーカースレッドでの保存完了時の処理"""
+        if success:
+            self.gui.show_info(f"画像を保存しました: {file_path} ({message})")
+        else:
+            self.gui.show_info(f"保存に失敗しました: {file_path} ({message})")
 
     def _copy_to_clipboard(self):
         """画像をクリップボードにコピー"""
         if self.current_image:
-            success = self.image_io.copy_to_clipboard(self.current_image)
+            success = self.image_io.copy_to_clipboard(self.current_image, version=self.image_version)
             if success:
                 self.gui.show_info("画像をクリップボードにコピーしました")
 
@@ -275,8 +872,22 @@ class QuickImageEditor:
         """設定をJSONファイルから読み込む"""
         default_settings = {
             "last_directory": "",
-            "default_save_format": "png",
-            "window_size": (800, 600)
+            "default_save_format": "png:balanced",
+            "save_workers": 1,
+            "window_size": (800, 600),
+            "bg_model": "u2net",
+            "bg_intra_op_threads": None,
+            "bg_inter_op_threads": None,
+            "bg_prewarm": True,
+            "bg_cache_mb": 256,
+            "bg_cache_disk": True,
+            "undo_budget_mb": 64,
+            "undo_max_steps": 100,
+            "session_cache_mb": 256,
+            "profiling": False,
+            "profiling_samples": 1000,
+            "resident": False,
+            "resident_idle_minutes": 10
         }
 
         if os.path.exists(SETTINGS_FILE):
@@ -296,11 +907,101 @@ class QuickImageEditor:
         except Exception as e:
             print(f"設定保存エラー: {e}")
 
+def parse_launch_args(argv):
+    """
+    起動時の引数をコマンドに変換
+
+    python main.py [画像ファイル] [--paste] [--resident] [--new-instance] [--quit]
+    python main.py batch ...
+
+    Args:
+        argv: コマンドライン引数 (sys.argv[1:])
+
+    Returns:
+        ({'command', 'args', 'cwd'} の辞書, 常駐モードの指定 (True または None), 転送せずに起動するか) のタプル
+    """
+    cwd = os.getcwd()
+    if argv and argv[0] == "batch":
+        return {"command": "batch", "args": argv[1:], "cwd": cwd}, None, "--new-instance" in argv
+
+    files = [os.path.abspath(arg) for arg in argv if not arg.startswith("--")]
+    if "--quit" in argv:
+        command, args = "quit", []
+    elif "--paste" in argv:
+        command, args = "paste", []
+    elif files:
+        command, args = "open", files[:1]
+    else:
+        command, args = "show", []
+    resident = True if "--resident" in argv else None
+    return {"command": command, "args": args, "cwd": cwd}, resident, "--new-instance" in argv
+
+
+def forward_to_instance(command):
+    """
+    常駐中のQuickSnapがあればコマンドを転送する
+
+    バッチ処理は背景透過を含み、ワーカープロセス数 (-j) の指定がない場合だけ転送する
+    (読み込み済みのモデルを使えるが、常駐プロセスでは1ファイルずつ順番に処理するため。
+    それ以外は複数プロセスで並列に処理できるこのプロセスで実行した方が速い)
+    転送したバッチ処理の進捗は常駐プロセスから受け取って表示し、終わるまで待つ
+
+    Returns:
+        常駐プロセスの最後の応答 (バッチ処理は 'exit_code' を含む)、転送しなかった場合は None
+    """
+    if command["command"] == "batch":
+        from tools.batch import build_parser
+        # 引数の誤りは転送せずにこのプロセスで表示する
+        args = build_parser().parse_args(command["args"])
+        if args.workers is not None or not any(name == "bg_remove" for name, _ in args.operations):
+            return None
+    return send_to_instance(instance_address(ROOT_DIR), INSTANCE_KEY_FILE, command)
+
+
 if __name__ == "__main__":
+    # EXE化した場合のワーカープロセス起動に必要
+    multiprocessing.freeze_support()
+
+    # 起動時間の計測: python main.py startup [--budget 秒] [--no-gui]
+    if len(sys.argv) > 1 and sys.argv[1] == "startup":
+        from tools.startup import main as startup_main
+        sys.exit(startup_main(sys.argv[2:]))
+
+    # 起動時間の計測用の子プロセス (python main.py startup から呼ばれ、結果をJSONで出力する)
+    if len(sys.argv) > 1 and sys.argv[1] == "--startup-report":
+        report = {"import_seconds": IMPORTED_TIME - STARTUP_TIME}
+        if "--no-gui" not in sys.argv:
+            app = QuickImageEditor()
+            app.gui.window.refresh()
+            report["window_seconds"] = time.perf_counter() - STARTUP_TIME
+            app.gui.window.close()
+        report["heavy_modules"] = loaded_heavy_modules()
+        print(json.dumps(report))
+        sys.exit(0)
+
+    # 常駐中のQuickSnapがあればコマンドを転送してすぐに終了
+    command, resident, new_instance = parse_launch_args(sys.argv[1:])
+    if not new_instance:
+        reply = forward_to_instance(command)
+        if reply is not None:
+            if reply.get("message"):
+                print(reply["message"])
+            sys.exit(reply.get("exit_code", 0 if reply.get("ok") else 1))
+
+    # バッチモード: python main.py batch ...
+    if command["command"] == "batch":
+        from tools.batch import main as batch_main
+        sys.exit(batch_main([arg for arg in command["args"] if arg != "--new-instance"]))
+
+    if command["command"] == "quit":
+        print("常駐中のQuickSnapはありません")
+        sys.exit(0)
+
     # 必要なディレクトリが存在することを確認
     os.makedirs(TOOLS_DIR, exist_ok=True)
     os.makedirs(UI_DIR, exist_ok=True)
 
     # アプリケーションを起動
-    app = QuickImageEditor()
+    app = QuickImageEditor(resident=resident,
+                           startup_command=command if command["command"] in ("open", "paste") else None)
     app.run()
\ No newline at end of file
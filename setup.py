@@ -62,8 +62,8 @@ def install_dependencies():
 def check_python_version():
     """Pythonバージョンの確認"""
     major, minor, _ = sys.version_info[:3]
-    if major < 3 or (major == 3 and minor < 8):
-        print(f"警告: QuickSnapはPython 3.8以上が必要です。現在のバージョン: {platform.python_version()}")
+    if major < 3 or (major == 3 and minor < 9):
+        print(f"警告: QuickSnapはPython 3.9以上が必要です。現在のバージョン: {platform.python_version()}")
         return False
     return True
 
@@ -71,5 +71,5 @@ if __name__ == "__main__":
     if check_python_version():
         setup_environment()
     else:
-        print("Python 3.8以上をインストールしてから再度実行してください。")
+        print("Python 3.9以上をインストールしてから再度実行してください。")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""テスト共通の設定 (リポジトリのルートから tools / ui を読み込めるようにする)"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""一括処理のテスト"""
+
+import os
+
+from PIL import Image
+
+from tools.batch import BatchProcessor, _process_file
+from tools.io_utils import ImageIO
+from tools.operations import ToolSet, parse_operation
+
+
+def _run(tmp_path, specs, tools=None, size=(40, 30)):
+    src = str(tmp_path / 'src.png')
+    dst = str(tmp_path / 'out' / 'dst.png')
+    Image.new('RGB', size, 'white').save(src)
+    operations = [parse_operation(spec) for spec in specs]
+    result = _process_file(src, dst, operations, tools=tools or ToolSet(), image_io=ImageIO())
+    return result, dst
+
+
+def test_applied_operations_are_saved(tmp_path):
+    (_, ok, error, _), dst = _run(tmp_path, ['mosaic:0,0,20,10', 'paint:20,10,40,30,#000000'])
+
+    assert ok, error
+    with Image.open(dst) as image:
+        assert image.getpixel((30, 20))[:3] == (0, 0, 0)
+
+
+def test_area_outside_image_fails_without_output(tmp_path):
+    for spec in ('mosaic:100,100,200,200', 'paint:100,100,200,200', 'trim:100,100,200,200'):
+        (_, ok, error, _), dst = _run(tmp_path, [spec])
+
+        # 墨消しされていない画像を成功として書き出さない
+        assert not ok
+        assert spec.split(':')[0] in error
+        assert not os.path.exists(dst)
+
+
+def test_partially_outside_paint_group_fails(tmp_path):
+    # 同じ色でまとめて塗る場合も、1つでも画像外の領域があれば失敗にする
+    (_, ok, _, _), dst = _run(tmp_path, ['paint:0,0,10,10', 'paint:100,100,200,200'])
+
+    assert not ok
+    assert not os.path.exists(dst)
+
+
+def test_transparent_paint_fails(tmp_path):
+    (_, ok, _, _), dst = _run(tmp_path, ['paint:0,0,10,10,#FF000000'])
+
+    assert not ok
+    assert not os.path.exists(dst)
+
+
+def test_tool_error_fails_without_output(tmp_path):
+    tools = ToolSet()
+
+    def broken(region, block_size):
+        raise MemoryError('mosaic failed')
+
+    # モザイク処理は例外を表示して元の画像を返すため、strict で失敗として扱う
+    tools.mosaic_tool._mosaic_region = broken
+    (_, ok, _, _), dst = _run(tmp_path, ['mosaic:0,0,20,10'], tools=tools)
+
+    assert not ok
+    assert not os.path.exists(dst)
+
+
+def _touch_images(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        Image.new('RGB', (4, 4), 'white').save(str(path))
+
+
+def test_glob_keeps_path_relative_to_root(tmp_path):
+    _touch_images(tmp_path, ['in/a/shot.png', 'in/b/shot.png', 'in/top.webp'])
+    processor = BatchProcessor([], tmp_path / 'out')
+
+    files = processor.collect_files([str(tmp_path / 'in' / '**' / '*.*')], recursive=True)
+
+    # サブディレクトリの同名ファイルが同じ出力先にならない
+    assert sorted(rel for _, rel in files) == [os.path.join('a', 'shot.png'),
+                                               os.path.join('b', 'shot.png'), 'top.webp']
+
+
+def test_output_collisions_get_numbered(tmp_path):
+    _touch_images(tmp_path, ['in/foo.jpg', 'in/foo.png', 'in/foo_1.gif'])
+    processor = BatchProcessor([parse_operation('flip')], tmp_path / 'out', output_format='png',
+                               tools=ToolSet())
+    files = processor.collect_files([str(tmp_path / 'in')])
+    messages = []
+
+    summary = processor.run(files, verbose=False, output=messages.append)
+
+    assert summary['succeeded'] == 3
+    assert sorted(os.listdir(str(tmp_path / 'out'))) == ['foo.png', 'foo_1.png', 'foo_2.png']
+    assert len(messages) == 1
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""背景透過処理 (BackgroundRemover) のテスト - rembg の代わりにスタブのセッションを使う"""
+
+from PIL import Image
+
+from tools.bg_remover import BackgroundRemover
+
+
+class StubSession:
+    """左半分を不透明・右半分を透明にするマスクを返すスタブのセッション"""
+
+    def __init__(self):
+        self.predicted = 0
+
+    def predict(self, image):
+        self.predicted += 1
+        mask = Image.new('L', image.size, 0)
+        mask.paste(255, (0, 0, image.width // 2, image.height))
+        return [mask]
+
+
+def make_factory(session_class=StubSession):
+    """作成したセッションと引数を記録するセッションファクトリ"""
+    calls = []
+
+    def factory(model_name, intra_op_threads, inter_op_threads):
+        session = session_class()
+        calls.append((model_name, intra_op_threads, inter_op_threads, session))
+        return session
+
+    return factory, calls
+
+
+def remover_with_stub(session_class=StubSession, **kwargs):
+    """rembg を使わない BackgroundRemover を作成"""
+    factory, calls = make_factory(session_class)
+    remover = BackgroundRemover(session_factory=factory, **kwargs)
+    # テスト環境に rembg がインストールされていてもスタブのマスクを使う
+    remover._rembg_installed = False
+    return remover, calls
+
+
+def test_session_is_created_once_and_reused():
+    remover, calls = remover_with_stub(model_name='u2netp', intra_op_threads=2, inter_op_threads=1)
+    assert remover.is_ready()
+    assert remover.session is None
+
+    image = Image.new('RGB', (40, 20), 'red')
+    first = remover.process(image)
+    second = remover.process(image)
+
+    assert len(calls) == 1
+    assert calls[0][:3] == ('u2netp', 2, 1)
+    assert calls[0][3].predicted == 2
+    assert first.mode == 'RGBA'
+    assert first.getpixel((5, 10))[3] == 255
+    assert first.getpixel((35, 10))[3] == 0
+    assert second.tobytes() == first.tobytes()
+
+
+def test_release_recreates_session_on_next_use():
+    remover, calls = remover_with_stub()
+    remover.process(Image.new('RGB', (8, 8)))
+
+    assert remover.release() is True
+    assert remover.session is None
+    assert remover.release() is False
+
+    remover.process(Image.new('RGB', (8, 8)))
+    assert len(calls) == 2
+
+
+def test_prewarm_creates_session_in_background():
+    remover, calls = remover_with_stub()
+    remover.prewarm().join(timeout=10)
+
+    assert remover.session is calls[0][3]
+    # 事前読み込みの推論で初期化を済ませている
+    assert calls[0][3].predicted == 1
+
+
+def test_process_returns_original_image_on_error():
+    def failing_factory(model_name, intra_op_threads, inter_op_threads):
+        raise RuntimeError("model not found")
+
+    remover = BackgroundRemover(session_factory=failing_factory)
+    remover._rembg_installed = False
+    image = Image.new('RGB', (8, 8))
+
+    assert remover.process(image) is image
+    assert "model not found" in remover.get_last_error()
+
+
+def test_process_iter_keeps_order_and_matches_process(tmp_path):
+    remover, calls = remover_with_stub()
+    sizes = [(10, 6), (12, 8), (14, 10), (16, 12), (18, 14)]
+    images = [Image.new('RGB', size, 'blue') for size in sizes]
+    # ファイルパスも受け付け、読み込めないファイルは None になる
+    path = tmp_path / 'input.png'
+    Image.new('RGB', (20, 16), 'green').save(path)
+    broken = tmp_path / 'broken.png'
+    broken.write_bytes(b'not an image')
+
+    results = list(remover.process_iter(images + [str(path), str(broken)], queue_size=2))
+
+    assert [r.size for r in results[:6]] == sizes + [(20, 16)]
+    assert results[6] is None
+    # 1枚ずつの処理と同じ結果になる (読み込めないファイルは推論しない)
+    for image, result in zip(images, results):
+        assert result.tobytes() == remover.process(image).tobytes()
+    assert calls[0][3].predicted == 6 + len(images)
+    stats = remover.get_last_batch_stats()
+    assert stats['count'] == 7
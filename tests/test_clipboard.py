@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+クリップボード (Linux) のテスト
+
+xclip・wl-copy・wl-paste の代わりに、PATH に置いた偽のコマンドを使う。
+偽のコマンドは形式ごとのデータをフォルダに保存し、呼び出された引数を calls.log に記録する
+"""
+
+import io
+import sys
+import stat
+import textwrap
+
+import pytest
+from PIL import Image
+
+from tools.io_utils import ImageIO
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'),
+                                reason="xclip・wl-paste を使うのはLinuxのみ")
+
+FAKE_CLIPBOARD_SCRIPT = textwrap.dedent('''
+    import os
+    import sys
+
+    name = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+    store = os.environ['FAKE_CLIPBOARD_DIR']
+    with open(os.path.join(store, 'calls.log'), 'a') as f:
+        f.write(' '.join([name] + args) + '\\n')
+    if os.environ.get('FAKE_CLIPBOARD_FAIL'):
+        sys.exit(1)
+
+    types_file = os.path.join(store, 'types')
+    types = open(types_file).read().split() if os.path.exists(types_file) else []
+
+    def data_file(mime):
+        return os.path.join(store, 'data_' + mime.replace('/', '_'))
+
+    def copy(mime):
+        with open(types_file, 'w') as f:
+            f.write(mime)
+        with open(data_file(mime), 'wb') as f:
+            f.write(sys.stdin.buffer.read())
+
+    def paste(mime):
+        if mime == 'TARGETS':
+            print('\\n'.join(types))
+        elif mime in types:
+            with open(data_file(mime), 'rb') as f:
+                sys.stdout.buffer.write(f.read())
+        else:
+            sys.exit(1)
+
+    if name == 'xclip':
+        mime = args[args.index('-target') + 1]
+        copy(mime) if '-i' in args else paste(mime)
+    elif name == 'wl-copy':
+        copy(args[args.index('--type') + 1])
+    elif name == 'wl-paste':
+        paste('TARGETS' if '--list-types' in args else args[args.index('--type') + 1])
+''')
+
+
+class FakeClipboard:
+    """偽のクリップボードコマンドの保存先"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def set(self, items):
+        """形式ごとのデータ {mime: bytes} をクリップボードに置く (辞書の順が形式一覧の順)"""
+        (self.store / 'types').write_text('\n'.join(items))
+        for mime, data in items.items():
+            (self.store / ('data_' + mime.replace('/', '_'))).write_bytes(data)
+
+    def get(self, mime):
+        """クリップボードに置かれたデータ (ない場合は None)"""
+        path = self.store / ('data_' + mime.replace('/', '_'))
+        return path.read_bytes() if path.exists() else None
+
+    def calls(self):
+        """偽のコマンドの呼び出し (コマンド名と引数の文字列のリスト)"""
+        path = self.store / 'calls.log'
+        return path.read_text().splitlines() if path.exists() else []
+
+
+def install_fake_commands(bin_dir, names):
+    """偽のコマンドを bin_dir に作成"""
+    bin_dir.mkdir(exist_ok=True)
+    for name in names:
+        path = bin_dir / name
+        path.write_text(f"#!{sys.executable}\n{FAKE_CLIPBOARD_SCRIPT}")
+        path.chmod(path.stat().st_mode | stat.S_IXUSR)
+
+
+@pytest.fixture
+def fake_clipboard(tmp_path, monkeypatch):
+    """xclip だけがある環境 (X11) の偽のクリップボード"""
+    store = tmp_path / 'clipboard'
+    store.mkdir()
+    bin_dir = tmp_path / 'bin'
+    install_fake_commands(bin_dir, ['xclip'])
+    monkeypatch.setenv('PATH', str(bin_dir))
+    monkeypatch.setenv('FAKE_CLIPBOARD_DIR', str(store))
+    monkeypatch.delenv('WAYLAND_DISPLAY', raising=False)
+    monkeypatch.delenv('FAKE_CLIPBOARD_FAIL', raising=False)
+    return FakeClipboard(store)
+
+
+def sample_image(mode='RGBA', size=(24, 16)):
+    image = Image.new(mode, size, (255, 0, 0, 128) if mode == 'RGBA' else (255, 0, 0))
+    image.paste((0, 0, 255, 255) if mode == 'RGBA' else (0, 0, 255), (0, 0, 8, 8))
+    return image
+
+
+def test_copy_pipes_png_to_xclip(fake_clipboard):
+    image = sample_image()
+
+    assert ImageIO().copy_to_clipboard(image) is True
+
+    assert fake_clipboard.calls() == ['xclip -selection clipboard -target image/png -i']
+    copied = Image.open(io.BytesIO(fake_clipboard.get('image/png')))
+    assert copied.format == 'PNG'
+    assert copied.mode == 'RGBA'
+    assert copied.tobytes() == image.tobytes()
+
+
+def test_copy_prefers_wl_copy_on_wayland(fake_clipboard, tmp_path, monkeypatch):
+    install_fake_commands(tmp_path / 'bin', ['wl-copy'])
+    monkeypatch.setenv('WAYLAND_DISPLAY', 'wayland-0')
+
+    assert ImageIO().copy_to_clipboard(sample_image()) is True
+
+    assert fake_clipboard.calls() == ['wl-copy --type image/png']
+    assert fake_clipboard.get('image/png').startswith(b'\x89PNG')
+
+
+def test_copy_reuses_encoded_payload_for_same_version(fake_clipboard, monkeypatch):
+    image_io = ImageIO()
+    image = sample_image()
+    assert image_io.copy_to_clipboard(image, version=1)
+    first = fake_clipboard.get('image/png')
+
+    # 同じバージョンは再エンコードしない (画像が変わっていても前回のデータを渡す)
+    image.paste((0, 255, 0, 255), (0, 0, 24, 16))
+    assert image_io.copy_to_clipboard(image, version=1)
+    assert fake_clipboard.get('image/png') == first
+
+    assert image_io.copy_to_clipboard(image, version=2)
+    assert fake_clipboard.get('image/png') != first
+
+
+def test_copy_fails_when_command_fails(fake_clipboard, monkeypatch):
+    monkeypatch.setenv('FAKE_CLIPBOARD_FAIL', '1')
+    assert ImageIO().copy_to_clipboard(sample_image()) is False
+
+
+def test_copy_fails_without_clipboard_command(tmp_path, monkeypatch):
+    empty_dir = tmp_path / 'empty'
+    empty_dir.mkdir()
+    monkeypatch.setenv('PATH', str(empty_dir))
+    assert ImageIO().copy_to_clipboard(sample_image()) is False
+
+
+def encode(image, image_format):
+    output = io.BytesIO()
+    image.save(output, image_format)
+    return output.getvalue()
+
+
+def test_paste_reads_png_from_xclip(fake_clipboard):
+    image = sample_image()
+    fake_clipboard.set({'TIMESTAMP': b'', 'image/png': encode(image, 'PNG')})
+    image_io = ImageIO()
+
+    pasted = image_io.load_from_clipboard()
+
+    assert pasted.mode == 'RGBA'
+    assert pasted.tobytes() == image.tobytes()
+    assert image_io.last_paste_stats['source'] == 'xclip image/png'
+    assert fake_clipboard.calls() == [
+        'xclip -selection clipboard -target TARGETS -o',
+        'xclip -selection clipboard -target image/png -o',
+    ]
+
+
+def test_paste_prefers_png_over_other_image_types(fake_clipboard):
+    image = sample_image('RGB')
+    fake_clipboard.set({'image/jpeg': encode(image, 'JPEG'), 'image/bmp': encode(image, 'BMP'),
+                        'image/png': encode(image, 'PNG')})
+
+    assert ImageIO().load_from_clipboard().tobytes() == image.tobytes()
+    assert fake_clipboard.calls()[-1] == 'xclip -selection clipboard -target image/png -o'
+
+
+def test_paste_falls_back_to_any_image_type(fake_clipboard):
+    image = sample_image('RGB')
+    fake_clipboard.set({'image/gif': encode(image.convert('P'), 'GIF')})
+    image_io = ImageIO()
+
+    pasted = image_io.load_from_clipboard()
+
+    # パレット画像はRGBに変換する
+    assert pasted.mode == 'RGB'
+    assert pasted.size == image.size
+    assert image_io.last_paste_stats['source'] == 'xclip image/gif'
+
+
+def test_paste_returns_none_without_image(fake_clipboard):
+    fake_clipboard.set({'UTF8_STRING': b'text', 'text/plain': b'text'})
+    image_io = ImageIO()
+
+    assert image_io.load_from_clipboard() is None
+    assert image_io.last_paste_stats is None
+    # 画像の形式がなければデータは読み込まない
+    assert len(fake_clipboard.calls()) == 1
+
+
+def test_paste_returns_none_for_broken_data(fake_clipboard):
+    fake_clipboard.set({'image/png': b'\x89PNG broken'})
+    assert ImageIO().load_from_clipboard() is None
+
+
+def test_paste_uses_wl_paste_on_wayland(fake_clipboard, tmp_path, monkeypatch):
+    install_fake_commands(tmp_path / 'bin', ['wl-paste'])
+    monkeypatch.setenv('WAYLAND_DISPLAY', 'wayland-0')
+    image = sample_image()
+    fake_clipboard.set({'image/png': encode(image, 'PNG')})
+
+    assert ImageIO().load_from_clipboard().tobytes() == image.tobytes()
+    assert fake_clipboard.calls() == ['wl-paste --list-types', 'wl-paste --no-newline --type image/png']
+
+
+class StubTkRoot:
+    """X11のTkと同じく、PNGを16進数の並びで返すスタブのルートウィンドウ"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def clipboard_get(self, type):
+        if type != 'image/png' or self.data is None:
+            raise RuntimeError("CLIPBOARD selection doesn't exist or form \"image/png\" not defined")
+        return ' '.join(f'0x{value:02x}' for value in self.data)
+
+
+def test_paste_falls_back_to_tk_without_clipboard_command(tmp_path, monkeypatch):
+    empty_dir = tmp_path / 'empty'
+    empty_dir.mkdir()
+    monkeypatch.setenv('PATH', str(empty_dir))
+    image = sample_image()
+    image_io = ImageIO()
+
+    pasted = image_io.load_from_clipboard(tk_root=StubTkRoot(encode(image, 'PNG')))
+
+    assert pasted.tobytes() == image.tobytes()
+    assert image_io.last_paste_stats['source'] == 'Tk image/png'
+    assert image_io.load_from_clipboard(tk_root=StubTkRoot(None)) is None
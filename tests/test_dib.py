@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""DIB (クリップボードのビットマップ) 解析のテスト - struct で組み立てた DIB を使う"""
+
+import io
+import struct
+
+import pytest
+from PIL import Image
+
+from tools.dib import (BI_RGB, BI_RLE8, BI_BITFIELDS, BI_PNG, CORE_HEADER_SIZE,
+                       parse_dib_header, dib_to_image)
+
+# 2x2 の画素 (上の行から) - 赤・緑 / 青・白
+PIXELS = [[(255, 0, 0), (0, 255, 0)],
+          [(0, 0, 255), (255, 255, 255)]]
+
+BGRA_MASKS = (0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000)
+
+
+def info_header(width, height, bits, compression=BI_RGB, colors_used=0, header_size=40, masks=None):
+    """BITMAPINFOHEADER (40バイト) または V4/V5 ヘッダー (マスクはヘッダーの中) を作成"""
+    header = struct.pack('<IiiHHIIiiII', header_size, width, height, 1, bits, compression,
+                         0, 2835, 2835, colors_used, 0)
+    if header_size > 40:
+        extra = bytearray(header_size - 40)
+        if masks is not None:
+            struct.pack_into('<4I', extra, 0, *masks)
+        header += bytes(extra)
+    return header
+
+
+def pixel_rows(rows, pack, bits, bottom_up=True):
+    """行 (上から) の画素を pack で変換し、4バイト境界に揃えて格納順に並べる"""
+    stride = ((len(rows[0]) * bits + 31) // 32) * 4
+    data = []
+    for row in (reversed(rows) if bottom_up else rows):
+        line = b''.join(pack(pixel) for pixel in row)
+        data.append(line + b'\0' * (stride - len(line)))
+    return b''.join(data)
+
+
+def bgr(pixel):
+    r, g, b = pixel[:3]
+    return bytes((b, g, r))
+
+
+def bgra(pixel):
+    r, g, b, a = pixel
+    return bytes((b, g, r, a))
+
+
+def rgb_pixels(image):
+    return [[image.getpixel((x, y)) for x in range(image.width)] for y in range(image.height)]
+
+
+def test_bi_rgb_24bit_bottom_up():
+    data = info_header(2, 2, 24) + pixel_rows(PIXELS, bgr, 24)
+
+    info = parse_dib_header(data)
+    image = dib_to_image(data)
+
+    assert (info.size, info.top_down, info.stride, info.pixel_offset) == ((2, 2), False, 8, 40)
+    assert image.mode == 'RGB'
+    assert rgb_pixels(image) == PIXELS
+
+
+def test_bi_rgb_24bit_top_down():
+    data = info_header(2, -2, 24) + pixel_rows(PIXELS, bgr, 24, bottom_up=False)
+
+    assert parse_dib_header(data).top_down is True
+    assert rgb_pixels(dib_to_image(data)) == PIXELS
+
+
+def test_odd_width_rows_are_padded():
+    image = Image.new('RGB', (5, 3))
+    for x in range(5):
+        for y in range(3):
+            image.putpixel((x, y), (x * 50, y * 100, 255 - x * 50))
+    output = io.BytesIO()
+    image.save(output, 'BMP')
+    # BMPファイルヘッダー (14バイト) を除いたものがDIB
+    data = output.getvalue()[14:]
+
+    assert dib_to_image(data).tobytes() == image.tobytes()
+
+
+def test_bi_rgb_32bit_zero_alpha_is_rgb():
+    data = info_header(2, 2, 32) + pixel_rows(PIXELS, lambda p: bgr(p) + b'\0', 32)
+
+    image = dib_to_image(data)
+
+    assert image.mode == 'RGB'
+    assert rgb_pixels(image) == PIXELS
+
+
+def test_bitfields_masks_after_info_header():
+    pixels = [[(255, 0, 0, 255), (0, 255, 0, 128)],
+              [(0, 0, 255, 0), (255, 255, 255, 64)]]
+    data = (info_header(2, 2, 32, BI_BITFIELDS) + struct.pack('<3I', *BGRA_MASKS[:3])
+            + pixel_rows(pixels, bgra, 32))
+
+    info = parse_dib_header(data)
+    image = dib_to_image(data)
+
+    # BITMAPINFOHEADER の BI_BITFIELDS は色のマスク3つ (12バイト) がヘッダーの後ろにある
+    assert info.pixel_offset == 52
+    assert info.masks == BGRA_MASKS[:3] + (0,)
+    assert image.mode == 'RGB'
+    assert rgb_pixels(image) == [[p[:3] for p in row] for row in pixels]
+
+
+def test_bitfields_16bit_565():
+    def rgb565(pixel):
+        r, g, b = pixel
+        return struct.pack('<H', ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3))
+
+    data = (info_header(2, 2, 16, BI_BITFIELDS) + struct.pack('<3I', 0xF800, 0x07E0, 0x001F)
+            + pixel_rows(PIXELS, rgb565, 16))
+
+    image = dib_to_image(data)
+
+    assert image.mode == 'RGB'
+    assert rgb_pixels(image) == PIXELS
+
+
+def test_v5_bitfields_alpha():
+    pixels = [[(255, 0, 0, 255), (0, 255, 0, 128)],
+              [(0, 0, 255, 0), (255, 255, 255, 64)]]
+    data = info_header(2, 2, 32, BI_BITFIELDS, header_size=124, masks=BGRA_MASKS) + pixel_rows(pixels, bgra, 32)
+
+    info = parse_dib_header(data)
+    image = dib_to_image(data)
+
+    # V5ヘッダーのマスクはヘッダーの中にあるため、画素はヘッダーの直後
+    assert info.pixel_offset == 124
+    assert image.mode == 'RGBA'
+    assert rgb_pixels(image) == pixels
+
+
+def test_v5_bi_rgb_with_alpha_mask():
+    pixels = [[(10, 20, 30, 255), (40, 50, 60, 0)],
+              [(70, 80, 90, 10), (100, 110, 120, 200)]]
+    data = info_header(2, 2, 32, BI_RGB, header_size=124, masks=BGRA_MASKS) + pixel_rows(pixels, bgra, 32)
+
+    image = dib_to_image(data)
+
+    assert image.mode == 'RGBA'
+    assert rgb_pixels(image) == pixels
+
+
+def test_palette_8bit_with_colors_used():
+    palette = [(0, 0, 0), (255, 0, 0), (0, 128, 255)]
+    indices = [[1, 2, 0], [2, 0, 1]]
+    data = (info_header(3, 2, 8, colors_used=len(palette))
+            + b''.join(bgr(color) + b'\0' for color in palette)
+            + pixel_rows(indices, lambda i: bytes((i,)), 8))
+
+    info = parse_dib_header(data)
+    image = dib_to_image(data)
+
+    assert info.colors == 3
+    assert info.pixel_offset == 40 + 3 * 4
+    assert image.mode == 'RGB'
+    assert rgb_pixels(image) == [[palette[i] for i in row] for row in indices]
+
+
+def test_palette_1bit_full_palette():
+    palette = [(0, 0, 0), (255, 255, 255)]
+    indices = [[1, 0, 1, 1, 0, 0, 1, 0, 1], [0, 1, 0, 0, 1, 1, 0, 1, 0]]
+
+    def pack_row(row):
+        bits = ''.join(str(i) for i in row).ljust(32, '0')
+        return int(bits, 2).to_bytes(4, 'big')
+
+    data = (info_header(9, 2, 1) + b''.join(bgr(color) + b'\0' for color in palette)
+            + b''.join(pack_row(row) for row in reversed(indices)))
+
+    assert parse_dib_header(data).colors == 2
+    assert rgb_pixels(dib_to_image(data)) == [[palette[i] for i in row] for row in indices]
+
+
+def test_core_header_palette_uses_bgr_entries():
+    palette = [(255, 0, 0), (0, 0, 255)]
+    indices = [[0, 1], [1, 0]]
+    header = struct.pack('<IHHHH', CORE_HEADER_SIZE, 2, 2, 1, 8)
+    # OS/2形式のヘッダーは256色すべてのパレット (1色3バイト) を持つ
+    full_palette = palette + [(0, 0, 0)] * 254
+    data = (header + b''.join(bgr(color) for color in full_palette)
+            + pixel_rows(indices, lambda i: bytes((i,)), 8))
+
+    info = parse_dib_header(data)
+
+    assert info.palette_entry_size == 3
+    assert info.pixel_offset == CORE_HEADER_SIZE + 256 * 3
+    assert rgb_pixels(dib_to_image(data)) == [[palette[i] for i in row] for row in indices]
+
+
+def test_rle8():
+    palette = [(0, 0, 0), (255, 0, 0), (0, 255, 0)]
+    indices = [[1, 1, 2, 2], [2, 2, 2, 2]]
+    # 下の行から: 4画素の2、行末 / 2画素の1・2画素の2、行末 / ビットマップの終わり
+    encoded = bytes((4, 2, 0, 0, 2, 1, 2, 2, 0, 0, 0, 1))
+    data = (info_header(4, 2, 8, BI_RLE8, colors_used=len(palette))
+            + b''.join(bgr(color) + b'\0' for color in palette) + encoded)
+
+    image = dib_to_image(data)
+
+    assert image.mode == 'RGB'
+    assert rgb_pixels(image) == [[palette[i] for i in row] for row in indices]
+
+
+def test_embedded_png():
+    image = Image.new('RGBA', (3, 2), (1, 2, 3, 4))
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    data = info_header(3, 2, 0, BI_PNG) + output.getvalue()
+
+    decoded = dib_to_image(data)
+
+    assert decoded.format == 'PNG'
+    assert decoded.tobytes() == image.tobytes()
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'\x28\0', '短すぎます'),
+    (struct.pack('<I', 124) + b'\0' * 36, 'ヘッダーサイズが不正'),
+    (struct.pack('<I', 20) + b'\0' * 16, '対応していないDIBヘッダー'),
+    (info_header(0, 2, 24), '画像サイズが不正'),
+])
+def test_invalid_header(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_dib_header(data)
+
+
+def test_truncated_pixels():
+    data = info_header(2, 2, 24) + pixel_rows(PIXELS, bgr, 24)
+
+    with pytest.raises(ValueError, match='画素データが不足'):
+        dib_to_image(data[:-1])
+
+
+def test_truncated_masks():
+    data = info_header(2, 2, 32, BI_BITFIELDS) + struct.pack('<2I', *BGRA_MASKS[:2])
+
+    with pytest.raises(ValueError, match='マスクが不足'):
+        parse_dib_header(data)
+
+
+def test_unsupported_masks():
+    data = (info_header(2, 2, 32, BI_BITFIELDS) + struct.pack('<3I', 0xF, 0xF0, 0xF00)
+            + pixel_rows(PIXELS, lambda p: bgr(p) + b'\0', 32))
+
+    with pytest.raises(ValueError, match='対応していないDIBのマスク'):
+        dib_to_image(data)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""編集と履歴のテスト - 失敗した編集・何も変わらない編集を履歴に記録しないことを確認する"""
+
+import pytest
+from PIL import Image
+
+main = pytest.importorskip('main')
+
+from tools.edit_session import EditSession
+from tools.history import EditHistory
+from tools.latency import LatencyRecorder
+from tools.mosaic import MosaicTool
+from tools.operations import ToolSet
+from tools.painter import PaintTool
+
+
+@pytest.fixture
+def editor():
+    """GUIを作成せず、編集と履歴に必要な部分だけを持つ QuickImageEditor"""
+    app = main.QuickImageEditor.__new__(main.QuickImageEditor)
+    image = Image.new('RGB', (40, 30), 'white')
+    app.current_image = image
+    app.history = EditHistory()
+    app.profiler = LatencyRecorder()
+    app.edit_session = EditSession(image.copy(), ToolSet())
+    app.mosaic_tool = MosaicTool()
+    app.paint_tool = PaintTool()
+    app._running_jobs = 0
+
+    def update_current_image(result, changed_box=None):
+        app.current_image = result
+
+    app._update_current_image = update_current_image
+    return app
+
+
+def test_paint_is_recorded_after_success(editor):
+    editor.paint_tool.set_color('#000000')
+    editor._apply_paint((5, 5, 15, 10))
+
+    assert editor.history.can_undo()
+    assert len(editor.edit_session.operations) == 1
+    assert editor.current_image.getpixel((5, 5)) == (0, 0, 0)
+
+    restored, _ = editor.history.undo(editor.current_image)
+    assert restored.getpixel((5, 5)) == (255, 255, 255)
+
+
+def test_transparent_paint_is_not_recorded(editor):
+    editor.paint_tool.set_color('#00000000')
+    editor._apply_paint((5, 5, 15, 10))
+
+    assert not editor.history.can_undo()
+    assert editor.edit_session.operations == []
+    assert editor.current_image.mode == 'RGB'
+
+
+def test_failed_edit_is_not_recorded(editor, monkeypatch):
+    def failing_mosaic(region, block_size):
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(editor.mosaic_tool, '_mosaic_region', failing_mosaic)
+    editor._apply_mosaic(10, (0, 0, 20, 20))
+
+    assert not editor.history.can_undo()
+    assert editor.edit_session.operations == []
+
+
+def test_edit_outside_image_is_not_recorded(editor):
+    editor._apply_mosaic(10, (100, 100, 120, 120))
+
+    assert not editor.history.can_undo()
+    assert editor.edit_session.operations == []
+
+
+def test_full_update_after_edit_renders_interactively(editor):
+    calls = []
+
+    class RecordingGUI:
+        def update_image(self, image, interactive=False, proxy=None):
+            calls.append(interactive)
+
+    editor.gui = RecordingGUI()
+    editor.image_version = 0
+    # 回転などの全体の更新は高速な縮小で表示し、高品質な縮小はアイドル時に行う
+    main.QuickImageEditor._update_current_image(editor, editor.current_image.rotate(90, expand=True))
+
+    assert calls == [True]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""PNGの並列書き出し (write_png) のテスト - 書き出したPNGを読み込んで元の画素と比較する"""
+
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from tools.encoder import PNG_COLOR_TYPES, iter_image_strips, write_png
+
+
+def _noise_image(mode, size=(37, 29), seed=0):
+    """行・列ごとに値が変わる画像 (フィルターの境界での誤りが画素に表れるように)"""
+    rng = random.Random(seed)
+    data = bytes(rng.randrange(256) for _ in range(size[0] * size[1] * len(mode)))
+    return Image.frombytes(mode, size, data)
+
+
+@pytest.mark.parametrize('mode', sorted(PNG_COLOR_TYPES))
+@pytest.mark.parametrize('row_filter', ['none', 'sub', 'up'])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_write_png_round_trip(mode, row_filter, workers):
+    image = _noise_image(mode)
+    buffer = io.BytesIO()
+
+    # 帯の境界 ('up' フィルターの前の帯の最終行) を含むよう、行数より小さい帯に分ける
+    write_png(buffer, image.size, mode, iter_image_strips(image, rows=8), compress_level=1,
+              row_filter=row_filter, workers=workers)
+
+    buffer.seek(0)
+    with Image.open(buffer) as written:
+        written.load()
+        assert written.mode == mode
+        assert written.size == image.size
+        assert written.tobytes() == image.tobytes()
+
+
+def test_write_png_single_row_strips():
+    image = _noise_image('RGB', size=(5, 4))
+    buffer = io.BytesIO()
+
+    write_png(buffer, image.size, 'RGB', iter_image_strips(image, rows=1), row_filter='up', workers=2)
+
+    buffer.seek(0)
+    with Image.open(buffer) as written:
+        assert written.tobytes() == image.tobytes()
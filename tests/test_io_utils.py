@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""画像の保存 (一時ファイルからの置き換え) のテスト"""
+
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+from tools.io_utils import ImageIO
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="umask によるパーミッションはPOSIXのみ")
+@pytest.mark.parametrize('umask, expected', [(0o022, 0o644), (0o077, 0o600), (0o002, 0o664)])
+def test_saved_file_uses_current_umask(tmp_path, umask, expected):
+    path = tmp_path / 'out.png'
+    # モジュールを読み込んだ後に変更された umask も反映する
+    previous = os.umask(umask)
+    try:
+        assert ImageIO().save_to_file(Image.new('RGB', (4, 4)), str(path))
+    finally:
+        os.umask(previous)
+
+    assert os.stat(path).st_mode & 0o777 == expected
+
+
+def test_failed_write_keeps_existing_file(tmp_path):
+    path = tmp_path / 'out.bin'
+    path.write_bytes(b'original')
+
+    def failing_writer(f):
+        f.write(b'partial')
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        ImageIO()._write_atomic(str(path), failing_writer)
+
+    assert path.read_bytes() == b'original'
+    assert os.listdir(tmp_path) == ['out.bin']
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="パーミッションの引き継ぎはPOSIXのみ")
+@pytest.mark.parametrize('mode', [0o600, 0o640, 0o755])
+def test_overwrite_keeps_existing_permissions(tmp_path, mode):
+    path = tmp_path / 'out.png'
+    path.write_bytes(b'original')
+    os.chmod(path, mode)
+
+    assert ImageIO().save_to_file(Image.new('RGB', (4, 4)), str(path))
+
+    assert os.stat(path).st_mode & 0o777 == mode
+    with Image.open(path) as image:
+        assert image.size == (4, 4)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="ディレクトリの fsync はPOSIXのみ")
+def test_replace_syncs_parent_directory(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+
+    def recording_fsync(fd):
+        synced.append(os.path.samestat(os.fstat(fd), os.stat(tmp_path)))
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', recording_fsync)
+    ImageIO()._write_atomic(str(tmp_path / 'out.bin'), lambda f: f.write(b'data'))
+
+    # ファイルの内容の後に、置き換えたディレクトリエントリを書き出す
+    assert synced == [False, True]
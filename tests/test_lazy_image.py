@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""遅延読み込み画像のテスト - 画素数の上限を超える画像の扱いを確認する"""
+
+import os
+
+import pytest
+from PIL import Image
+
+from tools.batch import _process_file
+from tools.io_utils import ImageIO
+from tools.lazy_image import LazyImage
+from tools.operations import ToolSet, parse_operation
+
+# テスト用の画素数の上限 (64x64 の画像は上限の2倍を超え、DecompressionBombError になる)
+PIXEL_LIMIT = 1000
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', PIXEL_LIMIT)
+
+
+def _save(tmp_path, name):
+    path = str(tmp_path / name)
+    Image.new('RGB', (64, 64), 'white').save(path)
+    return path
+
+
+def test_large_image_is_refused_by_default(tmp_path, small_limit):
+    with pytest.raises(Image.DecompressionBombError):
+        LazyImage(_save(tmp_path, 'large.png'))
+
+
+def test_allow_large_only_decodes_regions(tmp_path, small_limit):
+    lazy_image = LazyImage(_save(tmp_path, 'large.bmp'), allow_large=True)
+    try:
+        # 開く間だけ上限を無効にし、元の設定に戻している
+        assert Image.MAX_IMAGE_PIXELS == PIXEL_LIMIT
+        assert lazy_image.exceeds_pixel_limit
+        assert lazy_image.supports_region_decode
+        assert lazy_image.crop((0, 0, 8, 8)).size == (8, 8)
+        # 全体の展開は上限を超えたまま許可しない
+        with pytest.raises(Image.DecompressionBombError):
+            lazy_image.load()
+    finally:
+        lazy_image.close()
+
+
+def test_batch_refuses_large_image_without_region_decode(tmp_path, small_limit):
+    src = _save(tmp_path, 'large.png')
+    dst = str(tmp_path / 'out.png')
+
+    _, ok, error, _ = _process_file(src, dst, [parse_operation('flip')], tools=ToolSet(), image_io=ImageIO())
+
+    assert not ok
+    assert 'DecompressionBombError' in error or '上限' in error
+    assert not os.path.exists(dst)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""モザイク処理のテスト - PIL (Image.reduce) と NumPy のブロック平均が一致することを確認する"""
+
+import pytest
+from PIL import Image
+
+from tools.mosaic import MosaicTool
+
+
+def noise_image(mode, size=(101, 67)):
+    return Image.effect_noise(size, 64).convert('RGBA').convert(mode)
+
+
+def test_auto_engine_uses_pil():
+    assert MosaicTool().engine == 'pil'
+    assert MosaicTool(engine='pil').engine == 'pil'
+
+
+@pytest.mark.parametrize('mode', ['L', 'LA', 'RGB', 'RGBA'])
+@pytest.mark.parametrize('block_size', [2, 5, 10, 25, 50])
+def test_pil_block_mean_matches_numpy(mode, block_size):
+    pytest.importorskip('numpy')
+    region = noise_image(mode)
+
+    pil_result = MosaicTool(engine='pil')._mosaic_pil(region, block_size)
+    numpy_result = MosaicTool(engine='numpy')._mosaic_numpy(region, block_size)
+
+    assert pil_result.size == region.size
+    assert pil_result.mode == region.mode
+    # 端の半端なブロックも含めて平均は一致する (丸め方の違いで1だけ異なる場合がある)
+    differences = [abs(a - b) for a, b in zip(pil_result.tobytes(), numpy_result.tobytes())]
+    assert max(differences) <= 1
+
+
+def test_pil_blocks_are_uniform():
+    region = noise_image('RGB', (23, 17))
+
+    result = MosaicTool(engine='pil')._mosaic_pil(region, 10)
+
+    for box in [(0, 0, 10, 10), (10, 0, 20, 10), (20, 10, 23, 17)]:
+        colors = result.crop(box).getcolors()
+        assert len(colors) == 1
+
+
+def test_palette_image_falls_back_to_sampling():
+    region = noise_image('RGB').convert('P')
+
+    result = MosaicTool(engine='pil')._mosaic_pil(region, 10)
+
+    assert result.mode == 'P'
+    assert result.size == region.size
+
+
+def test_process_only_changes_area():
+    image = noise_image('RGB', (60, 40))
+    original = image.copy()
+    tool = MosaicTool()
+
+    result = tool.process(image, (10, 5, 30, 25), strength=5)
+
+    assert tool.last_changed_box == (10, 5, 30, 25)
+    assert result.crop((0, 0, 60, 5)).tobytes() == original.crop((0, 0, 60, 5)).tobytes()
+    assert result.crop((30, 0, 60, 40)).tobytes() == original.crop((30, 0, 60, 40)).tobytes()
+    assert result.crop((10, 5, 30, 25)).tobytes() != original.crop((10, 5, 30, 25)).tobytes()
+    # inplace=False の場合は元の画像を変更しない
+    assert image.tobytes() == original.tobytes()
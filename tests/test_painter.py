@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""塗りつぶし処理のテスト"""
+
+from PIL import Image
+
+from tools.painter import PaintTool
+
+
+def test_fill_covers_exactly_the_selection():
+    image = Image.new('RGB', (10, 8), 'white')
+    tool = PaintTool()
+
+    result = tool.process(image, (2, 3, 5, 6), '#000000')
+
+    # 選択範囲の終点 (x2, y2) は含まない (表示位置から変換した矩形と同じ)
+    assert tool.last_changed_box == (2, 3, 5, 6)
+    painted = result.convert('L').point(lambda value: 255 - value)
+    assert painted.getbbox() == (2, 3, 5, 6)
+
+
+def test_fill_is_clipped_to_image():
+    image = Image.new('RGBA', (6, 4), (255, 255, 255, 255))
+    tool = PaintTool()
+
+    tool.process(image, (4, 2, 20, 20), '#FF000080', inplace=True)
+
+    assert tool.last_changed_box == (4, 2, 6, 4)
+    assert image.getpixel((3, 3)) == (255, 255, 255, 255)
+    assert image.getpixel((5, 3))[:3] != (255, 255, 255)
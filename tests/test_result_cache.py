@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""処理結果キャッシュのテスト - ディスク層の削除順と一時ファイルの扱いを確認する"""
+
+import os
+import time
+
+from PIL import Image
+
+from tools.result_cache import ORPHAN_TEMP_SECONDS, ResultCache
+
+
+def _image(value):
+    return Image.new('RGB', (16, 16), (value, value, value))
+
+
+def _set_mtime(path, seconds_ago):
+    timestamp = time.time() - seconds_ago
+    os.utime(str(path), (timestamp, timestamp))
+
+
+def test_disk_hit_refreshes_eviction_order(tmp_path):
+    cache = ResultCache(max_bytes=0, disk_dir=tmp_path, disk_format='raw')
+    cache.put('old', _image(1))
+    cache.put('new', _image(2))
+    size = (tmp_path / 'old.rgba').stat().st_size
+    _set_mtime(tmp_path / 'old.rgba', 200)
+    _set_mtime(tmp_path / 'new.rgba', 100)
+
+    # 古く保存したものでも、最近使ったものは残す
+    assert cache.get('old').getpixel((0, 0)) == (1, 1, 1)
+    cache.max_disk_bytes = size * 2
+    cache.put('third', _image(3))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['old.rgba', 'third.rgba']
+    assert cache.disk_evictions == 1
+
+
+def test_orphaned_temp_files_are_pruned_and_counted(tmp_path):
+    cache = ResultCache(max_bytes=0, disk_dir=tmp_path, disk_format='raw')
+    cache.put('first', _image(1))
+    size = (tmp_path / 'first.rgba').stat().st_size
+    orphan = tmp_path / 'gone.abc123.tmp'
+    orphan.write_bytes(b'x' * size)
+    _set_mtime(orphan, ORPHAN_TEMP_SECONDS + 10)
+    writing = tmp_path / 'busy.def456.tmp'
+    writing.write_bytes(b'x' * size)
+    cache.max_disk_bytes = size * 2
+
+    cache.put('second', _image(2))
+
+    # 書き込み途中で終了した一時ファイルは削除し、書き込み中の一時ファイルは使用量に含める
+    assert not orphan.exists()
+    assert writing.exists()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['busy.def456.tmp', 'second.rgba']
+
+
+def test_save_leaves_no_temp_files(tmp_path):
+    for disk_format in ('png', 'raw'):
+        directory = tmp_path / disk_format
+        cache = ResultCache(max_bytes=0, disk_dir=directory, disk_format=disk_format)
+        cache.put('key', _image(7))
+        cache.put('key', _image(7))
+
+        assert [path.suffix for path in directory.iterdir()] == ['.png' if disk_format == 'png' else '.rgba']
+        assert cache.get('key').getpixel((0, 0)) == (7, 7, 7)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""起動時間計測のテスト - 起動時に重いモジュールを読み込んでいないことを確認する"""
+
+import os
+
+from tools.startup import DEFAULT_BUDGET_SECONDS, HEAVY_MODULES, measure_startup, parse_import_times
+
+# CI などの負荷で計測がぶれる分の余裕 (予算に掛ける倍率、環境変数で調整できる)
+STARTUP_MARGIN = float(os.environ.get('QUICKSNAP_STARTUP_MARGIN', '1.5'))
+
+
+def test_no_heavy_modules_at_startup():
+    report = measure_startup(gui=False)
+
+    assert report['heavy_modules'] == []
+    # 子プロセスの -X importtime の出力でも確認する (間接的な読み込みも含む)
+    imported = {item['module'].split('.')[0] for item in report['imports']}
+    assert imported.isdisjoint(HEAVY_MODULES)
+    assert 'tools.io_utils' in {item['module'] for item in report['imports']}
+
+
+def test_startup_within_budget():
+    # 一時的な負荷の影響を避けるため、数回計測した最短の時間で判定する
+    seconds = min(measure_startup(gui=False)['import_seconds'] for _ in range(3))
+
+    assert seconds <= DEFAULT_BUDGET_SECONDS * STARTUP_MARGIN, (
+        f"起動時間 {seconds:.3f}秒 が予算 {DEFAULT_BUDGET_SECONDS}秒 x {STARTUP_MARGIN} を超えています")
+
+
+def test_parse_import_times():
+    text = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   _io",
+        "import time:      2500 |       3000 |     PIL.Image",
+        "import time:       400 |       3400 | tools.mosaic",
+        "unrelated line",
+    ])
+
+    imports = parse_import_times(text)
+
+    assert [item['module'] for item in imports] == ['_io', 'PIL.Image', 'tools.mosaic']
+    assert [item['depth'] for item in imports] == [1, 2, 0]
+    assert imports[1]['self_seconds'] == 0.0025
+    assert imports[2]['cumulative_seconds'] == 0.0034
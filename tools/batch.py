@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バッチ処理モジュール - GUIなしでディレクトリ内の画像に操作を一括適用
+
+使用例:
+    python main.py batch screenshots/ -o redacted/ --op "mosaic:0,0,400,60,20" --op "flip:horizontal"
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import traceback
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tools.operations import ToolSet, parse_operation
+from tools.tiled_image import TiledImage, TILED_THRESHOLD_PIXELS
+from tools.encoder import SAVE_PROFILES, DEFAULT_SAVE_PROFILE
+
+# 一括処理の対象とする拡張子
+SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp')
+
+# ワーカープロセスごとのツール群 (プロセス初期化時に生成)
+_worker_tools = None
+_worker_io = None
+
+
+def worker_thread_count(workers):
+    """
+    ワーカープロセス1つあたりの推論スレッド数
+    (各ワーカーがCPUコア数のスレッドで推論すると、ワーカー数 x コア数のスレッドが奪い合うため)
+    """
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _glob_root(pattern):
+    """ワイルドカードを含まない先頭のディレクトリ部分を返す (例: 'shots/**/*.png' -> 'shots')"""
+    parts = Path(pattern).parts
+    for i, part in enumerate(parts):
+        if glob.escape(part) != part:
+            return str(Path(*parts[:i])) if i else '.'
+    return os.path.dirname(pattern) or '.'
+
+
+def _init_worker(save_profile=DEFAULT_SAVE_PROFILE, intra_op_threads=None):
+    """
+    ワーカープロセスの初期化
+
+    Args:
+        save_profile: 保存プロファイル
+        intra_op_threads: 背景透過のONNX Runtimeの演算内スレッド数 (worker_thread_count() の値)
+    """
+    global _worker_tools, _worker_io
+    from tools.io_utils import ImageIO
+    _worker_tools = ToolSet(intra_op_threads=intra_op_threads)
+    # 画像単位でプロセスを並列化しているため、保存時のエンコードは1スレッドで行う
+    _worker_io = ImageIO(save_profile=save_profile)
+
+
+def _process_file(src_path, dst_path, operations, tools=None, image_io=None):
+    """
+    1ファイルを処理 (ワーカープロセス内で実行)
+
+    Args:
+        src_path: 入力ファイルのパス
+        dst_path: 出力ファイルのパス
+        operations: 適用する操作のリスト
+        tools: 使用する ToolSet (省略時はワーカープロセスのツール群)
+        image_io: 使用する ImageIO (省略時はワーカープロセスのもの)
+
+    Returns:
+        (入力パス, 成功フラグ, エラーメッセージ, 処理時間) のタプル
+    """
+    if tools is None:
+        if _worker_tools is None:
+            _init_worker()
+        tools, image_io = _worker_tools, _worker_io
+
+    start_time = time.perf_counter()
+    lazy_image = image = result = None
+    try:
+        # タイル処理する画像は Image.MAX_IMAGE_PIXELS を超えてもよい (全体は展開しない)
+        lazy_image = image_io.open_lazy(src_path, allow_large=True)
+        if lazy_image is None:
+            raise RuntimeError("画像を読み込めませんでした")
+
+        # 巨大な画像はタイル画像として扱い、操作が触れるタイルだけを読み書きする
+        # (範囲だけをデコードできる無圧縮のBMP・NPYのみ、それ以外の形式は全体を展開する。
+        #  画素数の上限を超える画像は、タイル処理できない場合は load() が例外を送出する)
+        large = (lazy_image.width * lazy_image.height >= TILED_THRESHOLD_PIXELS
+                 or lazy_image.exceeds_pixel_limit)
+        if large and lazy_image.supports_region_decode:
+            image = TiledImage.from_lazy(lazy_image)
+        else:
+            image = lazy_image.load()
+
+        # 読み込んだ画像はこのワーカーだけが使うため、直接書き込んでよい
+        # 適用できなかった操作があれば (墨消しの漏れ)、保存せずに失敗として記録する
+        result = tools.apply_all(image, operations, inplace=True, strict=True)
+
+        os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+        if not image_io.save_to_file(result, dst_path):
+            raise RuntimeError("画像を保存できませんでした")
+
+        return (src_path, True, None, time.perf_counter() - start_time)
+
+    except Exception as e:
+        error_msg = f"{str(e)}\n{traceback.format_exc()}"
+        return (src_path, False, error_msg, time.perf_counter() - start_time)
+
+    finally:
+        # 失敗した場合もタイルの一時ファイルとメモリマップを閉じる
+        # (result を閉じると convert() / sub_image() の元のタイル画像も閉じる)
+        for opened in (result, image):
+            if isinstance(opened, TiledImage):
+                opened.close()
+        if lazy_image is not None:
+            lazy_image.close()
+
+
+class BatchProcessor:
+    """ディレクトリ・ワイルドカード指定の画像を複数プロセスで一括処理するクラス"""
+
+    def __init__(self, operations, output_dir, workers=None, output_format=None,
+                 save_profile=DEFAULT_SAVE_PROFILE, tools=None):
+        """
+        初期化
+
+        Args:
+            operations: parse_operation() で解析した操作のリスト
+            output_dir: 出力先ディレクトリ
+            workers: ワーカープロセス数 (省略時はCPUコア数)
+            output_format: 出力拡張子 (例: 'png')、省略時は入力と同じ
+            save_profile: 保存プロファイル ('fast', 'balanced', 'small')
+            tools: 指定した場合はワーカープロセスを使わず、この ToolSet で順番に処理する
+                   (常駐プロセスで読み込み済みの背景透過モデルを使う場合)
+        """
+        self.operations = list(operations)
+        self.output_dir = Path(output_dir)
+        self.tools = tools
+        self.workers = 1 if tools is not None else (workers or os.cpu_count() or 1)
+        self.output_format = output_format.lower().lstrip('.') if output_format else None
+        self.save_profile = save_profile
+
+    def collect_files(self, inputs, recursive=False):
+        """
+        入力指定から処理対象ファイルを収集
+
+        Args:
+            inputs: ディレクトリ・ファイル・ワイルドカードのリスト
+            recursive: ディレクトリをサブディレクトリまで探索するか
+
+        Returns:
+            (入力パス, 出力先からの相対パス) のリスト
+        """
+        files = []
+        seen = set()
+
+        def add(path, rel_path):
+            key = os.path.abspath(path)
+            if key not in seen and path.lower().endswith(SUPPORTED_EXTENSIONS):
+                seen.add(key)
+                files.append((path, rel_path))
+
+        for pattern in inputs:
+            if os.path.isdir(pattern):
+                base = Path(pattern)
+                walker = base.rglob('*') if recursive else base.iterdir()
+                for path in sorted(walker):
+                    if path.is_file():
+                        add(str(path), str(path.relative_to(base)))
+            else:
+                # ワイルドカードより前の部分を基準に相対パスを求める (サブディレクトリの同名ファイルを区別する)
+                base = _glob_root(pattern)
+                for path in sorted(glob.glob(pattern, recursive=recursive)):
+                    if os.path.isfile(path):
+                        add(path, os.path.relpath(path, base))
+
+        return files
+
+    def _output_path(self, rel_path):
+        """出力ファイルのパスを決定"""
+        if self.output_format:
+            rel_path = str(Path(rel_path).with_suffix('.' + self.output_format))
+        return str(self.output_dir / rel_path)
+
+    def output_paths(self, files, output=print):
+        """
+        各ファイルの出力パスを決定
+
+        出力先が重なる場合 (複数の入力の同じ相対パス、-f png での foo.jpg と foo.png など) は
+        2つ目以降に連番を付けて、前の結果を上書きしないようにする
+
+        Args:
+            files: collect_files() が返すリスト
+            output: 連番を付けた場合の通知を受け取る関数
+
+        Returns:
+            files と同じ順の出力パスのリスト
+        """
+        paths = [self._output_path(rel) for _, rel in files]
+        taken = {os.path.normcase(path) for path in paths}
+        used = set()
+        for i, (src, _) in enumerate(files):
+            path = paths[i]
+            if os.path.normcase(path) in used:
+                stem, ext = os.path.splitext(path)
+                number = 1
+                while os.path.normcase(f"{stem}_{number}{ext}") in taken:
+                    number += 1
+                path = paths[i] = f"{stem}_{number}{ext}"
+                taken.add(os.path.normcase(path))
+                output(f"出力先が重複するため、{src} は {path} に保存します")
+            used.add(os.path.normcase(path))
+        return paths
+
+    def run(self, files, verbose=True, output=print):
+        """
+        一括処理を実行
+
+        Args:
+            files: collect_files() が返すリスト
+            verbose: 1ファイルごとの進捗を表示するか
+            output: 進捗の1行を受け取る関数 (常駐プロセスでは転送元のプロセスに送る)
+
+        Returns:
+            集計結果の辞書
+        """
+        results = []
+        start_time = time.perf_counter()
+        dst_paths = self.output_paths(files, output)
+
+        def report(done, result):
+            results.append(result)
+            if verbose:
+                src, ok, error, elapsed = result
+                status = "OK" if ok else "失敗"
+                output(f"[{done}/{len(files)}] {status} {src} ({elapsed:.2f}秒)")
+                if not ok:
+                    output(f"    {error.splitlines()[0] if error else ''}")
+
+        if self.tools is not None:
+            # 渡されたツール群で順番に処理 (ワーカープロセスを起動しない)
+            from tools.io_utils import ImageIO
+            image_io = ImageIO(save_profile=self.save_profile)
+            for done, ((src, _), dst) in enumerate(zip(files, dst_paths), 1):
+                report(done, _process_file(src, dst, self.operations, self.tools, image_io))
+        else:
+            # 背景透過のモデルはワーカーごとに読み込まれるため、推論スレッドはCPUコアをワーカーで分け合う
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(self.save_profile, worker_thread_count(self.workers))) as executor:
+                futures = {
+                    executor.submit(_process_file, src, dst, self.operations): src
+                    for (src, _), dst in zip(files, dst_paths)
+                }
+
+                for done, future in enumerate(as_completed(futures), 1):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # ワーカープロセス自体が異常終了した場合もファイル単位で記録
+                        result = (futures[future], False, str(e), 0.0)
+                    report(done, result)
+
+        elapsed = time.perf_counter() - start_time
+        succeeded = sum(1 for r in results if r[1])
+
+        return {
+            'total': len(files),
+            'succeeded': succeeded,
+            'failed': [(r[0], r[2]) for r in results if not r[1]],
+            'elapsed': elapsed,
+            'images_per_sec': succeeded / elapsed if elapsed > 0 else 0.0,
+            'workers': self.workers,
+        }
+
+
+def print_summary(summary, output=print):
+    """集計結果を表示 (output は1行を受け取る関数)"""
+    output("\n=== バッチ処理結果 ===")
+    output(f"対象: {summary['total']}件 / 成功: {summary['succeeded']}件 / 失敗: {len(summary['failed'])}件")
+    output(f"処理時間: {summary['elapsed']:.2f}秒 ({summary['workers']}プロセス)")
+    output(f"スループット: {summary['images_per_sec']:.2f} 枚/秒")
+    for src, error in summary['failed']:
+        first_line = error.splitlines()[0] if error else ''
+        output(f"  失敗: {src}: {first_line}")
+
+
+def _operation_arg(spec):
+    """argparse用の操作指定の変換"""
+    try:
+        return parse_operation(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    """コマンドライン引数のパーサーを作成"""
+    parser = argparse.ArgumentParser(
+        prog='quicksnap batch',
+        description='GUIなしで画像に操作を一括適用します'
+    )
+    parser.add_argument('inputs', nargs='+',
+                        help='入力ディレクトリ・ファイル・ワイルドカード (例: "shots/*.png")')
+    parser.add_argument('-o', '--output', required=True, help='出力先ディレクトリ')
+    parser.add_argument('--op', dest='operations', action='append', type=_operation_arg, required=True,
+                        metavar='SPEC',
+                        help='適用する操作 (指定順に適用): bg_remove / mosaic:x1,y1,x2,y2[,強度] / '
+                             'paint:x1,y1,x2,y2[,色] / trim:x1,y1,x2,y2 / rotate[:角度] / '
+                             'flip[:horizontal|vertical]')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='ワーカープロセス数 (既定: CPUコア数)')
+    parser.add_argument('-f', '--format', dest='output_format', choices=('png', 'jpg', 'jpeg', 'bmp', 'gif', 'webp'),
+                        help='出力形式 (既定: 入力と同じ)')
+    parser.add_argument('-p', '--profile', dest='save_profile', choices=tuple(SAVE_PROFILES),
+                        default=DEFAULT_SAVE_PROFILE, help=f'保存プロファイル (既定: {DEFAULT_SAVE_PROFILE})')
+    parser.add_argument('-r', '--recursive', action='store_true', help='サブディレクトリも処理する')
+    parser.add_argument('-q', '--quiet', action='store_true', help='ファイルごとの進捗を表示しない')
+    return parser
+
+
+def main(argv=None, tools=None, cwd=None, output=print):
+    """
+    バッチ処理のエントリーポイント
+
+    Args:
+        argv: コマンドライン引数 (省略時は sys.argv[1:])
+        tools: 指定した場合はこの ToolSet を使ってこのプロセス内で処理する (常駐プロセスでの実行用)
+        cwd: 相対パスの基準にするフォルダ (常駐プロセスに転送されたコマンドの実行用)
+        output: 進捗・結果の1行を受け取る関数 (常駐プロセスでは転送元のプロセスに送る)
+
+    Returns:
+        終了コード (全件成功で0、失敗ありで1、対象なしで2)
+    """
+    args = build_parser().parse_args(argv)
+    if cwd:
+        args.inputs = [os.path.join(cwd, pattern) for pattern in args.inputs]
+        args.output = os.path.join(cwd, args.output)
+
+    processor = BatchProcessor(args.operations, args.output, args.workers, args.output_format,
+                               args.save_profile, tools=tools)
+    files = processor.collect_files(args.inputs, recursive=args.recursive)
+    if not files:
+        output("処理対象の画像が見つかりません")
+        return 2
+
+    summary = processor.run(files, verbose=not args.quiet, output=output)
+    print_summary(summary, output)
+
+    return 0 if not summary['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
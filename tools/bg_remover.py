@@ -4,35 +4,198 @@
 背景透過処理モジュール - rembgライブラリを利用
 """
 
+import gc
 import os
 import sys
 import time
+import queue
+import threading
 import traceback
+import importlib.util
 from pathlib import Path
 from PIL import Image
 
+# 既定のモデル名
+DEFAULT_MODEL = "u2net"
+
+# 一括処理キューの終端を示す目印
+_END_OF_INPUT = object()
+
+
+def create_rembg_session(model_name, intra_op_threads=None, inter_op_threads=None):
+    """
+    rembgの推論セッションを作成 (既定のセッションファクトリ)
+
+    Args:
+        model_name: rembgのモデル名 (例: 'u2net', 'u2netp', 'isnet-general-use')
+        intra_op_threads: ONNX Runtimeの演算内スレッド数 (None で既定値)
+        inter_op_threads: ONNX Runtimeの演算間スレッド数 (None で既定値)
+
+    Returns:
+        rembgのセッションオブジェクト
+    """
+    import onnxruntime as ort
+    from rembg import new_session
+
+    sess_opts = ort.SessionOptions()
+    if intra_op_threads:
+        sess_opts.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        sess_opts.inter_op_num_threads = inter_op_threads
+
+    # スレッド数を指定できるよう、可能ならセッションクラスを直接生成する
+    try:
+        from rembg.sessions import sessions_class
+        for session_class in sessions_class:
+            if session_class.name() == model_name:
+                return session_class(model_name, sess_opts)
+    except ImportError:
+        pass
+
+    return new_session(model_name)
+
+
 class BackgroundRemover:
     """
     背景透過処理クラス
     rembgライブラリを使用して画像の背景を透過させる
+    推論セッションは一度だけ作成し、以降の処理で再利用する
     """
 
-    def __init__(self):
-        """初期化"""
+    def __init__(self, model_name=DEFAULT_MODEL, intra_op_threads=None, inter_op_threads=None,
+                 session_factory=None, prewarm=False, cache=None):
+        """
+        初期化
+
+        Args:
+            model_name: 使用するモデル名
+            intra_op_threads: ONNX Runtimeの演算内スレッド数
+            inter_op_threads: ONNX Runtimeの演算間スレッド数
+            session_factory: セッション生成関数 factory(model_name, intra_op_threads, inter_op_threads)
+                             (テスト用のスタブモデル差し替えなど。省略時は rembg のセッション)
+            prewarm: True の場合、バックグラウンドスレッドでセッションを事前に作成する
+            cache: 処理結果のキャッシュ (ResultCache、None でキャッシュしない)
+        """
         self.rembg_loaded = False
         self.model_downloaded = False
         self.last_error = None
 
-        # rembgのロード
-        try:
-            from rembg import remove
-            self.remove = remove
+        self.model_name = model_name
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.session_factory = session_factory or create_rembg_session
+        self.session = None
+        self.remove = None
+        self._session_lock = threading.Lock()
+        self._prewarm_thread = None
+        self.last_batch_stats = None
+        self.cache = cache
+
+        # rembgは読み込みに時間がかかる (onnxruntime などを読み込む) ため、ここではインストールの有無だけを確認し、
+        # 読み込みは最初のセッション作成時 (事前読み込みスレッドまたは最初の処理) に行う
+        self._rembg_installed = importlib.util.find_spec("rembg") is not None
+        if self._rembg_installed:
             self.rembg_loaded = True
-        except ImportError:
+        else:
             self.last_error = "rembgライブラリがインストールされていません。\n" \
                               "pip install rembg を実行してインストールしてください。"
+
+        # セッションファクトリが指定されていればrembgなしでも動作可能
+        if session_factory is not None:
+            self.rembg_loaded = True
+
+        if prewarm and self.rembg_loaded:
+            self.prewarm()
+
+    def prewarm(self):
+        """
+        バックグラウンドスレッドでセッションを作成し、モデルを読み込んでおく
+
+        Returns:
+            開始したスレッド (既に実行中の場合はそのスレッド)
+        """
+        if self._prewarm_thread is None or not self._prewarm_thread.is_alive():
+            self._prewarm_thread = threading.Thread(target=self._prewarm_worker, daemon=True)
+            self._prewarm_thread.start()
+        return self._prewarm_thread
+
+    def _prewarm_worker(self):
+        """事前読み込みスレッドの処理"""
+        try:
+            start_time = time.time()
+            session = self.get_session()
+            # 小さな画像で一度推論し、ランタイムの初期化も済ませておく
+            session.predict(Image.new('RGB', (32, 32)))
+            print(f"背景透過モデルの事前読み込み完了 ({self.model_name}): {time.time() - start_time:.2f}秒")
+        except Exception as e:
+            self.last_error = f"背景透過モデルの事前読み込みに失敗しました: {str(e)}"
+            print(self.last_error)
+
+    def get_session(self):
+        """
+        推論セッションを取得 (未作成の場合は作成する)
+
+        Returns:
+            セッションオブジェクト
+        """
+        if self.session is None:
+            with self._session_lock:
+                if self.session is None:
+                    self._load_rembg()
+                    start_time = time.time()
+                    self.session = self.session_factory(
+                        self.model_name, self.intra_op_threads, self.inter_op_threads
+                    )
+                    self.model_downloaded = True
+                    print(f"背景透過モデルを読み込みました ({self.model_name}): {time.time() - start_time:.2f}秒")
+        return self.session
+
+    def release(self):
+        """
+        推論セッションを解放してモデルのメモリを返す (次の処理または prewarm() で作り直す)
+
+        Returns:
+            解放した場合は True
+        """
+        with self._session_lock:
+            if self.session is None:
+                return False
+            self.session = None
+        gc.collect()
+        print(f"背景透過モデルを解放しました ({self.model_name})")
+        return True
+
+    def _load_rembg(self):
+        """rembgを読み込む (セッション作成時に一度だけ、_session_lock の中で呼ばれる)"""
+        if self.remove is not None or not self._rembg_installed:
+            return
+        try:
+            start_time = time.time()
+            from rembg import remove
+            self.remove = remove
+            print(f"rembgライブラリを読み込みました: {time.time() - start_time:.2f}秒")
         except Exception as e:
+            # スタブモデル (session_factory 指定) の場合は rembg なしで続行する
+            self._rembg_installed = False
             self.last_error = f"rembgライブラリのロード中にエラーが発生しました：{str(e)}"
+            print(self.last_error)
+
+    def _apply_mask(self, image, mask):
+        """推論結果のマスクを元画像のアルファチャンネルとして適用"""
+        mask = mask.convert('L')
+        if mask.size != image.size:
+            mask = mask.resize(image.size, Image.LANCZOS)
+        result = image.convert('RGBA')
+        result.putalpha(mask)
+        return result
+
+    def _remove_with_session(self, image, session):
+        """セッションを使って背景を除去"""
+        if self.remove is not None:
+            return self.remove(image, session=session)
+
+        # rembgがない場合 (スタブモデル) はマスクをアルファとして適用
+        return self._apply_mask(image, session.predict(image.convert('RGB'))[0])
 
     def process(self, image):
         """
@@ -50,13 +213,26 @@ class BackgroundRemover:
             return image
 
         try:
+            # 同じ画素・モデルの結果がキャッシュにあれば再利用
+            cache_key = None
+            if self.cache is not None:
+                start_time = time.time()
+                cache_key = self.cache.make_key(image, 'bg_remove', self.model_name)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    print(f"背景透過処理完了 (キャッシュ): {time.time() - start_time:.3f}秒")
+                    return cached
+
             # 処理を実行
+            session = self.get_session()
             start_time = time.time()
-            result = self.remove(image)
+            result = self._remove_with_session(image, session)
             process_time = time.time() - start_time
 
             print(f"背景透過処理完了: {process_time:.2f}秒")
-            self.model_downloaded = True
+
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
 
             return result
 
@@ -68,10 +244,117 @@ class BackgroundRemover:
             # エラーが発生した場合は元の画像を返す
             return image
 
+    def process_iter(self, images, queue_size=8):
+        """
+        複数画像の背景透過処理を順番に返すジェネレーター
+
+        画像ファイルの読み込みを別スレッドで先に進め、上限付きキューで推論側に渡す。
+        推論は1枚ずつ process() と同じ処理 (rembg の前処理・キャッシュ) で行い、結果は入力順に返す。
+        保持する画像はキューの分だけなので、入力数が増えてもメモリは増えない。
+
+        Args:
+            images: PIL.Image オブジェクトまたは画像ファイルパスのイテラブル
+            queue_size: 読み込み済み画像を保持するキューの上限
+
+        Yields:
+            背景が透過された PIL.Image オブジェクト
+            (推論に失敗した画像は元の画像、読み込めなかったファイルは None)
+        """
+        if not self.rembg_loaded:
+            print(self.last_error)
+            for image in images:
+                yield image if isinstance(image, Image.Image) else None
+            return
+
+        work_queue = queue.Queue(maxsize=max(1, queue_size))
+        stop_event = threading.Event()
+
+        def put(item):
+            # キューが満杯の間は待機 (中断された場合は終了)
+            while not stop_event.is_set():
+                try:
+                    work_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            try:
+                for image in images:
+                    enqueued_at = time.perf_counter()
+                    try:
+                        if not isinstance(image, Image.Image):
+                            image = Image.open(image)
+                            image.load()
+                    except Exception as e:
+                        print(f"背景透過の入力を読み込めませんでした: {str(e)}")
+                        image = None
+                    if not put((image, enqueued_at)):
+                        return
+            finally:
+                put(_END_OF_INPUT)
+
+        producer_thread = threading.Thread(target=producer, daemon=True)
+        producer_thread.start()
+
+        count = 0
+        total_latency = 0.0
+        max_latency = 0.0
+        start_time = time.perf_counter()
+
+        try:
+            while True:
+                item = work_queue.get()
+                if item is _END_OF_INPUT:
+                    break
+                image, enqueued_at = item
+                result = self.process(image) if image is not None else None
+
+                latency = time.perf_counter() - enqueued_at
+                count += 1
+                total_latency += latency
+                max_latency = max(max_latency, latency)
+                yield result
+
+        finally:
+            stop_event.set()
+            elapsed = time.perf_counter() - start_time
+            self.last_batch_stats = {
+                'count': count,
+                'elapsed': elapsed,
+                'images_per_sec': count / elapsed if elapsed > 0 else 0.0,
+                'mean_latency': total_latency / count if count else 0.0,
+                'max_latency': max_latency,
+            }
+            print(f"一括背景透過完了: {count}枚 / {elapsed:.2f}秒 "
+                  f"({self.last_batch_stats['images_per_sec']:.2f}枚/秒, "
+                  f"平均遅延 {self.last_batch_stats['mean_latency']:.2f}秒, "
+                  f"最大遅延 {max_latency:.2f}秒)")
+
+    def process_many(self, images, queue_size=8):
+        """
+        複数画像の背景透過処理を実行
+
+        結果をすべてリストに保持するため、大量の画像は process_iter() を使うこと
+
+        Args:
+            images: PIL.Image オブジェクトまたは画像ファイルパスのイテラブル
+            queue_size: 読み込み済み画像を保持するキューの上限
+
+        Returns:
+            背景が透過された PIL.Image オブジェクトのリスト (入力順)
+        """
+        return list(self.process_iter(images, queue_size=queue_size))
+
+    def get_last_batch_stats(self):
+        """最後の一括処理の統計 (枚数・処理時間・スループット・遅延) を返す"""
+        return self.last_batch_stats
+
     def get_last_error(self):
         """最後に発生したエラーメッセージを返す"""
         return self.last_error
 
     def is_ready(self):
         """背景透過処理が実行可能かどうかを返す"""
-        return self.rembg_loaded
\ No newline at end of file
+        return self.rembg_loaded
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DIB (デバイス独立ビットマップ) 解析モジュール
+Windowsのクリップボード (CF_DIB / CF_DIBV5) のデータを、BMPファイルを組み立てずに画像にする
+"""
+
+import io
+import struct
+from PIL import Image
+
+# 圧縮形式 (biCompression)
+BI_RGB = 0
+BI_RLE8 = 1
+BI_RLE4 = 2
+BI_BITFIELDS = 3
+BI_JPEG = 4
+BI_PNG = 5
+BI_ALPHABITFIELDS = 6
+
+# BITMAPCOREHEADER (OS/2形式) のヘッダーサイズ
+CORE_HEADER_SIZE = 12
+
+# BMPファイルヘッダーのサイズ
+FILE_HEADER_SIZE = 14
+
+# (ビット数, (R, G, B, A のマスク)) と raw デコーダーの画素の並びの対応
+MASK_RAWMODES = {
+    (32, (0xFF0000, 0xFF00, 0xFF, 0x0)): 'BGRX',
+    (32, (0xFF0000, 0xFF00, 0xFF, 0xFF000000)): 'BGRA',
+    (32, (0xFF, 0xFF00, 0xFF0000, 0x0)): 'RGBX',
+    (32, (0xFF, 0xFF00, 0xFF0000, 0xFF000000)): 'RGBA',
+    (32, (0xFF000000, 0xFF0000, 0xFF00, 0x0)): 'XBGR',
+    (32, (0xFF000000, 0xFF0000, 0xFF00, 0xFF)): 'ABGR',
+    (24, (0xFF0000, 0xFF00, 0xFF, 0x0)): 'BGR',
+    (16, (0xF800, 0x7E0, 0x1F, 0x0)): 'BGR;16',
+    (16, (0x7C00, 0x3E0, 0x1F, 0x0)): 'BGR;15',
+}
+
+# BI_RGB (マスクなし) の場合の画素の並び
+RGB_RAWMODES = {32: 'BGRX', 24: 'BGR', 16: 'BGR;15'}
+
+# パレット画像の画素の並び
+PALETTE_RAWMODES = {8: 'P', 4: 'P;4', 1: 'P;1'}
+
+
+class DibInfo:
+    """DIBヘッダーの解析結果"""
+
+    def __init__(self, header_size, width, height, top_down, bits, compression, masks, colors, pixel_offset):
+        self.header_size = header_size
+        self.width = width
+        self.height = height          # 常に正の値
+        self.top_down = top_down      # 上の行から格納されている場合は True
+        self.bits = bits
+        self.compression = compression
+        self.masks = masks            # (R, G, B, A) のマスク
+        self.colors = colors          # パレットの色数
+        self.pixel_offset = pixel_offset
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    @property
+    def stride(self):
+        """1行のバイト数 (4バイト境界に揃える)"""
+        return ((self.width * self.bits + 31) // 32) * 4
+
+    @property
+    def palette_entry_size(self):
+        """パレット1色のバイト数 (OS/2形式はBGR、それ以外はBGRX)"""
+        return 3 if self.header_size == CORE_HEADER_SIZE else 4
+
+
+def parse_dib_header(data):
+    """
+    DIBのヘッダーを解析し、パレット・マスクを考慮した画素データの位置を求める
+
+    Args:
+        data: DIBのバイト列 (BITMAPINFOHEADER から始まる、BMPファイルヘッダーなし)
+
+    Returns:
+        DibInfo オブジェクト
+
+    Raises:
+        ValueError: DIBとして解析できない場合
+    """
+    if len(data) < 4:
+        raise ValueError("DIBのデータが短すぎます")
+    header_size, = struct.unpack_from('<I', data, 0)
+    if header_size > len(data):
+        raise ValueError(f"DIBのヘッダーサイズが不正です: {header_size}")
+
+    if header_size == CORE_HEADER_SIZE:
+        width, height, _, bits = struct.unpack_from('<HHHH', data, 4)
+        compression, colors_used = BI_RGB, 0
+        palette_entry_size = 3
+    elif header_size >= 40:
+        width, height, _, bits, compression, _, _, _, colors_used, _ = \
+            struct.unpack_from('<iiHHIIiiII', data, 4)
+        palette_entry_size = 4
+    else:
+        raise ValueError(f"対応していないDIBヘッダーです: {header_size}バイト")
+
+    if width <= 0 or height == 0:
+        raise ValueError(f"DIBの画像サイズが不正です: {width}x{height}")
+
+    # マスクは BITMAPINFOHEADER (40バイト) ではヘッダーの直後、V2以降のヘッダーではヘッダーの中にある
+    masks = (0, 0, 0, 0)
+    mask_bytes = 0
+    if compression in (BI_BITFIELDS, BI_ALPHABITFIELDS):
+        count = 4 if compression == BI_ALPHABITFIELDS else 3
+        if header_size == 40:
+            mask_offset, mask_bytes = header_size, count * 4
+        else:
+            mask_offset = 40
+            count = 4 if header_size >= 56 else count
+        if mask_offset + count * 4 > len(data):
+            raise ValueError("DIBのマスクが不足しています")
+        masks = struct.unpack_from(f'<{count}I', data, mask_offset) + (0,) * (4 - count)
+    elif header_size >= 56 and bits == 32:
+        # V4・V5ヘッダーの BI_RGB でもアルファのマスクは有効な場合がある
+        alpha_mask, = struct.unpack_from('<I', data, 52)
+        masks = (0, 0, 0, alpha_mask)
+
+    # 画素データはヘッダー・マスク・パレットの後ろにある
+    colors = colors_used or (1 << bits if bits in PALETTE_RAWMODES else 0)
+    pixel_offset = header_size + mask_bytes + colors * palette_entry_size
+    return DibInfo(header_size, width, abs(height), height < 0, bits, compression, masks, colors, pixel_offset)
+
+
+def dib_to_image(data):
+    """
+    DIBのバイト列を PIL.Image にする
+
+    無圧縮のDIBは memoryview で画素データの範囲だけを参照し、Image.frombuffer で直接デコードする
+    (BMPファイルヘッダーを連結したコピーを作らない)
+
+    Args:
+        data: DIBのバイト列 (bytes / bytearray / memoryview)
+
+    Returns:
+        PIL.Image オブジェクト (パレット画像は RGB、アルファを持つ場合は RGBA)
+
+    Raises:
+        ValueError: 解析できない・対応していない形式の場合
+    """
+    buffer = memoryview(data)
+    info = parse_dib_header(buffer)
+
+    # JPEG・PNGを埋め込んだDIBは画素データの位置からそのまま読み込む
+    if info.compression in (BI_JPEG, BI_PNG):
+        image = Image.open(io.BytesIO(buffer[info.pixel_offset:]))
+        image.load()
+        return image
+
+    # ランレングス圧縮は正しい画素の位置を入れたBMPファイルヘッダーを付けてPILに任せる
+    if info.compression in (BI_RLE8, BI_RLE4):
+        return _decode_as_bmp_file(buffer, info)
+
+    rawmode = _rawmode(info)
+    pixels = buffer[info.pixel_offset:info.pixel_offset + info.stride * info.height]
+    if len(pixels) < info.stride * info.height:
+        raise ValueError("DIBの画素データが不足しています")
+
+    orientation = 1 if info.top_down else -1
+    if rawmode in PALETTE_RAWMODES.values():
+        image = Image.frombuffer('P', info.size, pixels, 'raw', rawmode, info.stride, orientation)
+        palette_start = info.pixel_offset - info.colors * info.palette_entry_size
+        palette = buffer[palette_start:palette_start + info.colors * info.palette_entry_size]
+        image.putpalette(bytes(palette), 'BGRX' if info.palette_entry_size == 4 else 'BGR')
+        return image.convert('RGB')
+
+    mode = 'RGBA' if 'A' in rawmode else 'RGB'
+    image = Image.frombuffer(mode, info.size, pixels, 'raw', rawmode, info.stride, orientation)
+    if mode == 'RGBA' and image.getextrema()[3] == (0, 0):
+        # アルファがすべて0の場合は、アルファを使っていない画像として扱う (多くのアプリが0で埋めるため)
+        image = image.convert('RGB')
+    return image
+
+
+def _rawmode(info):
+    """DIBのビット数とマスクから raw デコーダーの画素の並びを決める"""
+    if info.bits in PALETTE_RAWMODES:
+        return PALETTE_RAWMODES[info.bits]
+
+    if info.compression in (BI_BITFIELDS, BI_ALPHABITFIELDS):
+        rawmode = MASK_RAWMODES.get((info.bits, info.masks))
+        if rawmode is None:
+            # アルファのマスクは無視して色のマスクだけで判定する
+            rawmode = MASK_RAWMODES.get((info.bits, info.masks[:3] + (0,)))
+        if rawmode is None:
+            raise ValueError(f"対応していないDIBのマスクです: {info.bits}ビット "
+                             f"{tuple(hex(mask) for mask in info.masks)}")
+        return rawmode
+
+    if info.compression != BI_RGB or info.bits not in RGB_RAWMODES:
+        raise ValueError(f"対応していないDIBの形式です: {info.bits}ビット 圧縮{info.compression}")
+
+    # V4・V5ヘッダーで32ビットのアルファのマスクが指定されている場合はアルファとして扱う
+    if info.bits == 32 and info.masks[3] == 0xFF000000:
+        return 'BGRA'
+    return RGB_RAWMODES[info.bits]
+
+
+def _decode_as_bmp_file(buffer, info):
+    """BMPファイルヘッダーを付けてPILのBMPデコーダーで読み込む (圧縮されたDIB用)"""
+    file_header = b'BM' + struct.pack('<IHHI', FILE_HEADER_SIZE + len(buffer), 0, 0,
+                                      FILE_HEADER_SIZE + info.pixel_offset)
+    image = Image.open(io.BytesIO(file_header + bytes(buffer)))
+    image.load()
+    return image.convert('RGB') if image.mode == 'P' else image
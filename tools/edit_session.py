@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+編集セッションモジュール
+元画像に適用した操作を記録し、結果を遅延評価する (非破壊編集)
+"""
+
+from collections import OrderedDict
+from PIL import ImageChops
+
+from tools.result_cache import image_nbytes
+
+# 出力を破棄せずに保持し続ける (再計算しない) 重い操作
+EXPENSIVE_OPERATIONS = ('bg_remove',)
+
+
+def changed_box(before, after):
+    """
+    2つの画像で画素が異なる範囲を返す
+
+    Args:
+        before: 変更前の PIL.Image オブジェクト
+        after: 変更後の PIL.Image オブジェクト
+
+    Returns:
+        異なる範囲の矩形 (x1, y1, x2, y2)、同一なら None
+        サイズやモードが異なる場合は画像全体
+    """
+    if before.size != after.size or before.mode != after.mode:
+        return (0, 0, after.width, after.height)
+
+    # getbbox() はRGBAではアルファしか見ないため、バンドごとに調べる
+    boxes = [band.getbbox() for band in ImageChops.difference(before, after).split()]
+    boxes = [box for box in boxes if box]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+class EditSession:
+    """
+    編集セッションクラス
+    操作 (背景透過・モザイク・塗りつぶし・トリミング・回転・反転) を順に記録し、
+    各操作の出力をメモ化する。途中の操作のパラメータを変えた場合は、
+    その操作以降だけを再計算する。
+    """
+
+    def __init__(self, source, toolset, max_cache_bytes=256 * 1024 * 1024):
+        """
+        初期化
+
+        Args:
+            source: 元画像 (PIL.Image オブジェクト、変更しないこと)
+            toolset: 操作の適用に使う ToolSet
+            max_cache_bytes: メモ化した出力を保持する上限バイト数 (重い操作の出力は対象外)
+        """
+        self.source = source
+        self.toolset = toolset
+        self.max_cache_bytes = max_cache_bytes
+
+        self.operations = []          # (操作名, パラメータ辞書) のリスト
+        self._outputs = OrderedDict()  # 操作のインデックス -> 出力画像 (LRU順)
+        self.evaluated_count = 0      # 実際に計算した操作の数 (統計用)
+
+    def append(self, operation, output=None):
+        """
+        操作を末尾に追加
+
+        Args:
+            operation: (操作名, パラメータ辞書)
+            output: 計算済みの出力画像 (GUI側で適用済みの場合に渡すとメモ化される)
+        """
+        name, params = operation
+        self.operations.append((name, dict(params)))
+        if output is not None:
+            self._memoize(len(self.operations) - 1, output)
+
+    def pop(self):
+        """末尾の操作を取り除く"""
+        if self.operations:
+            self.operations.pop()
+            self._invalidate(len(self.operations))
+
+    def update(self, index, output=None, **params):
+        """
+        操作のパラメータを変更し、その操作以降の出力を無効にする
+
+        Args:
+            index: 操作のインデックス
+            output: 新しいパラメータで計算済みの出力画像 (渡すとメモ化される)
+            params: 変更するパラメータ
+
+        Returns:
+            変更前のパラメータ辞書 (元に戻す用)
+        """
+        name, old_params = self.operations[index]
+        new_params = dict(old_params)
+        new_params.update(params)
+        self.operations[index] = (name, new_params)
+        if new_params != old_params:
+            self._invalidate(index)
+        if output is not None:
+            self._memoize(index, output)
+        return old_params
+
+    def find_last(self, name):
+        """
+        指定した名前の最後の操作のインデックスを返す
+
+        Returns:
+            インデックス、ない場合は None
+        """
+        for index in range(len(self.operations) - 1, -1, -1):
+            if self.operations[index][0] == name:
+                return index
+        return None
+
+    def get_params(self, index):
+        """操作のパラメータ辞書を返す"""
+        return dict(self.operations[index][1])
+
+    def get_input(self, index):
+        """
+        操作への入力画像を返す (メモ化されていない場合は None、計算はしない)
+
+        Args:
+            index: 操作のインデックス
+        """
+        if index == 0:
+            return self.source
+        return self._outputs.get(index - 1)
+
+    def render(self):
+        """
+        全操作を適用した結果を返す
+        メモ化された出力のうち最も後ろのものから再計算する
+
+        Returns:
+            PIL.Image オブジェクト
+        """
+        count = len(self.operations)
+        if count == 0:
+            return self.source
+
+        # メモ化されている最も後ろの出力を起点にする
+        start = count - 1
+        while start >= 0 and start not in self._outputs:
+            start -= 1
+
+        image = self._outputs[start] if start >= 0 else self.source
+        if start >= 0:
+            self._outputs.move_to_end(start)
+
+        for index in range(start + 1, count):
+            image = self.toolset.apply(image, self.operations[index])
+            self.evaluated_count += 1
+            self._memoize(index, image)
+
+        return image
+
+    def _is_pinned(self, index):
+        """破棄しない出力かどうか (重い操作の出力、最新の出力と最後の操作への入力)"""
+        return (self.operations[index][0] in EXPENSIVE_OPERATIONS
+                or index >= len(self.operations) - 2)
+
+    def _memoize(self, index, image):
+        """出力をメモ化し、上限を超えた分を古い順に破棄"""
+        # 直接書き込まれた画像は、書き込まれる前の出力としては使えない
+        for other_index in [i for i, output in self._outputs.items() if output is image and i != index]:
+            del self._outputs[other_index]
+
+        self._outputs[index] = image
+        self._outputs.move_to_end(index)
+
+        for old_index in list(self._outputs):
+            if self.get_cache_bytes() <= self.max_cache_bytes:
+                break
+            if not self._is_pinned(old_index):
+                del self._outputs[old_index]
+
+    def _invalidate(self, start):
+        """指定したインデックス以降の出力を破棄"""
+        for index in [i for i in self._outputs if i >= start]:
+            del self._outputs[index]
+
+    def get_cache_bytes(self):
+        """メモ化した出力の合計バイト数 (同じ画像オブジェクトは1回だけ数える)"""
+        unique = {id(image): image for image in self._outputs.values()}
+        return sum(image_nbytes(image) for image in unique.values())
+
+    def get_stats(self):
+        """操作数・メモ化の状況などの統計を返す"""
+        return {
+            'operations': len(self.operations),
+            'cached_outputs': len(self._outputs),
+            'cache_bytes': self.get_cache_bytes(),
+            'evaluated': self.evaluated_count,
+        }
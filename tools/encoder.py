@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画像エンコードモジュール
+保存プロファイル (fast / balanced / small) ごとのエンコード設定と、
+行の帯ごとに複数スレッドで圧縮するPNGエンコーダーを提供する
+"""
+
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageChops
+
+# 拡張子と保存形式の対応
+SAVE_FORMATS = {
+    '.png': 'PNG',
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.bmp': 'BMP',
+    '.gif': 'GIF',
+    '.webp': 'WEBP',
+}
+
+# 保存プロファイルごとのエンコード設定 (Image.save に渡す引数)
+# JPEGの subsampling は 0: 4:4:4 / 1: 4:2:2 / 2: 4:2:0
+SAVE_PROFILES = {
+    'fast': {
+        'PNG': {'compress_level': 1, 'compress_type': zlib.Z_RLE},
+        'JPEG': {'quality': 90, 'optimize': False, 'progressive': False, 'subsampling': 2},
+        'WEBP': {'quality': 80, 'method': 0},
+    },
+    'balanced': {
+        'PNG': {'compress_level': 3},
+        'JPEG': {'quality': 90, 'optimize': True, 'progressive': False, 'subsampling': 0},
+        'WEBP': {'quality': 80, 'method': 4},
+    },
+    'small': {
+        'PNG': {'compress_level': 9, 'optimize': True},
+        'JPEG': {'quality': 85, 'optimize': True, 'progressive': True, 'subsampling': 2},
+        'WEBP': {'quality': 75, 'method': 6},
+    },
+}
+DEFAULT_SAVE_PROFILE = 'balanced'
+
+# 並列PNGエンコードで使う行フィルター (fast は圧縮前の処理も軽くする)
+PNG_ROW_FILTERS = {'fast': 'sub', 'balanced': 'up', 'small': 'up'}
+
+# PNGのカラータイプ (ビット深度は8)
+PNG_COLOR_TYPES = {'L': 0, 'RGB': 2, 'LA': 4, 'RGBA': 6}
+
+# 並列PNGエンコードで1スレッドに渡す行数
+PARALLEL_CHUNK_ROWS = 256
+
+# PNGの行フィルター種別
+_ROW_FILTER_TYPES = {'none': 0, 'sub': 1, 'up': 2}
+
+# Adler-32の法
+_ADLER_BASE = 65521
+
+
+def parse_save_setting(value):
+    """
+    設定値 default_save_format を (拡張子, プロファイル) に分解する
+
+    'png' / 'png:fast' / 'webp:small' / 'small' のように指定できる
+
+    Args:
+        value: 設定値の文字列
+
+    Returns:
+        (拡張子 (例: '.png'), プロファイル名) のタプル
+    """
+    extension, profile = '.png', DEFAULT_SAVE_PROFILE
+    for part in str(value or '').lower().split(':'):
+        part = part.strip()
+        if part in SAVE_PROFILES:
+            profile = part
+        elif f'.{part.lstrip(".")}' in SAVE_FORMATS:
+            extension = f'.{part.lstrip(".")}'
+        elif part:
+            print(f"不明な保存形式・プロファイルのため無視します: {part}")
+    return extension, profile
+
+
+def get_save_format(file_path):
+    """ファイルの拡張子から保存形式を決定 (不明な拡張子はPNG)"""
+    return SAVE_FORMATS.get(os.path.splitext(file_path)[1].lower(), 'PNG')
+
+
+def get_save_options(save_format, profile=DEFAULT_SAVE_PROFILE):
+    """
+    保存形式とプロファイルに対応する Image.save の引数を返す
+
+    Args:
+        save_format: 保存形式 ('PNG', 'JPEG', 'WEBP' など)
+        profile: プロファイル名 ('fast', 'balanced', 'small')
+
+    Returns:
+        引数の辞書 (設定のない形式は空の辞書)
+    """
+    if profile not in SAVE_PROFILES:
+        print(f"不明な保存プロファイルのため {DEFAULT_SAVE_PROFILE} を使用します: {profile}")
+        profile = DEFAULT_SAVE_PROFILE
+    return dict(SAVE_PROFILES[profile].get(save_format, {}))
+
+
+def write_png(fp, size, mode, strips, compress_level=6, compress_type=zlib.Z_DEFAULT_STRATEGY,
+              row_filter='none', workers=1):
+    """
+    上から順に並んだ帯画像をPNGとして書き出す
+
+    帯ごとに行フィルターと圧縮を行い、workers が2以上なら帯を複数スレッドで並列に圧縮する
+    (zlibは圧縮中にGILを解放する)。各帯の圧縮結果は Z_SYNC_FLUSH で区切って
+    1つのzlibストリームとしてつなげるため、出力は通常のPNGとして読める
+
+    Args:
+        fp: 書き込み先のバイナリファイルオブジェクト
+        size: 画像サイズ (width, height)
+        mode: 画像モード ('L', 'LA', 'RGB', 'RGBA')
+        strips: 帯画像 (PIL.Image) のイテラブル
+        compress_level: zlibの圧縮レベル (0-9)
+        compress_type: zlibの圧縮戦略 (zlib.Z_RLE など)
+        row_filter: 行フィルター ('none', 'sub', 'up')
+        workers: 圧縮に使うスレッド数
+    """
+    width, height = size
+    fp.write(b'\x89PNG\r\n\x1a\n')
+    _write_png_chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0))
+
+    # zlibヘッダーは同じ圧縮レベルの空ストリームから取り出す
+    header = zlib.compress(b'', compress_level)[:2]
+    checksum = 1
+    previous_row = None
+    rows_done = 0
+
+    def compressed_chunks(executor):
+        nonlocal previous_row, rows_done
+        pending = deque()
+        for strip in strips:
+            if strip.mode != mode:
+                strip = strip.convert(mode)
+            rows_done += strip.height
+            args = (strip, previous_row, row_filter, compress_level, compress_type, rows_done >= height)
+            # 'up' フィルターは前の帯の最終行を参照する
+            previous_row = strip.crop((0, strip.height - 1, width, strip.height))
+            if executor is None:
+                yield _compress_strip(*args)
+                continue
+            pending.append(executor.submit(_compress_strip, *args))
+            # 先行する帯の数を制限し、圧縮済みデータを溜め込みすぎない
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quicksnap-encoder") if workers > 1 else None
+    try:
+        first = True
+        for data, adler, length in compressed_chunks(executor):
+            checksum = _adler32_combine(checksum, adler, length)
+            if first:
+                data = header + data
+                first = False
+            if data:
+                _write_png_chunk(fp, b'IDAT', data)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    _write_png_chunk(fp, b'IDAT', struct.pack('>I', checksum))
+    _write_png_chunk(fp, b'IEND', b'')
+
+
+def iter_image_strips(image, rows=PARALLEL_CHUNK_ROWS):
+    """画像を rows 行ずつの帯に分けて返す"""
+    width, height = image.size
+    for y in range(0, height, rows):
+        yield image.crop((0, y, width, min(y + rows, height)))
+
+
+def _compress_strip(strip, previous_row, row_filter, compress_level, compress_type, last):
+    """
+    帯画像に行フィルターをかけて圧縮する (ワーカースレッドで実行)
+
+    Returns:
+        (圧縮データ, フィルター後データのAdler-32, フィルター後データの長さ) のタプル
+    """
+    filtered = _filter_strip(strip, previous_row, row_filter)
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS, 8, compress_type)
+    data = compressor.compress(filtered)
+    # 最後の帯以外はバイト境界で区切り、次の帯の圧縮データをそのままつなげられるようにする
+    data += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return data, zlib.adler32(filtered), len(filtered)
+
+
+def _filter_strip(strip, previous_row, row_filter):
+    """
+    帯画像の各行にPNGの行フィルターをかけ、先頭にフィルター種別を付けたバイト列を返す
+
+    Sub は1画素左、Up は1行上の画素との差 (256の剰余) を ImageChops で求める
+    """
+    width, height = strip.size
+    if row_filter == 'sub':
+        shifted = Image.new(strip.mode, strip.size)
+        if width > 1:
+            shifted.paste(strip.crop((0, 0, width - 1, height)), (1, 0))
+        strip = ImageChops.subtract_modulo(strip, shifted)
+    elif row_filter == 'up':
+        shifted = Image.new(strip.mode, strip.size)
+        if previous_row is not None:
+            shifted.paste(previous_row, (0, 0))
+        if height > 1:
+            shifted.paste(strip.crop((0, 0, width, height - 1)), (0, 1))
+        strip = ImageChops.subtract_modulo(strip, shifted)
+
+    raw = strip.tobytes()
+    stride = len(raw) // height
+    rows = [raw[row * stride:(row + 1) * stride] for row in range(height)]
+    # 区切り文字として各行の前にフィルター種別を挟む
+    return bytes([_ROW_FILTER_TYPES[row_filter]]).join([b''] + rows)
+
+
+def _adler32_combine(adler1, adler2, length2):
+    """
+    2つのデータのAdler-32から連結したデータのAdler-32を求める (zlibの adler32_combine と同じ計算)
+    """
+    remainder = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % _ADLER_BASE
+    sum1 = (sum1 + (adler2 & 0xffff) + _ADLER_BASE - 1) % _ADLER_BASE
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + _ADLER_BASE - remainder) % _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _write_png_chunk(fp, chunk_type, data):
+    fp.write(struct.pack('>I', len(data)))
+    fp.write(chunk_type)
+    fp.write(data)
+    fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
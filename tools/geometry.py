@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+矩形・座標計算のユーティリティ
+"""
+
+
+def clip_box(box, size):
+    """
+    矩形を画像の範囲内に制限
+
+    Args:
+        box: 矩形 (x1, y1, x2, y2)
+        size: 画像サイズ (width, height)
+
+    Returns:
+        制限後の矩形、範囲外で空になる場合は None
+    """
+    x1, y1, x2, y2 = box
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(size[0], x2), min(size[1], y2)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return (x1, y1, x2, y2)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+編集履歴 (元に戻す・やり直し) モジュール
+画像全体のコピーではなく、変更された領域や幾何変換のパラメータだけを記録する
+"""
+
+from collections import deque
+from PIL import Image
+
+from tools.result_cache import image_nbytes
+
+
+class _RegionStep:
+    """矩形領域の画素を入れ替えて元に戻す履歴 (モザイク・塗りつぶし・背景透過)"""
+
+    def __init__(self, label, image, box):
+        self.label = label
+        self.box = box
+        # 入れ替え用の「もう一方の状態」の画素とモード
+        self.pixels = image.crop(box)
+        self.mode = image.mode
+
+    @property
+    def nbytes(self):
+        return image_nbytes(self.pixels)
+
+    def _swap(self, image):
+        """記録している画素と現在の画素を入れ替える"""
+        other_pixels = image.crop(self.box)
+        other_mode = image.mode
+
+        if image.mode != self.mode:
+            # 塗りつぶしでRGBAに変換された場合などはモードも戻す
+            result = image.convert(self.mode)
+        else:
+            result = image.copy()
+        result.paste(self.pixels, self.box[:2])
+
+        self.pixels = other_pixels
+        self.mode = other_mode
+
+        # モードが変わった場合は全体の再描画が必要
+        changed_box = self.box if other_mode == result.mode else None
+        return result, changed_box
+
+    def undo(self, image):
+        return self._swap(image)
+
+    def redo(self, image):
+        return self._swap(image)
+
+
+class _TransposeStep:
+    """90度単位の回転・反転の履歴 (パラメータのみ記録)"""
+
+    # 各変換とその逆変換
+    INVERSE = {
+        Image.ROTATE_90: Image.ROTATE_270,
+        Image.ROTATE_180: Image.ROTATE_180,
+        Image.ROTATE_270: Image.ROTATE_90,
+        Image.FLIP_LEFT_RIGHT: Image.FLIP_LEFT_RIGHT,
+        Image.FLIP_TOP_BOTTOM: Image.FLIP_TOP_BOTTOM,
+    }
+
+    nbytes = 0
+
+    def __init__(self, label, method):
+        self.label = label
+        self.method = method
+
+    def undo(self, image):
+        return image.transpose(self.INVERSE[self.method]), None
+
+    def redo(self, image):
+        return image.transpose(self.method), None
+
+
+class _CropStep:
+    """トリミングの履歴 (切り取り範囲と、切り落とされた周囲の帯だけを記録)"""
+
+    def __init__(self, label, image, box):
+        self.label = label
+        self.box = box
+        self.size = image.size
+        self.mode = image.mode
+
+        width, height = image.size
+        x1, y1, x2, y2 = box
+        strip_boxes = [
+            (0, 0, width, y1),        # 上
+            (0, y2, width, height),   # 下
+            (0, y1, x1, y2),          # 左
+            (x2, y1, width, y2),      # 右
+        ]
+        self.strips = [(b, image.crop(b)) for b in strip_boxes if b[2] > b[0] and b[3] > b[1]]
+
+    @property
+    def nbytes(self):
+        return sum(image_nbytes(strip) for _, strip in self.strips)
+
+    def undo(self, image):
+        if image.mode != self.mode:
+            image = image.convert(self.mode)
+        result = Image.new(self.mode, self.size)
+        result.paste(image, self.box[:2])
+        for box, strip in self.strips:
+            result.paste(strip, box[:2])
+        return result, None
+
+    def redo(self, image):
+        return image.crop(self.box), None
+
+
+class EditHistory:
+    """
+    元に戻す・やり直しの履歴管理クラス
+    記録の合計バイト数が上限を超えたら古い履歴から破棄する
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_steps=100):
+        """
+        初期化
+
+        Args:
+            max_bytes: 履歴に保持する画素データの上限バイト数
+            max_steps: 元に戻せる最大回数
+        """
+        self.max_bytes = max_bytes
+        self.max_steps = max_steps
+        self._undo_stack = deque()
+        self._redo_stack = []
+        self.evictions = 0
+
+    def record_region(self, image, box, label='', on_undo=None, on_redo=None):
+        """
+        矩形領域を変更する前の画素を記録
+
+        Args:
+            image: 変更前の PIL.Image オブジェクト
+            box: 変更される矩形 (x1, y1, x2, y2)
+            label: 操作名
+            on_undo: 元に戻したときに呼ぶ関数 (編集セッションの同期など)
+            on_redo: やり直したときに呼ぶ関数
+
+        Returns:
+            記録した場合は True (box が空の場合は記録しない)
+        """
+        return self.record_captured(self.capture_region(image, box, label), on_undo, on_redo)
+
+    def capture_region(self, image, box, label=''):
+        """
+        矩形領域の変更前の画素を取っておく (履歴にはまだ追加しない)
+
+        画像に直接書き込む編集で、書き込む前に画素を取り、編集が成功した場合だけ
+        record_captured() で履歴に追加するために使う
+
+        Returns:
+            record_captured() に渡す記録 (box が空の場合は None)
+        """
+        if not box:
+            return None
+        return _RegionStep(label, image, box)
+
+    def record_captured(self, step, on_undo=None, on_redo=None):
+        """
+        capture_region() で取っておいた画素を履歴に追加
+
+        Returns:
+            記録した場合は True (step が None の場合は記録しない)
+        """
+        if step is None:
+            return False
+        self._push(step, on_undo, on_redo)
+        return True
+
+    def record_full(self, image, label='', on_undo=None, on_redo=None):
+        """画像全体を変更する前の画素を記録 (背景透過など)"""
+        return self.record_region(image, (0, 0, image.width, image.height), label, on_undo, on_redo)
+
+    def record_transpose(self, method, label='', on_undo=None, on_redo=None):
+        """
+        90度単位の回転・反転を記録
+
+        Args:
+            method: Image.transpose() の変換 (Image.ROTATE_90, Image.FLIP_LEFT_RIGHT など)
+            label: 操作名
+            on_undo: 元に戻したときに呼ぶ関数
+            on_redo: やり直したときに呼ぶ関数
+        """
+        self._push(_TransposeStep(label, method), on_undo, on_redo)
+        return True
+
+    def record_crop(self, image, box, label='', on_undo=None, on_redo=None):
+        """
+        トリミング前の画像から、切り落とされる部分を記録
+
+        Args:
+            image: トリミング前の PIL.Image オブジェクト
+            box: 切り取り範囲 (x1, y1, x2, y2)
+            label: 操作名
+            on_undo: 元に戻したときに呼ぶ関数
+            on_redo: やり直したときに呼ぶ関数
+
+        Returns:
+            記録した場合は True
+        """
+        if not box:
+            return False
+        self._push(_CropStep(label, image, box), on_undo, on_redo)
+        return True
+
+    def _push(self, step, on_undo=None, on_redo=None):
+        """履歴を追加し、上限を超えた分を古い順に破棄 (直近の1件は上限を超えても保持)"""
+        step.on_undo = on_undo
+        step.on_redo = on_redo
+        self._undo_stack.append(step)
+        self._redo_stack.clear()
+
+        while len(self._undo_stack) > 1 and (len(self._undo_stack) > self.max_steps
+                                             or self.get_total_bytes() > self.max_bytes):
+            self._undo_stack.popleft()
+            self.evictions += 1
+
+    def undo(self, image):
+        """
+        直前の操作を元に戻す
+
+        Args:
+            image: 現在の PIL.Image オブジェクト
+
+        Returns:
+            (元に戻した PIL.Image オブジェクト, 変更された矩形またはNone)
+            元に戻せない場合は None
+        """
+        if not self._undo_stack:
+            return None
+        step = self._undo_stack.pop()
+        result = step.undo(image)
+        self._redo_stack.append(step)
+        if step.on_undo:
+            step.on_undo()
+        return result
+
+    def redo(self, image):
+        """
+        元に戻した操作をやり直す
+
+        Args:
+            image: 現在の PIL.Image オブジェクト
+
+        Returns:
+            (やり直した PIL.Image オブジェクト, 変更された矩形またはNone)
+            やり直せない場合は None
+        """
+        if not self._redo_stack:
+            return None
+        step = self._redo_stack.pop()
+        result = step.redo(image)
+        self._undo_stack.append(step)
+        if step.on_redo:
+            step.on_redo()
+        return result
+
+    def can_undo(self):
+        return bool(self._undo_stack)
+
+    def can_redo(self):
+        return bool(self._redo_stack)
+
+    def clear(self):
+        """履歴をすべて破棄"""
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+
+    def get_total_bytes(self):
+        """履歴が保持している画素データの合計バイト数"""
+        return (sum(step.nbytes for step in self._undo_stack)
+                + sum(step.nbytes for step in self._redo_stack))
+
+    def get_stats(self):
+        """履歴の件数・使用バイト数などの統計を返す"""
+        return {
+            'undo_steps': len(self._undo_stack),
+            'redo_steps': len(self._redo_stack),
+            'bytes': self.get_total_bytes(),
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions,
+        }
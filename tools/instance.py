@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常駐プロセス (単一インスタンス) モジュール
+常駐中のプロセスがローカルの名前付きパイプ (Windows) またはUNIXドメインソケットでコマンドを受け付け、
+後から起動したプロセスは引数 (ファイルを開く・貼り付け・バッチ処理) を転送して終了する
+(バッチ処理は常駐プロセスから進捗と終了コードを受け取り、終わるまで待つ)
+"""
+
+import os
+import sys
+import getpass
+import hashlib
+import secrets
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+from multiprocessing.connection import Listener, Client, AuthenticationError
+
+# 転送できるコマンド ('ping' は常駐プロセスの有無の確認用で、handler には渡さない)
+INSTANCE_COMMANDS = ('ping', 'show', 'open', 'paste', 'batch', 'quit')
+
+
+def instance_address(app_dir):
+    """
+    常駐プロセスの待ち受けアドレスを求める (ユーザーとアプリケーションのフォルダごとに別のアドレス)
+
+    Args:
+        app_dir: アプリケーションのフォルダ
+
+    Returns:
+        (アドレス, ファミリー ('AF_PIPE' または 'AF_UNIX')) のタプル
+    """
+    app_id = hashlib.sha1(str(Path(app_dir).resolve()).encode('utf-8')).hexdigest()[:10]
+    if sys.platform == 'win32':
+        return rf'\\.\pipe\quicksnap-{getpass.getuser()}-{app_id}', 'AF_PIPE'
+    # ソケットのパスは長さに上限 (約100文字) があるため、アプリケーションのフォルダではなく一時フォルダに置く
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f'quicksnap-{os.getuid()}-{app_id}.sock'), 'AF_UNIX'
+
+
+def send_to_instance(address, key_file, message, on_output=print):
+    """
+    常駐中のプロセスにコマンドを送る
+
+    Args:
+        address: instance_address() の戻り値
+        key_file: 認証キーのファイル
+        message: {'command', 'args', 'cwd'} の辞書
+        on_output: 最後の応答の前に送られてくる出力 {'output'} の各行を受け取る関数
+
+    Returns:
+        常駐プロセスの最後の応答 {'ok', 'message'} (バッチ処理は 'exit_code' も含む)、
+        常駐プロセスがない場合は None
+    """
+    try:
+        authkey = Path(key_file).read_bytes()
+    except OSError:
+        return None
+
+    try:
+        with Client(address[0], family=address[1], authkey=authkey) as conn:
+            conn.send(message)
+            while True:
+                reply = conn.recv()
+                if not isinstance(reply, dict) or 'output' not in reply:
+                    return reply
+                on_output(reply['output'])
+    except (OSError, EOFError):
+        # 待ち受けているプロセスがない (終了時に残ったソケットファイルなど)
+        return None
+    except AuthenticationError:
+        print("常駐中のQuickSnapの認証に失敗しました。新しいプロセスで起動します。")
+        return None
+
+
+class InstanceServer:
+    """
+    常駐プロセスのコマンド受付クラス
+
+    受け付けたコマンドは接続ごとのスレッドで handler に渡す。handler はすぐに戻り、
+    実際の処理はイベントループに任せること (GUI.post_event など)
+    処理の終わりを待つコマンドは、応答を順に返すイテラブル (stream_replies() など) を返す
+    """
+
+    def __init__(self, address, key_file, handler):
+        """
+        初期化
+
+        Args:
+            address: instance_address() の戻り値
+            key_file: 認証キーのファイル (起動のたびに新しいキーを書き込む)
+            handler: handler(メッセージ) で応答 {'ok', 'message'} を返す関数 (接続ごとのスレッドで呼ばれる)。
+                     応答のイテラブルを返した場合は順に送る ({'output'} の後に最後の応答)
+        """
+        self.address = address
+        self.key_file = Path(key_file)
+        self.handler = handler
+        self._listener = None
+        self._authkey = None
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        """
+        コマンドの受け付けを開始
+
+        Returns:
+            開始できた場合は True (ほかのプロセスが待ち受けている場合は False)
+        """
+        address, family = self.address
+        authkey = secrets.token_bytes(32)
+        try:
+            self._listener = Listener(address, family=family, authkey=authkey)
+        except OSError:
+            # 終了したプロセスのソケットファイルが残っている場合は削除してやり直す
+            if family != 'AF_UNIX' or send_to_instance(self.address, self.key_file, {'command': 'ping'}) is not None:
+                return False
+            try:
+                os.unlink(address)
+                self._listener = Listener(address, family=family, authkey=authkey)
+            except OSError as e:
+                print(f"常駐プロセスの待ち受けを開始できません: {str(e)}")
+                return False
+
+        # 認証キーは本人だけが読めるファイルに保存する
+        self.key_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.key_file), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(authkey)
+        self._authkey = authkey
+
+        self._thread = threading.Thread(target=self._serve, name="quicksnap-instance", daemon=True)
+        self._thread.start()
+        return True
+
+    def close(self):
+        """コマンドの受け付けを終了 (認証キーとソケットファイルを削除する)"""
+        if self._listener is None or self._closed:
+            return
+        self._closed = True
+        # accept() で待っているスレッドを起こすため、自分自身に接続する
+        try:
+            with Client(self.address[0], family=self.address[1], authkey=self._authkey):
+                pass
+        except Exception:
+            pass
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+        try:
+            self.key_file.unlink()
+        except OSError:
+            pass
+
+    def _serve(self):
+        """受付スレッドの処理 (接続ごとにスレッドを起動し、バッチ処理の実行中もほかのコマンドを受け付ける)"""
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # 認証に失敗した接続は無視して待ち受けを続ける
+                continue
+            if self._closed:
+                conn.close()
+                break
+            threading.Thread(target=self._handle, args=(conn,), name="quicksnap-instance-conn",
+                             daemon=True).start()
+
+    def _handle(self, conn):
+        """1接続につき1コマンドを処理"""
+        try:
+            with conn:
+                message = conn.recv()
+                if not isinstance(message, dict) or message.get('command') not in INSTANCE_COMMANDS:
+                    conn.send({'ok': False, 'message': f"不明なコマンドです: {message!r}"})
+                    return
+                if message['command'] == 'ping':
+                    conn.send({'ok': True, 'message': 'pong'})
+                    return
+                reply = self.handler(message)
+                for item in ([reply] if isinstance(reply, dict) else reply):
+                    conn.send(item)
+        except (OSError, EOFError):
+            # 送り元のプロセスが終了した (Ctrl+C など)。処理そのものは常駐プロセスで続ける
+            pass
+        except Exception as e:
+            print(f"常駐プロセスのコマンド処理エラー: {str(e)}\n{traceback.format_exc()}")
+
+
+def stream_replies(reply_queue):
+    """
+    キューに入れられた応答を順に返すジェネレーター (InstanceServer の handler の戻り値用)
+
+    Args:
+        reply_queue: 出力 {'output'} と最後の応答 {'ok', 'message', ...} を入れる queue.Queue
+
+    Yields:
+        応答の辞書 ('output' を含まない最後の応答で終わる)
+    """
+    while True:
+        reply = reply_queue.get()
+        yield reply
+        if 'output' not in reply:
+            return
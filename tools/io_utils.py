@@ -7,64 +7,66 @@
 import os
 import io
 import sys
+import stat
+import time
+import zlib
+import shutil
+import secrets
+import subprocess
 import traceback
+from functools import partial
 from pathlib import Path
-from PIL import Image, UnidentifiedImageError
+from PIL import Image, ImageGrab, UnidentifiedImageError
+
+from tools.lazy_image import LazyImage
+from tools.dib import dib_to_image
+from tools.tiled_image import TiledImage, save_png_stream, save_bmp_stream
+from tools.encoder import (DEFAULT_SAVE_PROFILE, PNG_COLOR_TYPES, PNG_ROW_FILTERS, get_save_format,
+                           get_save_options, iter_image_strips, write_png)
+
+# クリップボードのコマンドの待ち時間 (秒)
+CLIPBOARD_TIMEOUT = 10
+
+# クリップボードから読み込む画像形式 (優先順)
+CLIPBOARD_IMAGE_TYPES = ('image/png', 'image/bmp', 'image/jpeg')
+
+# 保存時の一時ファイルの作成を試みる回数 (同じ名前のファイルがあった場合は別の名前で作り直す)
+TEMP_FILE_ATTEMPTS = 100
 
 class ImageIO:
     """画像の読み込み・保存を扱うクラス"""
 
-    def __init__(self):
-        """初期化"""
-        # クリップボード操作用
-        self.clipboard_available = False
-        try:
-            import pyperclip
-            self.pyperclip = pyperclip
-            self.clipboard_available = True
-        except ImportError:
-            print("pyperclipがインストールされていません。クリップボード機能は無効です。")
-        except Exception as e:
-            print(f"クリップボード機能の初期化エラー: {str(e)}")
+    def __init__(self, save_profile=DEFAULT_SAVE_PROFILE, save_workers=1):
+        """
+        初期化
 
-        # OpenCV (クリップボード画像取得用)
-        self.cv2_available = False
-        try:
-            import cv2
-            import numpy as np
-            self.cv2 = cv2
-            self.np = np
-            self.cv2_available = True
-        except ImportError:
-            print("OpenCVがインストールされていません。一部の機能が制限されます。")
-        except Exception as e:
-            print(f"OpenCVの初期化エラー: {str(e)}")
+        Args:
+            save_profile: 保存プロファイル ('fast', 'balanced', 'small')
+            save_workers: PNG保存時に圧縮に使うスレッド数 (2以上で帯ごとの並列エンコード)
+        """
+        self.save_profile = save_profile
+        self.save_workers = max(1, save_workers or 1)
+        self.last_save_stats = None  # 最後に保存したときの形式・プロファイル・時間・サイズ
+        self._clipboard_cache = None  # ((画像のバージョン, 形式), エンコード済みデータ)
+        self.last_paste_stats = None  # 最後にクリップボードから読み込んだときの読み込み元と所要時間
 
-    def load_from_file(self, file_path):
+    def open_lazy(self, file_path, allow_large=False):
         """
-        ファイルから画像を読み込む
+        ファイルを遅延読み込みで開く (ヘッダーだけを読み、画素はまだデコードしない)
 
         Args:
-            file_path: 画像ファイルのパス
+            file_path: 画像ファイルのパス (.npy も可)
+            allow_large: True の場合は Image.MAX_IMAGE_PIXELS を超える画像も開く (タイル処理用)
 
         Returns:
-            PIL.Image オブジェクト、失敗時は None
+            LazyImage オブジェクト、失敗時は None
         """
         try:
             if not os.path.exists(file_path):
                 print(f"ファイルが存在しません: {file_path}")
                 return None
 
-            image = Image.open(file_path)
-
-            # PNG、GIF以外はRGBA変換を行わない
-            if image.format == "PNG" or image.format == "GIF":
-                if image.mode != 'RGBA':
-                    image = image.convert('RGBA')
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            return image
+            return LazyImage(file_path, allow_large=allow_large)
 
         except UnidentifiedImageError:
             print(f"サポートされていない画像形式です: {file_path}")
@@ -73,125 +75,396 @@ class ImageIO:
             print(f"画像読み込みエラー: {str(e)}\n{traceback.format_exc()}")
             return None
 
-    def load_from_clipboard(self):
+    def load_from_file(self, file_path):
+        """
+        ファイルから画像を読み込む
+
+        Args:
+            file_path: 画像ファイルのパス
+
+        Returns:
+            PIL.Image オブジェクト、失敗時は None
+            (PNG・GIFはRGBA、それ以外はRGB)
+        """
+        lazy_image = self.open_lazy(file_path)
+        if lazy_image is None:
+            return None
+
+        try:
+            image = lazy_image.load()
+            self.report_load_timings(lazy_image)
+            return image
+        except Exception as e:
+            print(f"画像読み込みエラー: {str(e)}\n{traceback.format_exc()}")
+            return None
+
+    def report_load_timings(self, lazy_image):
+        """
+        大きなファイルの場合、最初の画素までの時間とフル解像度のデコード時間を表示
+
+        Returns:
+            表示したメッセージ、小さなファイルの場合は None
+        """
+        if not lazy_image.is_large():
+            return None
+
+        timings = lazy_image.get_timings()
+        message = (f"{lazy_image.path.name} ({lazy_image.format} {lazy_image.width}x{lazy_image.height}, "
+                   f"{timings['file_size'] / (1024 * 1024):.1f}MB): "
+                   f"最初の表示 {timings['first_pixel'] * 1000:.0f}ms")
+        if timings['full_decode'] is not None:
+            message += f" / フル解像度 {timings['full_decode'] * 1000:.0f}ms"
+        print(f"画像読み込み時間: {message}")
+        return message
+
+    def load_from_clipboard(self, tk_root=None):
         """
         クリップボードから画像を読み込む
 
+        Args:
+            tk_root: アプリケーションの Tk ルートウィンドウ (Linuxで xclip・wl-paste がない場合に使用)
+
         Returns:
             PIL.Image オブジェクト、失敗時は None
+            (読み込み元と所要時間は self.last_paste_stats に記録する)
         """
-        # 方法1: OpenCVを使用する方法（推奨）
-        if self.cv2_available:
+        start_time = time.perf_counter()
+        self.last_paste_stats = None
+
+        # Windows: win32clipboard のDIBを読み込む (アルファを保持できる CF_DIBV5 を優先)
+        if sys.platform == 'win32':
             try:
                 import win32clipboard
 
+                data, source = None, None
                 win32clipboard.OpenClipboard()
                 try:
-                    if win32clipboard.IsClipboardFormatAvailable(win32clipboard.CF_DIB):
-                        data = win32clipboard.GetClipboardData(win32clipboard.CF_DIB)
-
-                        # DIBからBMPへ変換
-                        bmp_header = b'\x42\x4D' + len(data).to_bytes(4, byteorder='little') + b'\x00\x00\x00\x00\x36\x00\x00\x00'
-                        bmp_data = bmp_header + data[14:]
-
-                        # BytesIOでPIL Imageに変換
-                        image = Image.open(io.BytesIO(bmp_data))
-                        return image
+                    for source in ('CF_DIBV5', 'CF_DIB'):
+                        clipboard_format = getattr(win32clipboard, source)
+                        if win32clipboard.IsClipboardFormatAvailable(clipboard_format):
+                            data = win32clipboard.GetClipboardData(clipboard_format)
+                            break
                 finally:
                     win32clipboard.CloseClipboard()
+
+                # BMPファイルヘッダーを連結せず、DIBのヘッダーから画素の位置を求めて直接デコード
+                if data is not None:
+                    read_end = time.perf_counter()
+                    image = dib_to_image(data)
+                    self._record_paste(source, start_time, read_end)
+                    return image
             except ImportError:
                 print("win32clipboardがインストールされていません。")
             except Exception as e:
-                print(f"クリップボードからの画像読み込みエラー (OpenCV): {str(e)}")
-
-        # 方法2: PILとTkinterを使用する方法（フォールバック）
-        try:
-            import tkinter as tk
-
-            root = tk.Tk()
-            root.withdraw()  # ウィンドウを表示しない
-
+                print(f"クリップボードからの画像読み込みエラー (win32clipboard): {str(e)}")
+
+        # Linux: xclip・wl-paste の標準出力から直接読み込む (一時ファイルを使わない)
+        if sys.platform.startswith('linux'):
+            data, source = self._read_clipboard_command()
+            if data is None and tk_root is not None:
+                data, source = self._read_clipboard_tk(tk_root)
+            if data is not None:
+                return self._decode_clipboard(data, source, start_time)
+        else:
+            # Windows・macOS: PILのクリップボード取得 (ウィンドウの作成は不要)
             try:
                 image = ImageGrab.grabclipboard()
                 if isinstance(image, Image.Image):
+                    image.load()
+                    self._record_paste('ImageGrab', start_time, start_time)
                     return image
             except Exception as e:
                 print(f"クリップボードからの画像読み込みエラー (PIL): {str(e)}")
-            finally:
-                root.destroy()
-
-        except ImportError:
-            print("tkinterがインストールされていません。")
-        except Exception as e:
-            print(f"クリップボードからの画像読み込みエラー: {str(e)}")
 
         print("クリップボードから画像を読み込めませんでした。")
         return None
 
-    def save_to_file(self, image, file_path):
+    def format_paste_stats(self, stats=None):
+        """
+        クリップボードからの読み込み元と所要時間を表示用の文字列にする
+
+        Args:
+            stats: load_from_clipboard() が記録した辞書 (省略時は最後の読み込み結果)
+        """
+        stats = stats or self.last_paste_stats
+        if not stats:
+            return ""
+        return (f"{stats['source']}, 取得 {stats['read'] * 1000:.0f}ms / デコード {stats['decode'] * 1000:.0f}ms / "
+                f"合計 {stats['total'] * 1000:.0f}ms")
+
+    def _clipboard_paste_commands(self):
+        """
+        クリップボードの形式一覧を取得するコマンドと、指定した形式のデータを出力するコマンドを返す
+
+        Returns:
+            (形式一覧のコマンド, 形式を受け取ってデータ出力のコマンドを返す関数) のタプル、
+            使えるコマンドがない場合は None
+        """
+        if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-paste'):
+            return ['wl-paste', '--list-types'], lambda mime: ['wl-paste', '--no-newline', '--type', mime]
+        if shutil.which('xclip'):
+            return (['xclip', '-selection', 'clipboard', '-target', 'TARGETS', '-o'],
+                    lambda mime: ['xclip', '-selection', 'clipboard', '-target', mime, '-o'])
+        return None
+
+    def _read_clipboard_command(self):
+        """
+        xclip・wl-paste でクリップボードの画像データを読み込む (PNGを優先)
+
+        Returns:
+            (画像データのバイト列, 読み込み元の名前) のタプル、画像がない場合は (None, None)
+        """
+        commands = self._clipboard_paste_commands()
+        if commands is None:
+            print("xclip または wl-paste がインストールされていません")
+            return None, None
+
+        list_command, read_command = commands
+        try:
+            result = subprocess.run(list_command, capture_output=True, timeout=CLIPBOARD_TIMEOUT)
+            types = result.stdout.decode('utf-8', 'replace').split() if result.returncode == 0 else []
+            mime = next((t for t in CLIPBOARD_IMAGE_TYPES if t in types), None)
+            if mime is None:
+                mime = next((t for t in types if t.startswith('image/')), None)
+            if mime is None:
+                return None, None
+
+            result = subprocess.run(read_command(mime), capture_output=True, timeout=CLIPBOARD_TIMEOUT)
+            if result.returncode != 0 or not result.stdout:
+                return None, None
+            return result.stdout, f"{list_command[0]} {mime}"
+
+        except Exception as e:
+            print(f"クリップボードからの画像読み込みエラー ({list_command[0]}): {str(e)}")
+            return None, None
+
+    def _read_clipboard_tk(self, tk_root):
+        """
+        アプリケーションの Tk ルートウィンドウ経由でクリップボードのPNGを読み込む
+
+        X11のTkはテキスト以外の形式を "0x89 0x50 ..." のような16進数の並びで返す
+
+        Returns:
+            (画像データのバイト列, 読み込み元の名前) のタプル、画像がない場合は (None, None)
+        """
+        try:
+            text = tk_root.clipboard_get(type='image/png')
+            data = bytes(int(value, 16) for value in text.split())
+            return data, "Tk image/png"
+        except Exception:
+            # PNGがない・16進数の並び以外で返された場合
+            return None, None
+
+    def _decode_clipboard(self, data, source, start_time):
+        """クリップボードから取得したバイト列をデコードする (BytesIOで読み込み、一時ファイルは使わない)"""
+        read_end = time.perf_counter()
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        except Exception as e:
+            print(f"クリップボードの画像をデコードできませんでした ({source}): {str(e)}")
+            return None
+
+        self._record_paste(source, start_time, read_end)
+        return image
+
+    def _record_paste(self, source, start_time, read_end):
+        """クリップボードからの読み込み時間を記録して表示"""
+        end_time = time.perf_counter()
+        self.last_paste_stats = {
+            'source': source,
+            'read': read_end - start_time,
+            'decode': end_time - read_end,
+            'total': end_time - start_time,
+        }
+        print(f"クリップボードから画像を読み込みました: {self.format_paste_stats()}")
+
+    def save_to_file(self, image, file_path, profile=None):
         """
         画像をファイルに保存
 
         Args:
-            image: PIL.Image オブジェクト
+            image: PIL.Image または TiledImage オブジェクト
             file_path: 保存先のパス
+            profile: 保存プロファイル (省略時は self.save_profile)
 
         Returns:
             成功時は True、失敗時は False
+            (エンコード時間と出力サイズは self.last_save_stats に記録する)
         """
         try:
             # ファイルの拡張子から保存形式を決定
-            format_map = {
-                '.png': 'PNG',
-                '.jpg': 'JPEG',
-                '.jpeg': 'JPEG',
-                '.bmp': 'BMP',
-                '.gif': 'GIF'
+            save_format = get_save_format(file_path)
+            profile = profile or self.save_profile
+            options = get_save_options(save_format, profile)
+            start_time = time.perf_counter()
+
+            # タイル画像はPNG・BMPならタイルの帯ごとに書き出し、それ以外は全体を展開して保存
+            writer = None
+            if isinstance(image, TiledImage):
+                writer = self._tiled_writer(image, save_format, options, profile)
+                if writer is None:
+                    print(f"{save_format}はタイルごとに書き出せないため、画像全体を展開して保存します")
+                    image = image.to_image()
+
+            if writer is None:
+                # RGB/RGBAモードの適切な変換
+                if save_format == 'JPEG' and image.mode == 'RGBA':
+                    # JPEGはアルファチャンネルをサポートしていないのでRGBに変換
+                    image = image.convert('RGB')
+
+                # 複数スレッドが使える場合、PNGは帯ごとに並列で圧縮する
+                if self.save_workers > 1 and save_format == 'PNG' and image.mode in PNG_COLOR_TYPES:
+                    def writer(f):
+                        write_png(f, image.size, image.mode, iter_image_strips(image),
+                                  **self._png_options(options, profile))
+                else:
+                    def writer(f):
+                        image.save(f, format=save_format, **options)
+
+            # 保存実行 (一時ファイルに書き終えてから置き換え、途中で失敗しても既存のファイルを壊さない)
+            self._write_atomic(file_path, writer)
+
+            self.last_save_stats = {
+                'format': save_format,
+                'profile': profile,
+                'seconds': time.perf_counter() - start_time,
+                'bytes': os.path.getsize(file_path),
+                'parallel': self.save_workers > 1 and save_format == 'PNG',
             }
-
-            file_ext = os.path.splitext(file_path)[1].lower()
-            save_format = format_map.get(file_ext, 'PNG')
-
-            # RGB/RGBAモードの適切な変換
-            if save_format == 'JPEG' and image.mode == 'RGBA':
-                # JPEGはアルファチャンネルをサポートしていないのでRGBに変換
-                image = image.convert('RGB')
-
-            # 保存実行
-            image.save(file_path, format=save_format)
-            print(f"画像を保存しました: {file_path}")
+            print(f"画像を保存しました: {file_path} ({self.format_save_stats()})")
             return True
 
         except Exception as e:
             print(f"画像保存エラー: {str(e)}\n{traceback.format_exc()}")
             return False
 
-    def copy_to_clipboard(self, image):
+    def format_save_stats(self, stats=None):
+        """
+        保存結果 (形式・プロファイル・出力サイズ・エンコード時間) を表示用の文字列にする
+
+        Args:
+            stats: save_to_file() が記録した辞書 (省略時は最後の保存結果)
+        """
+        stats = stats or self.last_save_stats
+        if not stats:
+            return ""
+        size = stats['bytes']
+        size_text = f"{size / (1024 * 1024):.1f}MB" if size >= 1024 * 1024 else f"{size / 1024:.0f}KB"
+        parallel_text = f", {self.save_workers}スレッド" if stats['parallel'] else ""
+        return f"{stats['format']} {stats['profile']}, {size_text}, {stats['seconds'] * 1000:.0f}ms{parallel_text}"
+
+    def _png_options(self, options, profile):
+        """プロファイルのPNG設定を帯ごとのPNGエンコーダー (write_png) の引数にする"""
+        return {
+            'compress_level': options.get('compress_level', 6),
+            'compress_type': options.get('compress_type', zlib.Z_DEFAULT_STRATEGY),
+            'row_filter': PNG_ROW_FILTERS.get(profile, 'up'),
+            'workers': self.save_workers,
+        }
+
+    def _tiled_writer(self, image, save_format, options, profile):
+        """
+        タイル画像を帯ごとに書き出す関数を返す
+
+        Returns:
+            ファイルオブジェクトを受け取る関数、この形式・モードに対応していない場合は None
+        """
+        if save_format == 'PNG' and image.mode in PNG_COLOR_TYPES:
+            return partial(save_png_stream, image, **self._png_options(options, profile))
+        if save_format == 'BMP' and image.mode in ('L', 'RGB', 'RGBA'):
+            return partial(save_bmp_stream, image)
+        return None
+
+    def _write_atomic(self, file_path, writer):
+        """
+        保存先と同じディレクトリの一時ファイルに書き込み、ディスクに書き出してから置き換える
+
+        Args:
+            file_path: 保存先のパス
+            writer: バイナリファイルオブジェクトを受け取って書き込む関数
+        """
+        directory, name = os.path.split(os.path.abspath(file_path))
+        fd, temp_path = self._create_temp_file(directory, name)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+                f.flush()
+                os.fsync(f.fileno())
+            # 上書き保存では元のファイルのパーミッションを引き継ぐ
+            try:
+                os.chmod(temp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+            except FileNotFoundError:
+                pass
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        self._fsync_directory(directory)
+
+    @staticmethod
+    def _fsync_directory(directory):
+        """
+        置き換えたディレクトリエントリをディスクに書き出す (POSIXのみ)
+
+        ファイルの内容だけでなく名前の置き換えも、電源断の後に残るようにする
+        (Windowsはディレクトリを開けないため行わない)
+        """
+        if sys.platform == 'win32':
+            return
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            # ディレクトリの fsync に対応していないファイルシステム (保存自体は完了している)
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _create_temp_file(directory, name):
+        """
+        保存先のディレクトリに一時ファイルを作成
+
+        tempfile.mkstemp は所有者だけが読み書きできるファイルを作るため使わず、
+        通常のファイルと同じく 0o666 から保存時点の umask を除いたパーミッションで作成する
+
+        Returns:
+            (ファイル記述子, 一時ファイルのパス) のタプル
+        """
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+        for _ in range(TEMP_FILE_ATTEMPTS):
+            temp_path = os.path.join(directory, f'.{name}.{secrets.token_hex(4)}.tmp')
+            try:
+                return os.open(temp_path, flags, 0o666), temp_path
+            except FileExistsError:
+                continue
+        raise FileExistsError(f"一時ファイルを作成できません: {directory}")
+
+    def copy_to_clipboard(self, image, version=None):
         """
         画像をクリップボードにコピー
 
         Args:
             image: PIL.Image オブジェクト
+            version: 画像のバージョン (同じバージョンを再度コピーする場合はエンコード結果を再利用する)
 
         Returns:
             成功時は True、失敗時は False
         """
-        if not self.clipboard_available:
-            print("クリップボード機能がインストールされていません")
-            return False
-
         try:
             # Windows環境の場合
             if sys.platform == 'win32':
                 try:
                     import win32clipboard
-                    from io import BytesIO
 
-                    # PNGとしてバイトストリームに保存
-                    output = BytesIO()
-                    image.convert('RGB').save(output, 'BMP')
-                    data = output.getvalue()[14:]  # BMPヘッダーを除く
-                    output.close()
+                    # BMPヘッダーを除いたDIBデータ
+                    data = self._clipboard_payload(image, version, 'DIB')
 
                     # クリップボードに貼り付け
                     win32clipboard.OpenClipboard()
@@ -203,51 +476,21 @@ class ImageIO:
                 except ImportError:
                     print("win32clipboardがインストールされていません")
 
-            # macOSの場合
-            elif sys.platform == 'darwin':
-                try:
-                    import subprocess
-                    from tempfile import NamedTemporaryFile
-
-                    # 一時ファイルに保存
-                    with NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                        temp_filename = temp_file.name
-
-                    image.save(temp_filename, 'PNG')
-
-                    # pbcopyコマンドでクリップボードにコピー
-                    subprocess.run(['osascript', '-e',
-                        f'set the clipboard to (read (POSIX file "{temp_filename}") as TIFF picture)'])
-
-                    # 一時ファイルを削除
-                    os.unlink(temp_filename)
-
-                    return True
-                except Exception as e:
-                    print(f"macOSクリップボードエラー: {str(e)}")
-
-            # Linux環境の場合 (xclipが必要)
-            elif sys.platform.startswith('linux'):
-                try:
-                    import subprocess
-                    from tempfile import NamedTemporaryFile
-
-                    # 一時ファイルに保存
-                    with NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                        temp_filename = temp_file.name
-
-                    image.save(temp_filename, 'PNG')
-
-                    # xclipコマンドでクリップボードにコピー
-                    subprocess.run(['xclip', '-selection', 'clipboard',
-                                    '-target', 'image/png', '-i', temp_filename])
-
-                    # 一時ファイルを削除
-                    os.unlink(temp_filename)
-
-                    return True
-                except Exception as e:
-                    print(f"Linuxクリップボードエラー: {str(e)}")
+            # macOS・Linux環境の場合 (PNGを一時ファイルを使わずに標準入力で渡す)
+            elif sys.platform == 'darwin' or sys.platform.startswith('linux'):
+                command = self._clipboard_copy_command()
+                if command is None:
+                    print("xclip または wl-copy がインストールされていません")
+                    return False
+
+                data = self._clipboard_payload(image, version, 'PNG')
+                # xclip・wl-copy は貼り付け先に渡すためにバックグラウンドで残るため、出力はつながない
+                result = subprocess.run(command, input=data, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, timeout=CLIPBOARD_TIMEOUT)
+                if result.returncode != 0:
+                    print(f"クリップボードへのコピーに失敗しました: {command[0]} (終了コード {result.returncode})")
+                    return False
+                return True
 
             print(f"このプラットフォームではクリップボードへの画像コピーに対応していません: {sys.platform}")
             return False
@@ -255,3 +498,46 @@ class ImageIO:
         except Exception as e:
             print(f"クリップボードコピーエラー: {str(e)}\n{traceback.format_exc()}")
             return False
+
+    def _clipboard_copy_command(self):
+        """
+        PNGを標準入力から受け取ってクリップボードに設定するコマンドを返す
+
+        Returns:
+            コマンドのリスト、使えるコマンドがない場合は None
+        """
+        if sys.platform == 'darwin':
+            return ['osascript', '-e', 'set the clipboard to (read (POSIX file "/dev/stdin") as «class PNGf»)']
+        if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-copy'):
+            return ['wl-copy', '--type', 'image/png']
+        if shutil.which('xclip'):
+            return ['xclip', '-selection', 'clipboard', '-target', 'image/png', '-i']
+        return None
+
+    def _clipboard_payload(self, image, version, kind):
+        """
+        クリップボードに渡すデータを作成 (同じバージョン・形式のデータはキャッシュを返す)
+
+        Args:
+            image: PIL.Image オブジェクト
+            version: 画像のバージョン (None の場合はキャッシュしない)
+            kind: 'PNG' (圧縮を抑えた高速なPNG) または 'DIB' (BMPヘッダーを除いたビットマップ)
+
+        Returns:
+            エンコード済みのバイト列
+        """
+        key = (version, kind)
+        if version is not None and self._clipboard_cache and self._clipboard_cache[0] == key:
+            return self._clipboard_cache[1]
+
+        output = io.BytesIO()
+        if kind == 'DIB':
+            image.convert('RGB').save(output, 'BMP')
+            data = output.getvalue()[14:]
+        else:
+            image.save(output, 'PNG', **get_save_options('PNG', 'fast'))
+            data = output.getvalue()
+
+        if version is not None:
+            self._clipboard_cache = (key, data)
+        return data
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レイテンシ計測モジュール
+イベント処理・ツール処理・表示更新・イベントの待ち時間をリングバッファに記録し、
+p50 / p95 の集計とJSONへの書き出しを行う
+"""
+
+import json
+import math
+import time
+from collections import deque
+from pathlib import Path
+
+# 計測する項目と表示名
+LATENCY_CATEGORIES = {
+    'handler': 'イベント',  # イベントハンドラーの処理時間 (イベントごと)
+    'tool': 'ツール',       # 画像処理ツールの処理時間
+    'display': '表示',      # 表示画像の更新時間
+    'queue': '待ち',        # ワーカースレッドから送ったイベントが処理されるまでの待ち時間
+}
+
+# 項目ごとに保持する計測値の数
+DEFAULT_CAPACITY = 1000
+
+
+class LatencyRecorder:
+    """
+    レイテンシ計測クラス
+
+    無効のときは start() が None を返し、stop() / record() はすぐに戻るため、
+    計測箇所を残したままでもほとんど負荷にならない
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, enabled=False):
+        """
+        初期化
+
+        Args:
+            capacity: 項目ごとに保持する計測値の数 (古いものから捨てる)
+            enabled: 計測を有効にするか
+        """
+        self.capacity = capacity
+        self.enabled = enabled
+        # 項目 -> (ラベル, ミリ秒) のリングバッファ (deque への追加はスレッドセーフ)
+        self._samples = {category: deque(maxlen=capacity) for category in LATENCY_CATEGORIES}
+
+    def start(self):
+        """計測開始時刻を返す (無効の場合は None)"""
+        return time.perf_counter() if self.enabled else None
+
+    def stop(self, category, start, label=''):
+        """
+        start() からの経過時間を記録
+
+        Args:
+            category: 項目 ('handler', 'tool', 'display', 'queue')
+            start: start() の戻り値 (None の場合は何もしない)
+            label: 計測値のラベル (イベント名など)
+        """
+        if start is not None:
+            self.record(category, (time.perf_counter() - start) * 1000, label)
+
+    def record(self, category, milliseconds, label=''):
+        """計測値 (ミリ秒) を記録"""
+        if self.enabled:
+            self._samples[category].append((label, milliseconds))
+
+    def clear(self):
+        """記録をすべて消去"""
+        for samples in self._samples.values():
+            samples.clear()
+
+    def summary(self):
+        """
+        項目ごとの集計を返す
+
+        Returns:
+            {項目: {'count', 'p50_ms', 'p95_ms', 'max_ms'}} の辞書
+        """
+        return {category: _summarize([ms for _, ms in list(samples)])
+                for category, samples in self._samples.items()}
+
+    def summary_by_label(self, category='handler'):
+        """指定した項目のラベル (イベント名) ごとの集計を返す"""
+        groups = {}
+        for label, ms in list(self._samples[category]):
+            groups.setdefault(label, []).append(ms)
+        return {label: _summarize(values) for label, values in groups.items()}
+
+    def format_summary(self):
+        """ステータスバーに表示する集計の文字列 (例: 'イベント 1.2/4.5ms 表示 3.0/8.1ms')"""
+        parts = []
+        for category, stats in self.summary().items():
+            if stats['count']:
+                parts.append(f"{LATENCY_CATEGORIES[category]} {stats['p50_ms']:.1f}/{stats['p95_ms']:.1f}ms")
+        if not parts:
+            return 'レイテンシ: 計測値なし'
+        return 'p50/p95 ' + ' '.join(parts)
+
+    def dump(self, file_path):
+        """
+        集計と計測値をJSONファイルに書き出す
+
+        Args:
+            file_path: 書き出し先のパス (フォルダがなければ作成する)
+
+        Returns:
+            書き出しに成功したかどうか
+        """
+        try:
+            data = {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'capacity': self.capacity,
+                'summary': self.summary(),
+                'events': self.summary_by_label('handler'),
+                'samples': {category: [{'label': label, 'ms': round(ms, 3)} for label, ms in list(samples)]
+                            for category, samples in self._samples.items()},
+            }
+            path = Path(file_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            return True
+        except Exception as e:
+            print(f"レイテンシの書き出しエラー: {str(e)}")
+            return False
+
+
+def _summarize(values):
+    """計測値のリストから件数・中央値・95パーセンタイル・最大値を求める"""
+    if not values:
+        return {'count': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50_ms': _percentile(values, 50),
+        'p95_ms': _percentile(values, 95),
+        'max_ms': values[-1],
+    }
+
+
+def _percentile(sorted_values, percent):
+    """ソート済みのリストのパーセンタイル (最近順位法)"""
+    index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+遅延読み込み画像モジュール
+ファイルを開いた時点ではヘッダーだけを読み、画素は必要になった範囲・解像度でデコードする
+"""
+
+import os
+import mmap
+import time
+from pathlib import Path
+from PIL import Image
+
+# 読み込み時間を報告する大きなファイルの基準
+LARGE_FILE_BYTES = 10 * 1024 * 1024
+LARGE_IMAGE_PIXELS = 16 * 1000 * 1000
+
+# NumPy配列のチャンネル数と画像モードの対応
+NPY_MODES = {1: 'L', 3: 'RGB', 4: 'RGBA'}
+
+# メモリマップで読み込む無圧縮画素の並び (rawmode) と1画素のバイト数
+RAW_PIXEL_BYTES = {'L': 1, 'BGR': 3, 'RGB': 3, 'BGRX': 4, 'BGRA': 4, 'RGBX': 4, 'RGBA': 4}
+
+
+def fit_size(size, max_size):
+    """
+    アスペクト比を保って max_size に収まるサイズを返す (縮小のみ)
+
+    Args:
+        size: 元のサイズ (width, height)
+        max_size: 最大サイズ (width, height)
+    """
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height)
+    if scale >= 1:
+        return size
+    return (max(1, int(width * scale)), max(1, int(height * scale)))
+
+
+def open_unchecked(file_path):
+    """
+    画素数の上限 (Image.MAX_IMAGE_PIXELS) を確認せずに Image.open で開く (ヘッダーのみ読み込む)
+
+    上限はプロセス全体の設定のため、開く間だけ無効にして必ず元に戻す
+
+    Raises:
+        PIL.UnidentifiedImageError: 画像として認識できない場合
+    """
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        return Image.open(file_path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+
+class LazyImage:
+    """
+    遅延読み込み画像クラス
+
+    - JPEG: プレビューはDCTの縮小デコード (draft) で作成し、フル解像度は必要になったときだけデコード
+    - BMP (無圧縮): ファイルをメモリマップし、必要な行だけをデコード
+    - NPY: np.load(mmap_mode='r') でメモリマップし、必要な範囲だけを画像にする
+    - その他の形式: 最初のアクセスでフル解像度をデコード
+
+    範囲だけをデコードできる (supports_region_decode が True) のは無圧縮のBMPとNPYのみ
+    """
+
+    def __init__(self, file_path, allow_large=False):
+        """
+        ファイルを開く (画素はまだデコードしない)
+
+        Args:
+            file_path: 画像ファイルのパス
+            allow_large: True の場合は Image.MAX_IMAGE_PIXELS を超える画像も開く
+                         (タイル単位で処理する一括処理用。GUIでは画像全体を展開するため False)
+                         上限を超える画像は範囲ごとのデコードだけができ、load() は例外を送出する
+
+        Raises:
+            PIL.UnidentifiedImageError: 画像として認識できない場合
+            PIL.Image.DecompressionBombError: allow_large が False で画素数が上限を超える場合
+            ValueError: 対応していないNumPy配列の場合
+        """
+        self._opened_at = time.perf_counter()
+        self.path = Path(file_path)
+        self.file_size = os.path.getsize(file_path)
+
+        self.first_pixel_time = None  # 開いてから最初に画素をデコードするまでの秒数
+        self.full_decode_time = None  # フル解像度のデコードにかかった秒数
+
+        self._image = None   # ヘッダーのみ読み込んだ PIL.Image
+        self._array = None   # NPYのメモリマップ配列
+        self._mmap = None    # BMPのメモリマップ
+        self._raw = None     # BMPの画素配置 (オフセット, rawmode, 1行のバイト数, 行の向き)
+        self._full = None    # デコード済みのフル解像度画像
+        self.exceeds_pixel_limit = False  # 画素数の上限を超えているため全体を展開しない
+
+        if self.path.suffix.lower() == '.npy':
+            self._open_npy()
+        else:
+            try:
+                self._image = Image.open(file_path)
+            except Image.DecompressionBombError:
+                if not allow_large:
+                    raise
+                self._image = open_unchecked(file_path)
+                self.exceeds_pixel_limit = True
+            self.format = self._image.format
+            self.size = self._image.size
+            self.mode = self._image.mode
+            if self.format == 'BMP':
+                self._open_raw_mmap()
+
+    def _open_npy(self):
+        """NPYファイルをメモリマップで開く (uint8 の HxW / HxWx3 / HxWx4 のみ)"""
+        import numpy as np
+
+        array = np.load(self.path, mmap_mode='r')
+        channels = 1 if array.ndim == 2 else (array.shape[2] if array.ndim == 3 else 0)
+        if array.dtype != np.uint8 or channels not in NPY_MODES:
+            raise ValueError(f"対応していない配列です (uint8 の HxW / HxWx3 / HxWx4 のみ): "
+                             f"{array.dtype} {array.shape}")
+
+        self._array = array
+        self.format = 'NPY'
+        self.size = (array.shape[1], array.shape[0])
+        self.mode = NPY_MODES[channels]
+
+    def _open_raw_mmap(self):
+        """無圧縮の画素データ (rawタイル1つ) であればファイルをメモリマップする"""
+        tiles = self._image.tile
+        # パレット画像はパレットの対応が必要なため通常の読み込みに任せる
+        if (len(tiles) != 1 or tiles[0][0] != 'raw' or self.file_size == 0
+                or self.mode not in ('L', 'RGB', 'RGBA')):
+            return
+
+        _, extents, offset, args = tiles[0]
+        if tuple(extents) != (0, 0) + self.size or not isinstance(args, tuple) or len(args) < 3:
+            return
+        rawmode, stride, orientation = args[:3]
+        if not stride or rawmode not in RAW_PIXEL_BYTES:
+            return
+
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._raw = (offset, rawmode, stride, orientation)
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    @property
+    def output_mode(self):
+        """読み込み後の画像モード (PNG・GIFはRGBA、NPYは配列のまま、それ以外はRGB)"""
+        if self.format in ('PNG', 'GIF'):
+            return 'RGBA'
+        if self.format == 'NPY':
+            return self.mode
+        return 'RGB'
+
+    @property
+    def supports_region_decode(self):
+        """範囲だけをデコードできるか (無圧縮のBMPとNPY、それ以外の形式の crop() は全体をデコードする)"""
+        return self._array is not None or self._raw is not None
+
+    def is_large(self):
+        """読み込み時間を報告する大きなファイルかどうか"""
+        return self.file_size >= LARGE_FILE_BYTES or self.width * self.height >= LARGE_IMAGE_PIXELS
+
+    def is_loaded(self):
+        """フル解像度をデコード済みかどうか"""
+        return self._full is not None
+
+    def preview(self, max_size):
+        """
+        max_size に収まる縮小プレビューを返す (フル解像度のデコードを避ける)
+
+        Args:
+            max_size: 最大サイズ (width, height)
+
+        Returns:
+            PIL.Image オブジェクト (縮小不要な場合はフル解像度の画像)
+        """
+        target = fit_size(self.size, max_size)
+        if self._full is not None or target == self.size:
+            image = self.load()
+            return image if target == self.size else image.resize(target, Image.BILINEAR)
+
+        if self._array is not None:
+            # 一定間隔の行・列だけを参照する (触れるページは一部だけ)
+            step = max(1, min(self.width // target[0], self.height // target[1]))
+            image = self._to_image(self._array[::step, ::step])
+        elif self._raw is not None:
+            image = self._decode_rows(0, self.height, row_step=max(1, self.height // target[1]))
+        elif self.format == 'JPEG' and min(self.width // target[0], self.height // target[1]) >= 2:
+            # DCTの段階で1/2〜1/8に縮小してデコードする
+            with Image.open(self.path) as draft_image:
+                draft_image.draft('RGB', target)
+                image = draft_image.convert('RGB')
+        else:
+            image = self.load()
+
+        self._mark_first_pixel()
+        return self._convert(image).resize(target, Image.BILINEAR)
+
+    def crop(self, box):
+        """
+        指定した範囲だけをデコードして返す
+        (範囲だけをデコードできない形式は全体をデコードしてから切り出し、デコードした画像を保持する)
+
+        Args:
+            box: 範囲 (x1, y1, x2, y2)
+
+        Returns:
+            PIL.Image オブジェクト
+        """
+        if self._full is None:
+            x1, y1, x2, y2 = box
+            if self._array is not None:
+                self._mark_first_pixel()
+                return self._convert(self._to_image(self._array[y1:y2, x1:x2]))
+            if self._raw is not None:
+                region = self._decode_rows(y1, y2, x1=x1, x2=x2)
+                self._mark_first_pixel()
+                return self._convert(region)
+        return self.load().crop(box)
+
+    def load(self):
+        """
+        フル解像度の画像を返す (初回のみデコードする)
+
+        Returns:
+            PIL.Image オブジェクト (PNG・GIF・NPYはアルファを保持、それ以外はRGB)
+
+        Raises:
+            PIL.Image.DecompressionBombError: 画素数の上限を超える画像の場合 (allow_large で開いた場合)
+        """
+        if self._full is None:
+            if self.exceeds_pixel_limit:
+                raise Image.DecompressionBombError(
+                    f"画像の画素数 ({self.width * self.height}) が上限 ({Image.MAX_IMAGE_PIXELS}) を超えるため、"
+                    f"全体を展開できません (範囲だけをデコードできる無圧縮のBMPのみタイル処理できます)")
+            start_time = time.perf_counter()
+            if self._array is not None:
+                image = self._to_image(self._array)
+            elif self._raw is not None:
+                image = self._decode_rows(0, self.height)
+            else:
+                image = self._image
+                image.load()
+            self._full = self._convert(image)
+            self.full_decode_time = time.perf_counter() - start_time
+            self._mark_first_pixel()
+            self.close()
+        return self._full
+
+    def close(self):
+        """ファイルやメモリマップを閉じる (デコード済みの画像は保持する)"""
+        self._array = None
+        self._raw = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._image is not None:
+            # デコード済みの画像そのものは閉じない
+            if self._image is not self._full:
+                self._image.close()
+            self._image = None
+
+    def get_timings(self):
+        """最初の画素までの時間・フル解像度のデコード時間 (秒) を返す"""
+        return {
+            'file_size': self.file_size,
+            'first_pixel': self.first_pixel_time,
+            'full_decode': self.full_decode_time,
+        }
+
+    def _mark_first_pixel(self):
+        if self.first_pixel_time is None:
+            self.first_pixel_time = time.perf_counter() - self._opened_at
+
+    def _convert(self, image):
+        """読み込み後のモードに変換"""
+        mode = self.output_mode
+        return image if image.mode == mode else image.convert(mode)
+
+    def _to_image(self, array):
+        """NumPy配列 (メモリマップの一部) を画像にする"""
+        import numpy as np
+
+        array = np.ascontiguousarray(array)
+        if array.ndim == 3 and array.shape[2] == 1:
+            array = array[:, :, 0]
+        return Image.fromarray(array, NPY_MODES[1 if array.ndim == 2 else array.shape[2]])
+
+    def _decode_rows(self, y1, y2, row_step=1, x1=0, x2=None):
+        """
+        メモリマップから y1〜y2 の行 (x1〜x2 の列) だけをデコード (row_step 行ごとに間引ける)
+
+        ファイル上の行・列の位置を計算し、その範囲のバッファだけを raw デコーダーに渡す
+        """
+        offset, rawmode, stride, orientation = self._raw
+        x2 = self.width if x2 is None else x2
+        rows = (y2 - y1 + row_step - 1) // row_step
+
+        # ファイル上の先頭行 (下から上に格納されている場合は最後の行が先頭)
+        if orientation < 0:
+            first_file_row = self.height - y1 - 1 - (rows - 1) * row_step
+        else:
+            first_file_row = y1
+        start = offset + first_file_row * stride + x1 * RAW_PIXEL_BYTES[rawmode]
+        end = start + ((rows - 1) * row_step + 1) * stride
+
+        buffer = memoryview(self._mmap)[start:min(end, len(self._mmap))]
+        try:
+            image = Image.frombuffer(self.mode, (x2 - x1, rows), buffer, 'raw',
+                                     rawmode, stride * row_step, orientation)
+            # メモリマップを直接参照している場合は、コピーして切り離す
+            if image.readonly:
+                image = image.copy()
+        finally:
+            buffer.release()
+        return image
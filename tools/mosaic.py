@@ -5,24 +5,62 @@
 """
 
 import traceback
+import importlib.util
 from PIL import Image
 
+from tools.geometry import clip_box
+
+# NumPyで処理できる画像モード
+NUMPY_MODES = ('L', 'LA', 'RGB', 'RGBA')
+
+# Image.reduce でブロックの平均を求められる画像モード (パレット画像などは縮小・拡大で処理する)
+REDUCE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'I', 'F')
+
+
+def block_size_for_strength(strength):
+    """モザイク強度 (1-50) からブロックの一辺のピクセル数を求める"""
+    return max(1, int(50 / strength))
+
+
 class MosaicTool:
     """モザイク処理クラス"""
 
-    def __init__(self):
-        """初期化"""
+    def __init__(self, engine='auto'):
+        """
+        初期化
+
+        Args:
+            engine: 'pil' (Image.reduce によるブロック平均)、'numpy' (NumPyによるブロック平均)、
+                    'auto' (PIL。どの領域の大きさ・強度でもNumPyより速く、NumPyの読み込みも不要なため)
+        """
         self.last_area = None  # 最後に処理したエリア
         self.last_strength = 10  # デフォルトのモザイク強度
+        self.last_changed_box = None  # 最後の処理で変更された矩形 (x1, y1, x2, y2)
+
+        # 最後に処理した領域のモザイク前の画素 (強度を変えて再適用するため)
+        self._source_region = None
+        self._source_key = None  # (切り出した矩形, 画像サイズ, 画像モード)
+
+        # NumPy (engine='numpy' の場合のみ)
+        # 起動を速くするため、ここでは有無だけを確認し、読み込みは最初のモザイク処理で行う
+        self.np = None
+        self.engine = 'pil'
+        if engine == 'numpy':
+            if importlib.util.find_spec('numpy') is not None:
+                self.engine = 'numpy'
+            else:
+                print("NumPyがインストールされていません。PILでモザイク処理を行います。")
 
-    def process(self, image, area, strength=None):
+    def process(self, image, area, strength=None, inplace=False):
         """
         モザイク処理を適用
 
         Args:
-            image: PIL.Image オブジェクト
+            image: PIL.Image または TiledImage オブジェクト (領域と交差するタイルだけを読み書きする)
             area: モザイクを適用する領域 (x1, y1, x2, y2)
             strength: モザイクの強度 (1-50)
+            inplace: True の場合は画像全体をコピーせず、渡された画像に直接書き込む
+                     (変更前の画素を履歴などに記録済みの場合に使う)
 
         Returns:
             モザイク処理された PIL.Image オブジェクト
@@ -38,26 +76,26 @@ class MosaicTool:
 
         # 領域の保存
         self.last_area = area
+        self.last_changed_box = None
 
         try:
-            # 画像のコピーを作成
-            result = image.copy()
-
-            # 領域を切り出し
-            x1, y1, x2, y2 = area
-            region = result.crop(area)
+            # 領域を画像の範囲内に制限
+            box = self.target_box(image, area)
+            if box is None:
+                return image
 
-            # モザイク処理
-            # 縮小サイズの計算（強度に応じて調整）
-            scale_factor = max(1, int(50 / strength))
-            small_size = (max(1, (x2 - x1) // scale_factor), max(1, (y2 - y1) // scale_factor))
+            # 領域を切り出し、モザイク前の画素として保持してからモザイク処理
+            region = image.crop(box)
+            self._source_region = region
+            self._source_key = (box, image.size, image.mode)
+            mosaic_region = self._mosaic_region(region, block_size_for_strength(strength))
 
-            # 縮小してから拡大することでモザイク効果を得る
-            small_img = region.resize(small_size, Image.NEAREST)
-            mosaic_region = small_img.resize((x2 - x1, y2 - y1), Image.NEAREST)
+            # 元の画像 (またはそのコピー) に貼り付け
+            result = image if inplace else image.copy()
+            result.paste(mosaic_region, box[:2])
 
-            # 元の画像に貼り付け
-            result.paste(mosaic_region, (x1, y1))
+            # 変更された矩形
+            self.last_changed_box = box
 
             return result
 
@@ -66,6 +104,163 @@ class MosaicTool:
             # エラーが発生した場合は元の画像を返す
             return image
 
+    def reapply(self, image, area, strength, inplace=False):
+        """
+        最後に処理した領域に、保持しているモザイク前の画素から強度を変えて再適用
+        モザイク済みの画像に重ね掛けせず、領域だけを再計算する
+
+        Args:
+            image: 最後の処理の結果の PIL.Image オブジェクト
+            area: モザイクを適用した領域 (x1, y1, x2, y2)
+            strength: 新しいモザイクの強度 (1-50)
+            inplace: True の場合は画像全体をコピーせず、渡された画像に直接書き込む
+
+        Returns:
+            モザイク処理された PIL.Image オブジェクト
+            モザイク前の画素を保持していない場合は None
+        """
+        if not self.has_source(image, area):
+            return None
+
+        self.last_changed_box = None
+        try:
+            box = self._source_key[0]
+            self.last_area = area
+            self.last_strength = strength
+            mosaic_region = self._mosaic_region(self._source_region, block_size_for_strength(strength))
+
+            result = image if inplace else image.copy()
+            result.paste(mosaic_region, box[:2])
+            self.last_changed_box = box
+            return result
+
+        except Exception as e:
+            print(f"モザイク処理中にエラーが発生しました: {str(e)}\n{traceback.format_exc()}")
+            return image
+
+    def target_box(self, image, area):
+        """
+        処理で変更される矩形を返す (処理の前に変更前の画素を記録するため)
+
+        Returns:
+            画像の範囲内に制限した矩形 (x1, y1, x2, y2)、範囲外の場合は None
+        """
+        return clip_box(area, image.size)
+
+    def has_source(self, image, area):
+        """指定した画像・領域に対するモザイク前の画素を保持しているか"""
+        if self._source_region is None or not image or not area:
+            return False
+        return self._source_key == (clip_box(area, image.size), image.size, image.mode)
+
+    def get_source_region(self, image, area):
+        """
+        最後に処理した領域のモザイク前の画素を返す
+
+        Returns:
+            PIL.Image オブジェクト (変更しないこと)、保持していない場合は None
+        """
+        return self._source_region if self.has_source(image, area) else None
+
+    def clear_source(self):
+        """保持しているモザイク前の画素を破棄 (元に戻した場合や画像を読み込み直した場合)"""
+        self._source_region = None
+        self._source_key = None
+
+    def _mosaic_region(self, region, block_size):
+        """切り出した領域にモザイクをかける (使用できるエンジンを選ぶ)"""
+        if self.engine == 'numpy' and region.mode in NUMPY_MODES:
+            return self._mosaic_numpy(region, block_size)
+        return self._mosaic_pil(region, block_size)
+
+    def _mosaic_pil(self, region, block_size):
+        """
+        Image.reduce でブロックごとの平均色を求め、最近傍法で拡大してモザイク効果を得る
+        端の半端なブロックはその範囲の画素だけで平均する (NumPyの処理と同じ結果、丸めの差は1以内)
+        """
+        if block_size <= 1:
+            return region
+        if region.mode not in REDUCE_MODES:
+            return self._mosaic_sample(region, block_size)
+
+        width, height = region.size
+        small = region.reduce(block_size)
+        # 整数倍の最近傍拡大で各画素をブロックの大きさに広げ、半端なブロックのはみ出した分を切り取る
+        enlarged = small.resize((small.width * block_size, small.height * block_size), Image.NEAREST)
+        return enlarged.crop((0, 0, width, height))
+
+    def _mosaic_sample(self, region, block_size):
+        """
+        縮小してから拡大することでモザイク効果を得る (パレット画像など平均を求められないモード用)
+        各ブロックは1画素の色で塗られる
+        """
+        width, height = region.size
+        small_size = (max(1, width // block_size), max(1, height // block_size))
+        small_img = region.resize(small_size, Image.NEAREST)
+        return small_img.resize((width, height), Image.NEAREST)
+
+    def _mosaic_numpy(self, region, block_size):
+        """
+        ブロックごとの平均色で塗りつぶしてモザイク効果を得る
+        端の半端なブロックはその範囲の画素だけで平均する
+        """
+        if block_size <= 1:
+            return region
+
+        if self.np is None:
+            import numpy
+            self.np = numpy
+        np = self.np
+        pixels = np.asarray(region)
+        height, width = pixels.shape[:2]
+        pixels = pixels.reshape(height, width, -1)
+        channels = pixels.shape[2]
+
+        full_rows, full_cols = height // block_size, width // block_size
+        core_height, core_width = full_rows * block_size, full_cols * block_size
+        row_sizes = [block_size] * full_rows + ([height - core_height] if core_height < height else [])
+        col_sizes = [block_size] * full_cols + ([width - core_width] if core_width < width else [])
+
+        # 行方向にブロックごとの合計を求める (行ブロック数 x 幅 x チャンネル)
+        row_sums = []
+        if full_rows:
+            row_sums.append(np.add.reduce(
+                pixels[:core_height].reshape(full_rows, block_size, width, channels),
+                axis=1, dtype=np.uint32))
+        if core_height < height:
+            row_sums.append(pixels[core_height:].sum(axis=0, dtype=np.uint32)[None])
+        row_sums = np.concatenate(row_sums)
+
+        # 列方向にまとめてブロックごとの合計にする (行ブロック数 x 列ブロック数 x チャンネル)
+        sums = []
+        if full_cols:
+            # ブロック内の各列をずらしながら加算する (小さなブロックでも高速)
+            col_sums = row_sums[:, 0:core_width:block_size].copy()
+            for offset in range(1, block_size):
+                col_sums += row_sums[:, offset:core_width:block_size]
+            sums.append(col_sums)
+        if core_width < width:
+            sums.append(row_sums[:, core_width:].sum(axis=1, keepdims=True))
+        sums = np.concatenate(sums, axis=1)
+
+        # 四捨五入した平均
+        counts = np.multiply.outer(row_sizes, col_sizes).astype(np.uint32)[:, :, None]
+        means = ((sums + counts // 2) // counts).astype(np.uint8)
+
+        # 平均色をブロックの大きさに広げる (列方向に広げた行を各行にコピー)
+        rows = np.repeat(means[:, :full_cols], block_size, axis=1)
+        if core_width < width:
+            rows = np.concatenate([rows, np.repeat(means[:, full_cols:], width - core_width, axis=1)], axis=1)
+        result = np.empty_like(pixels)
+        if full_rows:
+            result[:core_height].reshape(full_rows, block_size, width, channels)[:] = rows[:full_rows, None]
+        if core_height < height:
+            result[core_height:] = rows[-1]
+
+        if channels == 1:
+            result = result[:, :, 0]
+        return Image.fromarray(result, region.mode)
+
     def apply_last_settings(self, image):
         """
         前回の設定で再度モザイク処理を適用
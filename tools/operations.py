@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+編集操作の定義・適用モジュール
+GUIを介さずに各ツールを連続適用するための共通処理
+"""
+
+from itertools import groupby
+from PIL import Image
+
+from tools.geometry import clip_box
+
+# 利用可能な操作名
+OPERATION_NAMES = ('bg_remove', 'mosaic', 'paint', 'trim', 'rotate', 'flip')
+
+# タイル画像のまま (交差するタイルだけで) 適用できる操作
+TILED_OPERATIONS = ('mosaic', 'paint', 'trim')
+
+
+def _parse_area(args, name):
+    """操作引数の先頭4要素を領域 (x1, y1, x2, y2) として解析"""
+    if len(args) < 4:
+        raise ValueError(f"{name}: 領域 x1,y1,x2,y2 を指定してください")
+    try:
+        x1, y1, x2, y2 = (int(v) for v in args[:4])
+    except ValueError:
+        raise ValueError(f"{name}: 領域は整数で指定してください: {','.join(args[:4])}")
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"{name}: 無効な領域です: {x1},{y1},{x2},{y2}")
+    return (x1, y1, x2, y2)
+
+
+def parse_operation(spec):
+    """
+    操作指定文字列を解析
+
+    書式:
+        bg_remove[:モデル名]
+        mosaic:x1,y1,x2,y2[,強度]
+        paint:x1,y1,x2,y2[,カラーコード (#RGB、#RRGGBB、#RRGGBBAA、色名)]
+        trim:x1,y1,x2,y2
+        rotate[:角度]
+        flip[:horizontal|vertical]
+
+    Args:
+        spec: 操作指定文字列
+
+    Returns:
+        (操作名, パラメータ辞書) のタプル
+
+    Raises:
+        ValueError: 書式が不正な場合
+    """
+    name, _, arg_text = spec.strip().partition(':')
+    name = name.strip().lower()
+    args = [a.strip() for a in arg_text.split(',')] if arg_text else []
+
+    if name == 'bg_remove':
+        return (name, {'model': args[0]} if args else {})
+
+    if name == 'mosaic':
+        params = {'area': _parse_area(args, name)}
+        if len(args) > 4:
+            try:
+                params['strength'] = max(1, min(50, int(args[4])))
+            except ValueError:
+                raise ValueError(f"mosaic: 強度は整数で指定してください: {args[4]}")
+        return (name, params)
+
+    if name == 'paint':
+        params = {'area': _parse_area(args, name)}
+        if len(args) > 4:
+            from tools.painter import parse_color
+            try:
+                parse_color(args[4])
+            except ValueError:
+                raise ValueError(f"paint: 色を解釈できません: {args[4]}")
+            params['color'] = args[4]
+        return (name, params)
+
+    if name == 'trim':
+        return (name, {'area': _parse_area(args, name)})
+
+    if name == 'rotate':
+        try:
+            angle = int(args[0]) if args else 90
+        except ValueError:
+            raise ValueError(f"rotate: 角度は整数で指定してください: {args[0]}")
+        return (name, {'angle': angle})
+
+    if name == 'flip':
+        direction = args[0].lower() if args else 'horizontal'
+        if direction not in ('horizontal', 'vertical'):
+            raise ValueError(f"flip: horizontal または vertical を指定してください: {direction}")
+        return (name, {'direction': direction})
+
+    raise ValueError(f"未対応の操作です: {name} (利用可能: {', '.join(OPERATION_NAMES)})")
+
+
+def rotate_image(image, angle):
+    """
+    画像を回転
+
+    Args:
+        image: PIL.Image オブジェクト
+        angle: 回転角度 (反時計回り)
+
+    Returns:
+        回転された PIL.Image オブジェクト
+    """
+    return image.rotate(angle, expand=True)
+
+
+def flip_image(image, direction):
+    """
+    画像を反転
+
+    Args:
+        image: PIL.Image オブジェクト
+        direction: 'horizontal' または 'vertical'
+
+    Returns:
+        反転された PIL.Image オブジェクト
+    """
+    if direction == 'horizontal':
+        return image.transpose(Image.FLIP_LEFT_RIGHT)
+    return image.transpose(Image.FLIP_TOP_BOTTOM)
+
+
+def _not_applied_error(name, area, image):
+    """領域を指定する操作が何も変更しなかった場合の例外"""
+    return RuntimeError(f"{name}: 領域 {','.join(str(v) for v in area)} を適用できませんでした "
+                        f"(画像 {image.width}x{image.height} の範囲外、または処理エラー)")
+
+
+def _paint_group_key(operation):
+    """続けてまとめて塗れる操作のキー (同じ色の塗りつぶし)、それ以外は None"""
+    name, params = operation
+    return (name, params.get('color')) if name == 'paint' else None
+
+
+class ToolSet:
+    """
+    操作の適用に使うツール群
+    ツールは初回使用時に生成する (背景透過はrembgのロードが重いため)
+    """
+
+    def __init__(self, bg_remover=None, intra_op_threads=None):
+        """
+        初期化
+
+        Args:
+            bg_remover: 使用する BackgroundRemover (GUIで読み込み済みのセッションを共有する場合)
+            intra_op_threads: 背景透過のONNX Runtimeの演算内スレッド数 (None で ONNX Runtime の既定値)
+        """
+        self.intra_op_threads = intra_op_threads
+        self._bg_removers = {}
+        if bg_remover is not None:
+            self._bg_removers[bg_remover.model_name] = bg_remover
+        self._mosaic_tool = None
+        self._paint_tool = None
+        self._trim_tool = None
+
+    def get_bg_remover(self, model_name=None):
+        """モデルごとの背景透過ツールを取得 (セッションは以降の処理で再利用される)"""
+        from tools.bg_remover import BackgroundRemover, DEFAULT_MODEL
+        model_name = model_name or DEFAULT_MODEL
+        if model_name not in self._bg_removers:
+            self._bg_removers[model_name] = BackgroundRemover(model_name=model_name,
+                                                              intra_op_threads=self.intra_op_threads)
+        return self._bg_removers[model_name]
+
+    @property
+    def bg_remover(self):
+        return self.get_bg_remover()
+
+    @property
+    def mosaic_tool(self):
+        if self._mosaic_tool is None:
+            from tools.mosaic import MosaicTool
+            self._mosaic_tool = MosaicTool()
+        return self._mosaic_tool
+
+    @property
+    def paint_tool(self):
+        if self._paint_tool is None:
+            from tools.painter import PaintTool
+            self._paint_tool = PaintTool()
+        return self._paint_tool
+
+    @property
+    def trim_tool(self):
+        if self._trim_tool is None:
+            from tools.trimmer import TrimTool
+            self._trim_tool = TrimTool()
+        return self._trim_tool
+
+    def apply(self, image, operation, inplace=False, strict=False):
+        """
+        操作を1つ適用
+
+        Args:
+            image: PIL.Image または TiledImage オブジェクト
+            operation: parse_operation() が返す (操作名, パラメータ辞書)
+            inplace: True の場合、モザイク・塗りつぶしは渡された画像に直接書き込む
+            strict: True の場合、操作が失敗した・何も変更しなかった場合に例外を送出する
+                    (各ツールはエラー時に元の画像を返すため、墨消しの漏れを見逃さないように一括処理で使う)
+
+        Returns:
+            処理後の PIL.Image オブジェクト (タイル画像のまま処理できた場合は TiledImage)
+
+        Raises:
+            RuntimeError: strict が True で、操作を適用できなかった場合
+        """
+        name, params = operation
+
+        # タイル単位で処理できない操作は画像全体を展開してから適用
+        from tools.tiled_image import TiledImage
+        if isinstance(image, TiledImage) and name not in TILED_OPERATIONS:
+            image = image.to_image()
+
+        if name == 'bg_remove':
+            bg_remover = self.get_bg_remover(params.get('model'))
+            if not bg_remover.is_ready():
+                raise RuntimeError(bg_remover.get_last_error())
+            result = bg_remover.process(image)
+            # 背景透過はエラーの場合に元の画像をそのまま返す
+            if strict and result is image:
+                raise RuntimeError(f"bg_remove: 背景透過に失敗しました: {bg_remover.get_last_error()}")
+            return result
+        elif name == 'mosaic':
+            result = self.mosaic_tool.process(image, params['area'], params.get('strength'), inplace=inplace)
+            if strict and self.mosaic_tool.last_changed_box is None:
+                raise _not_applied_error(name, params['area'], image)
+            return result
+        elif name == 'paint':
+            return self._fill(image, [params['area']], params.get('color'), inplace, strict)
+        elif name == 'trim':
+            # トリミングは範囲外の始点を画像の端に寄せるため、画像外の領域は事前に確認する
+            if strict and clip_box(params['area'], image.size) is None:
+                raise _not_applied_error(name, params['area'], image)
+            result = self.trim_tool.process(image, params['area'])
+            if strict and self.trim_tool.last_crop_box is None:
+                raise _not_applied_error(name, params['area'], image)
+            return result
+        elif name == 'rotate':
+            return rotate_image(image, params['angle'])
+        elif name == 'flip':
+            return flip_image(image, params['direction'])
+
+        raise ValueError(f"未対応の操作です: {name}")
+
+    def apply_all(self, image, operations, inplace=False, strict=False):
+        """
+        操作を順番に適用
+
+        Args:
+            image: PIL.Image または TiledImage オブジェクト
+            operations: 操作のリスト
+            inplace: True の場合は渡された画像に直接書き込む (呼び出し側が画像を所有している場合)
+            strict: True の場合、操作が失敗した・何も変更しなかった場合に例外を送出する (apply() と同じ)
+
+        Returns:
+            処理後の PIL.Image オブジェクト
+
+        Raises:
+            RuntimeError: strict が True で、操作を適用できなかった場合
+        """
+        for key, group in groupby(operations, key=_paint_group_key):
+            if key is not None:
+                # 同じ色の塗りつぶしが続く場合は1回でまとめて塗る
+                areas = [params['area'] for _, params in group]
+                image = self._fill(image, areas, key[1], inplace, strict)
+                continue
+            for operation in group:
+                image = self.apply(image, operation, inplace=inplace, strict=strict)
+        return image
+
+    def _fill(self, image, areas, color, inplace, strict):
+        """塗りつぶしを適用 (strict の場合は画像外の領域・何も塗らなかった場合に例外を送出する)"""
+        if strict:
+            for area in areas:
+                if self.paint_tool.target_box(image, area) is None:
+                    raise _not_applied_error('paint', area, image)
+        result = self.paint_tool.fill_many(image, areas, color, inplace=inplace)
+        if strict and self.paint_tool.last_changed_box is None:
+            raise RuntimeError(f"paint: 塗りつぶしに失敗したか、透明な色のため何も変更されませんでした: "
+                               f"{color or self.paint_tool.get_color()}")
+        return result
@@ -5,7 +5,34 @@
 """
 
 import traceback
-from PIL import Image, ImageDraw
+from functools import lru_cache
+from PIL import Image, ImageColor
+
+from tools.geometry import clip_box
+
+# 色を解釈できない場合の色 (赤)
+DEFAULT_RGBA = (255, 0, 0, 255)
+
+
+@lru_cache(maxsize=256)
+def parse_color(color):
+    """
+    カラー指定を (R, G, B, A) に変換 (結果はキャッシュする)
+
+    '#RGB'、'#RGBA'、'#RRGGBB'、'#RRGGBBAA' とCSSの色名 ('red' など) に対応
+
+    Args:
+        color: カラー指定の文字列
+
+    Returns:
+        (R, G, B, A) のタプル
+
+    Raises:
+        ValueError: 解釈できない場合
+    """
+    rgba = ImageColor.getrgb(str(color).strip())
+    return rgba if len(rgba) == 4 else rgba + (255,)
+
 
 class PaintTool:
     """塗りつぶし処理クラス"""
@@ -14,13 +41,14 @@ class PaintTool:
         """初期化"""
         self.color = '#FF0000'  # デフォルト色（赤）
         self.last_area = None  # 最後に処理したエリア
+        self.last_changed_box = None  # 最後の処理で変更された矩形 (x1, y1, x2, y2)
 
     def set_color(self, color):
         """
         塗りつぶし色を設定
 
         Args:
-            color: カラーコード（例: '#FF0000'）
+            color: カラーコード（例: '#FF0000'、'#F00'、'red'）
         """
         self.color = color
 
@@ -28,7 +56,17 @@ class PaintTool:
         """現在の塗りつぶし色を取得"""
         return self.color
 
-    def process(self, image, area, color=None):
+    def target_box(self, image, area):
+        """
+        処理で変更される矩形を返す (処理の前に変更前の画素を記録するため)
+
+        Returns:
+            画像の範囲内に制限した矩形 (x1, y1, x2, y2)、範囲外の場合は None
+            (ほかのツール・表示位置の変換と同じく、終点 x2, y2 の画素は含まない)
+        """
+        return clip_box(area, image.size)
+
+    def process(self, image, area, color=None, inplace=False):
         """
         塗りつぶし処理を適用
 
@@ -36,11 +74,32 @@ class PaintTool:
             image: PIL.Image オブジェクト
             area: 塗りつぶし領域 (x1, y1, x2, y2)
             color: カラーコード（指定がない場合は現在の色を使用）
+            inplace: True の場合は画像全体をコピーせず、渡された画像に直接書き込む
+                     (変更前の画素を履歴などに記録済みの場合に使う。
+                      RGB・RGBA以外のモードは変換するため新しい画像になる)
 
         Returns:
             塗りつぶし処理された PIL.Image オブジェクト
         """
-        if not image or not area:
+        return self.fill_many(image, [area] if area else [], color, inplace)
+
+    def fill_many(self, image, areas, color=None, inplace=False):
+        """
+        複数の矩形を同じ色でまとめて塗りつぶす (一括の墨消しなど)
+        画像のコピーや変換は1回だけ行う
+
+        透明度のある色は、矩形の範囲だけ元の画素に重ねて合成する
+
+        Args:
+            image: PIL.Image または TiledImage オブジェクト (領域と交差するタイルだけを読み書きする)
+            areas: 塗りつぶし領域 (x1, y1, x2, y2) のリスト
+            color: カラーコード（指定がない場合は現在の色を使用）
+            inplace: True の場合は画像全体をコピーせず、渡された画像に直接書き込む
+
+        Returns:
+            塗りつぶし処理された PIL.Image オブジェクト
+        """
+        if not image or not areas:
             return image
 
         # 色が指定されていない場合は現在の色を使用
@@ -48,41 +107,43 @@ class PaintTool:
             color = self.color
 
         # 領域の保存
-        self.last_area = area
+        self.last_area = areas[-1]
+        self.last_changed_box = None
 
         try:
-            # 画像のコピーを作成し、アルファチャンネルを確保
-            if image.mode != 'RGBA':
-                result = image.convert('RGBA')
+            rgba = self._get_rgba(color)
+            alpha = rgba[3]
+            # 完全に透明な色では何も変わらない (モードの変換もしない)
+            if alpha == 0:
+                return image
+
+            # RGB・RGBAはそのまま塗り、それ以外のモードはRGBAに変換
+            if image.mode in ('RGB', 'RGBA'):
+                result = image if inplace else image.copy()
             else:
-                result = image.copy()
-
-            # 描画オブジェクト作成
-            draw = ImageDraw.Draw(result)
-
-            # 色の解析
-            try:
-                # 16進カラーコードをRGBAに変換
-                if color.startswith('#'):
-                    if len(color) == 7:  # #RRGGBB
-                        r = int(color[1:3], 16)
-                        g = int(color[3:5], 16)
-                        b = int(color[5:7], 16)
-                        a = 255
-                    elif len(color) == 9:  # #RRGGBBAA
-                        r = int(color[1:3], 16)
-                        g = int(color[3:5], 16)
-                        b = int(color[5:7], 16)
-                        a = int(color[7:9], 16)
-                    else:
-                        r, g, b, a = 255, 0, 0, 255  # デフォルト赤
+                result = image.convert('RGBA')
+            fill = rgba if result.mode == 'RGBA' else rgba[:3]
+
+            boxes = []
+            for area in areas:
+                box = self.target_box(result, area)
+                if box is None:
+                    continue
+                size = (box[2] - box[0], box[3] - box[1])
+                if alpha == 255:
+                    result.paste(fill, box)
+                elif result.mode == 'RGBA':
+                    # 矩形の範囲だけアルファ合成する
+                    result.alpha_composite(Image.new('RGBA', size, rgba), dest=box[:2])
                 else:
-                    r, g, b, a = 255, 0, 0, 255  # デフォルト赤
-            except:
-                r, g, b, a = 255, 0, 0, 255  # エラー時はデフォルト赤
+                    # RGBは不透明なので、透明度をマスクにして混ぜ合わせる
+                    result.paste(fill, box, Image.new('L', size, alpha))
+                boxes.append(box)
 
-            # 矩形を塗りつぶし
-            draw.rectangle(area, fill=(r, g, b, a))
+            # 変更された矩形 (すべての矩形を囲む範囲)
+            if boxes:
+                self.last_changed_box = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                                         max(b[2] for b in boxes), max(b[3] for b in boxes))
 
             return result
 
@@ -91,6 +152,14 @@ class PaintTool:
             # エラーが発生した場合は元の画像を返す
             return image
 
+    def _get_rgba(self, color):
+        """カラー指定を (R, G, B, A) に変換 (解釈できない場合は赤)"""
+        try:
+            return parse_color(color)
+        except ValueError:
+            print(f"色を解釈できないため赤で塗りつぶします: {color}")
+            return DEFAULT_RGBA
+
     def apply_last_settings(self, image):
         """
         前回の設定で再度塗りつぶし処理を適用
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+処理結果キャッシュモジュール
+画素データと処理パラメータのハッシュをキーに、処理結果の画像を保持する
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+from collections import OrderedDict
+from PIL import Image
+
+# ディスクキャッシュのファイルの拡張子
+DISK_SUFFIXES = ('.png', '.rgba')
+
+# この時間 (秒) より古い一時ファイルは書き込み途中で終了したものとみなして削除する
+ORPHAN_TEMP_SECONDS = 60
+
+
+def image_nbytes(image):
+    """画像の画素データのバイト数 (概算) を返す"""
+    return image.width * image.height * len(image.getbands())
+
+
+class ResultCache:
+    """
+    処理結果のキャッシュクラス
+    メモリ上のLRU (バイト数で上限) と、任意のディスク層の2段構成
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None, disk_format='png',
+                 max_disk_bytes=1024 * 1024 * 1024):
+        """
+        初期化
+
+        Args:
+            max_bytes: メモリ上に保持する画素データの上限バイト数
+            disk_dir: ディスクキャッシュの保存先 (None でディスク層を使わない)
+            disk_format: ディスクの保存形式 'png' (圧縮PNG) または 'raw' (無圧縮)
+            max_disk_bytes: ディスクキャッシュの上限バイト数
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_format = disk_format
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                print(f"ディスクキャッシュを作成できませんでした: {str(e)}")
+                self.disk_dir = None
+
+    @staticmethod
+    def make_key(image, *params):
+        """
+        画素データと処理パラメータからキャッシュキーを作成
+
+        Args:
+            image: PIL.Image オブジェクト
+            params: モデル名や処理パラメータなど、結果に影響する値
+
+        Returns:
+            キー文字列 (16進ハッシュ)
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{image.mode}|{image.width}x{image.height}|{params!r}".encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        キャッシュから結果を取得
+
+        Args:
+            key: make_key() で作成したキー
+
+        Returns:
+            PIL.Image オブジェクト (コピー)、キャッシュにない場合は None
+        """
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image.copy()
+
+        image = self._load_from_disk(key)
+        with self._lock:
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, image)
+        return image.copy()
+
+    def put(self, key, image):
+        """
+        結果をキャッシュに保存
+
+        Args:
+            key: make_key() で作成したキー
+            image: PIL.Image オブジェクト
+        """
+        image = image.copy()
+        with self._lock:
+            self._store(key, image)
+        self._save_to_disk(key, image)
+
+    def _store(self, key, image):
+        """メモリ層に保存し、上限を超えた分を古い順に破棄 (ロック取得済みで呼ぶ)"""
+        size = image_nbytes(image)
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._current_bytes -= image_nbytes(old)
+
+        self._entries[key] = image
+        self._current_bytes += size
+
+        while self._current_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._current_bytes -= image_nbytes(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        """ディスクキャッシュのファイルパス"""
+        suffix = '.png' if self.disk_format == 'png' else '.rgba'
+        return self.disk_dir / (key + suffix)
+
+    def _load_from_disk(self, key):
+        """ディスク層から読み込み"""
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        if not path.exists():
+            return None
+
+        try:
+            if self.disk_format == 'png':
+                with Image.open(path) as opened:
+                    opened.load()
+                    image = opened.copy()
+            else:
+                with open(path, 'rb') as f:
+                    mode, width, height = f.readline().decode('ascii').split()
+                    image = Image.frombytes(mode, (int(width), int(height)), f.read())
+
+        except Exception as e:
+            print(f"ディスクキャッシュの読み込みエラー: {str(e)}")
+            return None
+
+        # 更新日時を使用日時として扱い、上限を超えたときは使われていないものから削除する
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    def _save_to_disk(self, key, image):
+        """ディスク層に保存 (一時ファイルに書いてから置き換える)"""
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        temp_path = None
+        try:
+            # 同じキーを複数のスレッド・プロセスが同時に保存しても衝突しない一時ファイル名にする
+            fd, temp_name = tempfile.mkstemp(prefix=key + '.', suffix='.tmp', dir=str(self.disk_dir))
+            temp_path = Path(temp_name)
+            with os.fdopen(fd, 'wb') as f:
+                if self.disk_format == 'png':
+                    image.save(f, format='PNG', compress_level=1)
+                else:
+                    f.write(f"{image.mode} {image.width} {image.height}\n".encode('ascii'))
+                    f.write(image.tobytes())
+            os.replace(temp_path, path)
+            self.disk_writes += 1
+            self._prune_disk()
+        except Exception as e:
+            print(f"ディスクキャッシュの保存エラー: {str(e)}\n{traceback.format_exc()}")
+            if temp_path is not None and temp_path.exists():
+                temp_path.unlink()
+
+    def _prune_disk(self):
+        """
+        ディスク層が上限を超えていれば、最後に使われたのが古いファイルから削除
+
+        書き込み途中で終了した一時ファイルも削除し、書き込み中の一時ファイルは使用量に含める
+        """
+        now = time.time()
+        files = []
+        total = 0
+        for path in self.disk_dir.iterdir():
+            if path.suffix not in DISK_SUFFIXES + ('.tmp',):
+                continue
+            try:
+                stat = path.stat()
+                if path.suffix == '.tmp' and now - stat.st_mtime > ORPHAN_TEMP_SECONDS:
+                    path.unlink()
+                    continue
+            except OSError:
+                # 他のスレッド・プロセスが置き換え・削除した
+                continue
+            total += stat.st_size
+            if path.suffix in DISK_SUFFIXES:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        for _, size, path in sorted(files, key=lambda item: item[0]):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+
+    def clear(self, disk=False):
+        """
+        キャッシュを空にする
+
+        Args:
+            disk: True の場合はディスク層も削除
+        """
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+        if disk and self.disk_dir:
+            for path in self.disk_dir.iterdir():
+                if path.suffix in DISK_SUFFIXES:
+                    path.unlink()
+
+    def get_stats(self):
+        """ヒット・ミス・破棄数などの統計を返す"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_hits': self.disk_hits,
+                'disk_writes': self.disk_writes,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非同期保存モジュール
+保存する画像の複製を受け取り、ワーカースレッドでエンコード・書き込みを行う (write-behind)
+"""
+
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SaveQueue:
+    """
+    非同期保存キュークラス
+
+    同じパスへの保存が書き込み開始前に複数届いた場合は、最新の画像だけを保存する
+    """
+
+    def __init__(self, image_io, on_done=None):
+        """
+        初期化
+
+        Args:
+            image_io: 保存に使う ImageIO オブジェクト
+            on_done: 保存完了時に on_done(パス, 成功フラグ, メッセージ) を呼ぶ関数 (ワーカースレッドで呼ばれる)
+        """
+        self.image_io = image_io
+        self.on_done = on_done
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="quicksnap-save")
+
+        self._pending = OrderedDict()  # パス -> まだ書き込みを開始していない画像
+        self._lock = threading.Lock()
+
+        # 統計
+        self.saved = 0
+        self.failed = 0
+        self.coalesced = 0  # 新しい保存に置き換えられて書き込まなかった数
+
+    def submit(self, image, file_path):
+        """
+        画像の保存を予約する (すぐに戻る)
+
+        Args:
+            image: PIL.Image または TiledImage オブジェクト (呼び出し後に編集されても影響しないよう複製する)
+            file_path: 保存先のパス
+
+        Returns:
+            書き込み待ちの保存の数
+        """
+        snapshot = image.copy()
+        with self._lock:
+            scheduled = file_path in self._pending
+            if scheduled:
+                self.coalesced += 1
+            self._pending[file_path] = snapshot
+            count = len(self._pending)
+
+        # 同じパスの保存がまだ始まっていなければ、画像を差し替えるだけでよい
+        if not scheduled:
+            self.executor.submit(self._save, file_path)
+        return count
+
+    def pending_count(self):
+        """書き込み待ちの保存の数"""
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait=True):
+        """
+        キューを停止する
+
+        Args:
+            wait: 書き込み待ちの保存をすべて終えてから戻るか
+        """
+        self.executor.shutdown(wait=wait)
+
+    def _save(self, file_path):
+        """ワーカースレッドで保存を実行"""
+        with self._lock:
+            image = self._pending.pop(file_path, None)
+        if image is None:
+            return
+
+        try:
+            success = self.image_io.save_to_file(image, file_path)
+            if success:
+                self.saved += 1
+                message = self.image_io.format_save_stats()
+            else:
+                self.failed += 1
+                message = "保存に失敗しました"
+        except Exception as e:
+            self.failed += 1
+            success = False
+            message = str(e)
+            print(f"画像保存エラー: {str(e)}\n{traceback.format_exc()}")
+
+        if self.on_done:
+            try:
+                self.on_done(file_path, success, message)
+            except Exception as e:
+                # 終了処理中などで通知先がすでに閉じている場合
+                print(f"保存完了の通知に失敗しました: {str(e)}")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間の計測モジュール
+新しいプロセスでアプリケーションを起動し、モジュールごとの読み込み時間とウィンドウ表示までの時間を報告する
+
+使用例:
+    python main.py startup                 # ウィンドウ表示まで計測 (予算 1秒)
+    python main.py startup --no-gui        # モジュールの読み込みだけを計測
+    python main.py startup --budget 0.8    # 予算を超えた場合は終了コード1
+"""
+
+import re
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+# 起動時に読み込まれていてはいけない重いモジュール (最初に使うときに読み込む)
+HEAVY_MODULES = ('rembg', 'onnxruntime', 'cv2', 'numpy', 'scipy', 'pyperclip')
+
+# 起動時間の予算 (秒)
+DEFAULT_BUDGET_SECONDS = 1.0
+
+# 計測するアプリケーションのスクリプト
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+# -X importtime の出力行 ("import time: 自身[us] | 累積[us] | モジュール名")
+_IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$')
+
+
+def loaded_heavy_modules():
+    """現在のプロセスで読み込み済みの重いモジュールの一覧"""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def parse_import_times(text):
+    """
+    python -X importtime の出力を解析
+
+    Args:
+        text: 標準エラー出力の文字列
+
+    Returns:
+        {'module', 'self_seconds', 'cumulative_seconds', 'depth'} の辞書のリスト (読み込んだ順)
+    """
+    imports = []
+    for line in text.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append({
+                'module': module,
+                'self_seconds': int(self_us) / 1e6,
+                'cumulative_seconds': int(cumulative_us) / 1e6,
+                'depth': max(0, len(indent) - 1) // 2,
+            })
+    return imports
+
+
+def measure_startup(gui=True, timeout=60):
+    """
+    新しいプロセスでアプリケーションを起動して起動時間を計測
+
+    Args:
+        gui: ウィンドウを作成して表示されるまでを計測するか (False の場合はモジュールの読み込みまで)
+        timeout: 計測するプロセスの制限時間 (秒)
+
+    Returns:
+        {'import_seconds', 'window_seconds' (gui の場合), 'heavy_modules', 'imports'} の辞書
+
+    Raises:
+        RuntimeError: 計測するプロセスが失敗した場合
+    """
+    command = [sys.executable, '-X', 'importtime', str(MAIN_SCRIPT), '--startup-report']
+    if not gui:
+        command.append('--no-gui')
+    completed = subprocess.run(command, capture_output=True, text=True, timeout=timeout,
+                               cwd=str(MAIN_SCRIPT.parent))
+
+    # 計測結果のJSONは標準出力の最後の行 (アプリケーションの初期化メッセージの後)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        errors = [line for line in completed.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError("起動の計測に失敗しました:\n" + "\n".join(errors[-10:]))
+
+    report = json.loads(lines[-1])
+    report['imports'] = parse_import_times(completed.stderr)
+    return report
+
+
+def format_report(report, top=15):
+    """
+    計測結果を表示用の文字列にする
+
+    Args:
+        report: measure_startup() の戻り値
+        top: 表示するモジュールの数 (main.py から直接読み込んだものを累積時間の長い順に表示)
+    """
+    lines = [f"モジュールの読み込み: {report['import_seconds']:.3f}秒"]
+    if 'window_seconds' in report:
+        lines.append(f"ウィンドウ表示まで: {report['window_seconds']:.3f}秒")
+
+    heavy = report['heavy_modules']
+    lines.append(f"起動時に読み込まれた重いモジュール: {', '.join(heavy) if heavy else 'なし'}")
+
+    top_level = sorted((item for item in report['imports'] if item['depth'] == 0),
+                       key=lambda item: item['cumulative_seconds'], reverse=True)[:top]
+    if top_level:
+        lines.append("")
+        lines.append(f"{'累積 (ms)':>10} {'自身 (ms)':>10}  モジュール")
+        for item in top_level:
+            lines.append(f"{item['cumulative_seconds'] * 1000:10.1f} {item['self_seconds'] * 1000:10.1f}  "
+                         f"{item['module']}")
+    return "\n".join(lines)
+
+
+def build_parser():
+    """コマンドライン引数のパーサーを作成"""
+    parser = argparse.ArgumentParser(
+        prog='quicksnap startup',
+        description='起動時間 (モジュールごとの読み込み時間・ウィンドウ表示までの時間) を計測します'
+    )
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                        help=f'起動時間の予算 (秒、既定: {DEFAULT_BUDGET_SECONDS})。超えた場合は終了コード1')
+    parser.add_argument('--no-gui', action='store_true',
+                        help='ウィンドウを作成せず、モジュールの読み込み時間だけを計測')
+    parser.add_argument('--top', type=int, default=15, help='表示するモジュールの数 (既定: 15)')
+    parser.add_argument('--json', action='store_true', help='計測結果をJSONで出力')
+    return parser
+
+
+def main(argv=None):
+    """
+    起動時間計測のエントリーポイント
+
+    Returns:
+        終了コード (0: 予算内、1: 予算超過または重いモジュールを起動時に読み込んでいる、2: 計測失敗)
+    """
+    args = build_parser().parse_args(argv)
+
+    try:
+        report = measure_startup(gui=not args.no_gui)
+    except Exception as e:
+        print(f"起動時間の計測エラー: {str(e)}")
+        return 2
+
+    measured = report.get('window_seconds', report['import_seconds'])
+    report['budget_seconds'] = args.budget
+    report['within_budget'] = measured <= args.budget and not report['heavy_modules']
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report, top=args.top))
+        print("")
+        if report['heavy_modules']:
+            print(f"NG: 重いモジュールが起動時に読み込まれています ({', '.join(report['heavy_modules'])})")
+        if measured > args.budget:
+            print(f"NG: 起動時間 {measured:.3f}秒 が予算 {args.budget:.3f}秒 を超えています")
+        if report['within_budget']:
+            print(f"OK: 起動時間 {measured:.3f}秒 (予算 {args.budget:.3f}秒)")
+
+    return 0 if report['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
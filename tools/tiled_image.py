@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+タイル画像モジュール
+巨大な画像 (スキャン文書・パノラマなど) を固定サイズのタイルに分割して扱う
+タイルは必要になったときに読み込み、メモリの上限を超えたら一時ファイルに退避する
+"""
+
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+from PIL import Image
+
+from tools.encoder import write_png
+
+# タイルの一辺のピクセル数
+DEFAULT_TILE_SIZE = 512
+
+# この画素数以上の画像は一括処理でタイル画像として扱う
+TILED_THRESHOLD_PIXELS = 100 * 1000 * 1000
+
+
+class TiledImage:
+    """
+    タイル画像クラス
+
+    PIL.Image と同じ名前のメソッド (crop / paste / alpha_composite / copy / convert) を持ち、
+    各処理は範囲と交差するタイルだけを読み書きする
+    """
+
+    def __init__(self, size, mode, tile_size=DEFAULT_TILE_SIZE, loader=None,
+                 max_resident_bytes=256 * 1024 * 1024, spill_dir=None):
+        """
+        初期化
+
+        Args:
+            size: 画像サイズ (width, height)
+            mode: 画像モード ('L', 'RGB', 'RGBA' など)
+            tile_size: タイルの一辺のピクセル数
+            loader: loader(box) で範囲 (x1, y1, x2, y2) の画素を返す関数 (None の場合は黒で初期化)
+            max_resident_bytes: メモリ上に保持するタイルの上限バイト数
+            spill_dir: 退避用の一時ファイルを作成するディレクトリ (None で既定の一時ディレクトリ)
+        """
+        self.size = tuple(size)
+        self.mode = mode
+        self.tile_size = tile_size
+        self.max_resident_bytes = max_resident_bytes
+        self.spill_dir = spill_dir
+        self._loader = loader
+        self._source = None  # loader が読み込む元のタイル画像 (close() で一緒に閉じる)
+
+        self.columns = (self.width + tile_size - 1) // tile_size
+        self.rows = (self.height + tile_size - 1) // tile_size
+        self._bands = Image.getmodebands(mode)
+
+        self._tiles = OrderedDict()  # (列, 行) -> タイル画像 (LRU順)
+        self._dirty = set()          # 退避先・読み込み元と内容が異なるタイル
+        self._spilled = set()        # 一時ファイルに退避済みのタイル
+        self._spill_file = None
+        self._resident_bytes = 0
+
+        # 統計
+        self.loads = 0
+        self.spill_writes = 0
+        self.spill_reads = 0
+
+    @classmethod
+    def from_image(cls, image, tile_size=DEFAULT_TILE_SIZE, **kwargs):
+        """PIL.Image をタイル画像にする (タイルは必要になったときに切り出す)"""
+        return cls(image.size, image.mode, tile_size, loader=image.crop, **kwargs)
+
+    @classmethod
+    def from_lazy(cls, lazy_image, tile_size=DEFAULT_TILE_SIZE, **kwargs):
+        """
+        LazyImage をタイル画像にする
+
+        メモリマップから必要なタイルの範囲だけをデコードできる BMP (無圧縮)・NPY のみ対応する
+        (それ以外の形式は全体をデコードするしかなく、タイルに分けると画像全体とタイルの二重にメモリを使うため)
+
+        Raises:
+            ValueError: 範囲だけをデコードできない形式の場合
+        """
+        if not lazy_image.supports_region_decode:
+            raise ValueError(f"タイル画像にできるのは無圧縮のBMPとNPYのみです: {lazy_image.format}")
+        return cls(lazy_image.size, lazy_image.output_mode, tile_size, loader=lazy_image.crop, **kwargs)
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def getbands(self):
+        return Image.new(self.mode, (1, 1)).getbands()
+
+    def tile_box(self, key):
+        """タイル (列, 行) の範囲 (x1, y1, x2, y2)"""
+        column, row = key
+        x1, y1 = column * self.tile_size, row * self.tile_size
+        return (x1, y1, min(x1 + self.tile_size, self.width), min(y1 + self.tile_size, self.height))
+
+    def tiles_in_box(self, box):
+        """範囲と交差するタイル (列, 行) のリスト"""
+        x1, y1, x2, y2 = box
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(self.width, x2), min(self.height, y2)
+        if x2 <= x1 or y2 <= y1:
+            return []
+        size = self.tile_size
+        return [(column, row)
+                for row in range(y1 // size, (y2 - 1) // size + 1)
+                for column in range(x1 // size, (x2 - 1) // size + 1)]
+
+    def crop(self, box):
+        """
+        範囲の画素を PIL.Image として返す (画像外の部分は黒)
+
+        Args:
+            box: 範囲 (x1, y1, x2, y2)
+        """
+        x1, y1, x2, y2 = (int(v) for v in box)
+        result = Image.new(self.mode, (x2 - x1, y2 - y1))
+        for key in self.tiles_in_box((x1, y1, x2, y2)):
+            tx1, ty1, tx2, ty2 = self.tile_box(key)
+            part = (max(x1, tx1), max(y1, ty1), min(x2, tx2), min(y2, ty2))
+            tile = self._get_tile(key)
+            result.paste(tile.crop((part[0] - tx1, part[1] - ty1, part[2] - tx1, part[3] - ty1)),
+                         (part[0] - x1, part[1] - y1))
+        return result
+
+    def paste(self, im, box=None, mask=None):
+        """
+        画像または色を貼り付ける (PIL.Image.paste と同じ引数)
+
+        Args:
+            im: PIL.Image オブジェクトまたは色
+            box: 貼り付け位置 (x, y) または範囲 (x1, y1, x2, y2)
+            mask: マスク画像
+        """
+        if box is None:
+            box = (0, 0)
+        if len(box) == 2:
+            if not isinstance(im, Image.Image):
+                raise ValueError("色を貼り付ける場合は範囲 (x1, y1, x2, y2) を指定してください")
+            box = (box[0], box[1], box[0] + im.width, box[1] + im.height)
+        box = tuple(int(v) for v in box)
+
+        if mask is not None or not isinstance(im, Image.Image):
+            # マスク付き・色の貼り付けは範囲を切り出して合成してから書き戻す
+            region = self.crop(box)
+            region.paste(im, (0, 0, region.width, region.height), mask)
+            im = region
+        elif im.mode != self.mode:
+            im = im.convert(self.mode)
+
+        self._write(im, box[:2])
+
+    def alpha_composite(self, im, dest=(0, 0)):
+        """範囲だけをアルファ合成する (PIL.Image.alpha_composite と同じ)"""
+        box = (dest[0], dest[1], dest[0] + im.width, dest[1] + im.height)
+        region = self.crop(box)
+        region.alpha_composite(im)
+        self._write(region, box[:2])
+
+    def copy(self):
+        """
+        タイル画像を複製 (変更されたタイルだけを一時ファイル経由で複製し、メモリ上限は共有しない)
+        """
+        duplicate = TiledImage(self.size, self.mode, self.tile_size, self._loader,
+                               self.max_resident_bytes, self.spill_dir)
+        for key in self._dirty | self._spilled:
+            duplicate._put_tile(key, self._get_tile(key).copy(), dirty=True)
+        return duplicate
+
+    def convert(self, mode):
+        """
+        モードを変換したタイル画像を返す (タイルは読み込み時に変換する)
+        変換元のタイル画像は以後変更しないこと (変換後のタイル画像を閉じると変換元も閉じる)
+        """
+        if mode == self.mode:
+            return self.copy()
+        converted = TiledImage(self.size, mode, self.tile_size,
+                               loader=lambda box: self.crop(box).convert(mode),
+                               max_resident_bytes=self.max_resident_bytes, spill_dir=self.spill_dir)
+        converted._source = self
+        return converted
+
+    def sub_image(self, box):
+        """
+        範囲を切り出したタイル画像を返す (トリミング、タイルは読み込み時に切り出す)
+        切り出し元のタイル画像は以後変更しないこと (切り出したタイル画像を閉じると切り出し元も閉じる)
+        """
+        x1, y1, x2, y2 = box
+        cropped = TiledImage((x2 - x1, y2 - y1), self.mode, self.tile_size,
+                             loader=lambda b: self.crop((b[0] + x1, b[1] + y1, b[2] + x1, b[3] + y1)),
+                             max_resident_bytes=self.max_resident_bytes, spill_dir=self.spill_dir)
+        cropped._source = self
+        return cropped
+
+    def to_image(self):
+        """画像全体を PIL.Image として展開 (タイル単位で処理できない操作用)"""
+        return self.crop((0, 0, self.width, self.height))
+
+    def iter_strips(self, strip_height=None):
+        """
+        上から順に横長の帯 (y, PIL.Image) を返すジェネレーター (保存時のストリーミング用)
+
+        Args:
+            strip_height: 帯の高さ (省略時はタイルの高さ)
+        """
+        strip_height = strip_height or self.tile_size
+        for y in range(0, self.height, strip_height):
+            yield y, self.crop((0, y, self.width, min(y + strip_height, self.height)))
+
+    def close(self):
+        """タイルと一時ファイルを破棄 (convert() / sub_image() で作成した場合は元のタイル画像も閉じる)"""
+        if self._source is not None:
+            source, self._source = self._source, None
+            source.close()
+        self._tiles.clear()
+        self._dirty.clear()
+        self._spilled.clear()
+        self._resident_bytes = 0
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def get_stats(self):
+        """タイル数・メモリ使用量・退避回数などの統計を返す"""
+        return {
+            'tiles': self.columns * self.rows,
+            'resident_tiles': len(self._tiles),
+            'resident_bytes': self._resident_bytes,
+            'spilled_tiles': len(self._spilled),
+            'loads': self.loads,
+            'spill_writes': self.spill_writes,
+            'spill_reads': self.spill_reads,
+        }
+
+    def _write(self, im, origin):
+        """PIL.Image を origin の位置に、交差するタイルだけに書き込む"""
+        x, y = origin
+        x2, y2 = x + im.width, y + im.height
+        for key in self.tiles_in_box((x, y, x2, y2)):
+            tx1, ty1, tx2, ty2 = self.tile_box(key)
+            part = (max(x, tx1), max(y, ty1), min(x2, tx2), min(y2, ty2))
+            tile = self._get_tile(key)
+            tile.paste(im.crop((part[0] - x, part[1] - y, part[2] - x, part[3] - y)),
+                       (part[0] - tx1, part[1] - ty1))
+            self._dirty.add(key)
+
+    def _tile_nbytes(self, tile):
+        return tile.width * tile.height * self._bands
+
+    def _get_tile(self, key):
+        """タイルを取得 (メモリ上 → 一時ファイル → 読み込み元 の順に探す)"""
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+
+        box = self.tile_box(key)
+        size = (box[2] - box[0], box[3] - box[1])
+        if key in self._spilled:
+            tile = self._read_spilled(key, size)
+        elif self._loader is not None:
+            tile = self._loader(box)
+            if tile.mode != self.mode:
+                tile = tile.convert(self.mode)
+            self.loads += 1
+        else:
+            tile = Image.new(self.mode, size)
+
+        self._put_tile(key, tile, dirty=False)
+        return tile
+
+    def _put_tile(self, key, tile, dirty):
+        """タイルをメモリ上に保持し、上限を超えた分を古い順に退避"""
+        old = self._tiles.pop(key, None)
+        if old is not None:
+            self._resident_bytes -= self._tile_nbytes(old)
+        self._tiles[key] = tile
+        self._resident_bytes += self._tile_nbytes(tile)
+        if dirty:
+            self._dirty.add(key)
+
+        # 直近に使ったタイルは処理中の可能性があるため残す
+        while self._resident_bytes > self.max_resident_bytes and len(self._tiles) > 1:
+            old_key, old_tile = self._tiles.popitem(last=False)
+            self._resident_bytes -= self._tile_nbytes(old_tile)
+            if old_key in self._dirty:
+                self._spill(old_key, old_tile)
+                self._dirty.discard(old_key)
+
+    def _slot_offset(self, key):
+        """一時ファイル内のタイルの位置 (タイルごとに固定サイズの領域を割り当てる)"""
+        column, row = key
+        return (row * self.columns + column) * self.tile_size * self.tile_size * self._bands
+
+    def _spill(self, key, tile):
+        """変更されたタイルを一時ファイルに退避"""
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix='quicksnap-tiles-', dir=self.spill_dir)
+        self._spill_file.seek(self._slot_offset(key))
+        self._spill_file.write(tile.tobytes())
+        self._spilled.add(key)
+        self.spill_writes += 1
+
+    def _read_spilled(self, key, size):
+        """一時ファイルからタイルを読み込む"""
+        self._spill_file.seek(self._slot_offset(key))
+        data = self._spill_file.read(size[0] * size[1] * self._bands)
+        self.spill_reads += 1
+        return Image.frombytes(self.mode, size, data)
+
+
+def save_png_stream(tiled_image, fp, compress_level=6, compress_type=zlib.Z_DEFAULT_STRATEGY,
+                    row_filter='none', workers=1):
+    """
+    タイル画像を帯ごとに圧縮しながらPNGとして書き出す (画像全体を展開しない)
+
+    Args:
+        tiled_image: TiledImage オブジェクト ('L', 'LA', 'RGB', 'RGBA')
+        fp: 書き込み先のバイナリファイルオブジェクト
+        compress_level: zlibの圧縮レベル (0-9)
+        compress_type: zlibの圧縮戦略
+        row_filter: 行フィルター ('none', 'sub', 'up')
+        workers: 圧縮に使うスレッド数
+    """
+    strips = (strip for _, strip in tiled_image.iter_strips())
+    write_png(fp, tiled_image.size, tiled_image.mode, strips, compress_level=compress_level,
+              compress_type=compress_type, row_filter=row_filter, workers=workers)
+
+
+def save_bmp_stream(tiled_image, fp):
+    """
+    タイル画像を下の帯から順にBMPとして書き出す (画像全体を展開しない)
+
+    Args:
+        tiled_image: TiledImage オブジェクト ('RGB' は24ビット、'RGBA' は32ビット)
+        fp: 書き込み先のバイナリファイルオブジェクト
+    """
+    bits = 32 if tiled_image.mode == 'RGBA' else 24
+    rawmode = 'BGRA' if bits == 32 else 'BGR'
+    width, height = tiled_image.size
+    stride = ((width * bits + 31) // 32) * 4
+    pixel_offset = 14 + 40
+    image_bytes = stride * height
+
+    fp.write(b'BM' + struct.pack('<IHHI', pixel_offset + image_bytes, 0, 0, pixel_offset))
+    fp.write(struct.pack('<IiiHHIIiiII', 40, width, height, 1, bits, 0, image_bytes, 2835, 2835, 0, 0))
+
+    # BMPは下の行から格納するため、帯を下から順に上下逆の並びで書き出す
+    strips = range((height - 1) // tiled_image.tile_size * tiled_image.tile_size, -1, -tiled_image.tile_size)
+    for y in strips:
+        strip = tiled_image.crop((0, y, width, min(y + tiled_image.tile_size, height)))
+        if strip.mode not in ('RGB', 'RGBA'):
+            strip = strip.convert('RGB')
+        fp.write(strip.tobytes('raw', (rawmode, stride, -1)))
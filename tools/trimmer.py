@@ -7,29 +7,33 @@
 import traceback
 from PIL import Image
 
+from tools.tiled_image import TiledImage
+
 class TrimTool:
     """トリミング処理クラス"""
 
     def __init__(self):
         """初期化"""
         self.last_area = None  # 最後に処理したエリア
+        self.last_crop_box = None  # 最後に実際に切り取った範囲 (画像内に制限済み)
 
     def process(self, image, area):
         """
         トリミング処理を適用
 
         Args:
-            image: PIL.Image オブジェクト
+            image: PIL.Image または TiledImage オブジェクト
             area: トリミング領域 (x1, y1, x2, y2)
 
         Returns:
-            トリミングされた PIL.Image オブジェクト
+            トリミングされた PIL.Image オブジェクト (TiledImage の場合は切り出したタイル画像)
         """
         if not image or not area:
             return image
 
         # 領域の保存
         self.last_area = area
+        self.last_crop_box = None
 
         try:
             # 選択領域が画像の範囲内にあることを確認
@@ -47,8 +51,12 @@ class TrimTool:
                 print("無効なトリミング領域です")
                 return image
 
-            # トリミング実行
-            trimmed = image.crop((x1, y1, x2, y2))
+            # トリミング実行 (タイル画像は範囲のタイルだけを後から読み込む)
+            if isinstance(image, TiledImage):
+                trimmed = image.sub_image((x1, y1, x2, y2))
+            else:
+                trimmed = image.crop((x1, y1, x2, y2))
+            self.last_crop_box = (x1, y1, x2, y2)
 
             return trimmed
 
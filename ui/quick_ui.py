@@ -7,19 +7,26 @@ QuickSnap - GUIモジュール
 
 import os
 import io
+import time
+from collections import deque
 import PySimpleGUI as sg
 import PIL.Image
 from PIL import ImageTk
 
+from ui.viewport import Viewport, ZOOM_STEP
+from tools.latency import LatencyRecorder
+
 class QuickEditorGUI:
     """クイック画像エディタのGUIクラス"""
 
-    def __init__(self, event_handler):
+    def __init__(self, event_handler, profiler=None, resident=False):
         """
         GUIの初期化
 
         Args:
             event_handler: GUIイベントを処理するコールバック関数
+            profiler: レイテンシを記録する LatencyRecorder (省略時は無効な計測器を作成)
+            resident: 常駐モードの場合は True (閉じるボタンでウィンドウを閉じずに 'ウィンドウを閉じる' イベントを送る)
         """
         # テーマ設定
         sg.theme('LightGrey1')
@@ -31,30 +38,76 @@ class QuickEditorGUI:
         # イベントハンドラー
         self.event_handler = event_handler
 
+        # レイテンシ計測 (イベント処理・表示更新・イベントの待ち時間)
+        self.profiler = profiler if profiler is not None else LatencyRecorder()
+        self._posted_events = deque()        # 計測中に別スレッドから送ったイベントの (名前, 送信時刻)
+        self._profiler_was_enabled = None    # レイテンシ表示を開く前の計測の有効/無効
+        self.latency_refresh_ms = 500        # レイテンシ表示の更新間隔 (ミリ秒)
+        self._latency_refreshed = 0.0
+
         # 現在のモード
         self.current_mode = None
 
         # ウィンドウの作成
+        self.resident = resident
         self.window = self._create_window()
 
         # 画像表示用の変数
         self.image_element = self.window['画像表示']
+        self.canvas = self.image_element.TKCanvas
         self.displayed_image = None
         self.original_size = None
 
+        # 表示用の縮小画像 (プロキシ) のキャッシュ
+        self.proxy_image = None      # 表示解像度の画像
+        self.display_scale = 1.0     # 表示サイズ / 元画像サイズ
+        self._proxy_source = None    # プロキシの元になった画像
+        self._refine_pending = False # アイドル時に高品質で作り直すか
+        self._photo = None           # 表示中のPhotoImage (部分更新のため使い回す)
+        self._photo_shows_proxy = False  # 表示中のPhotoImageがプロキシ全体を表示しているか
+        self._canvas_image = None    # キャンバス上の画像アイテム (一度だけ作成して使い回す)
+        self.display_timings = deque(maxlen=100)  # 表示更新にかかった時間 (ミリ秒)
+
+        # 表示座標と画像座標の変換・ズーム・パン
+        self.viewport = Viewport(self.image_display_size, center=True)
+        self._pan_anchor = None      # 右ドラッグでのパン開始位置 (表示座標)
+
+        # 範囲選択中の矩形 (画像の上に重ねるベクター図形、画像は描き直さない)
+        self._band = None            # 矩形アイテム
+        self._band_start = None      # ドラッグ開始位置 (表示座標)
+        self._band_pointer = None    # 最新のポインター位置 (表示座標)
+        self._band_after = None      # 予約済みの矩形更新
+        # ドラッグ中の矩形の更新間隔 (ミリ秒、約60fps)。これより速いマウスイベントはまとめて1回だけ描画する
+        self.overlay_frame_ms = 16
+        # マウス移動はイベントループを通さず、キャンバスで直接受け取る
+        self.canvas.bind('<B1-Motion>', self._on_band_motion, add='+')
+
+        # スライダー操作をまとめる待ち時間 (この間に届いた値は最後の1つだけ処理する)
+        self.slider_debounce_ms = 30
+
+        # 処理中表示 (進捗バーのアニメーション用)
+        self.processing = False
+        self._progress_value = 0
+
+        # 最後にイベント (操作・ワーカースレッドからの通知) があった時刻 (time.monotonic()、常駐モードのアイドル判定用)
+        self.last_event_time = time.monotonic()
+
     def _create_window(self):
         """ウィンドウレイアウトの作成"""
         # メニューバー
         menu_def = [
             ['ファイル', ['開く', 'クリップボードから貼り付け', '---', '保存', 'コピー', '---', '終了']],
-            ['編集', ['背景透過', 'モザイク', '塗りつぶし', 'トリミング', '---', '元に戻す']],
+            ['編集', ['背景透過', 'モザイク', '塗りつぶし', 'トリミング', '---', '元に戻す', 'やり直し']],
             ['変換', ['左回転', '右回転', '水平反転', '垂直反転']],
+            ['表示', ['ズームイン', 'ズームアウト', '全体表示', '等倍表示', '---', 'レイテンシ表示', 'レイテンシを保存']],
             ['ヘルプ', ['使い方', 'バージョン情報']]
         ]
 
         # 画像表示エリア
         image_area = [
-            [sg.Image(key='画像表示', size=self.image_display_size, background_color='#F0F0F0', pad=(0, 0))]
+            [sg.Graph(canvas_size=self.image_display_size, graph_bottom_left=(0, self.image_display_size[1]),
+                      graph_top_right=(self.image_display_size[0], 0), key='画像表示',
+                      background_color='#F0F0F0', pad=(0, 0))]
         ]
 
         # 操作ボタンエリア
@@ -89,9 +142,12 @@ class QuickEditorGUI:
             [sg.Frame('回転・反転', rotation_options, key='回転オプション', visible=False, font='Default 10')]
         ]
 
-        # ステータスバー
+        # ステータスバー (処理中は進捗バーとキャンセルボタンを表示)
         status_bar = [
-            [sg.Text('準備完了', key='ステータス', size=(60, 1), justification='left', relief=sg.RELIEF_SUNKEN)]
+            [sg.Text('準備完了', key='ステータス', size=(60, 1), justification='left', relief=sg.RELIEF_SUNKEN),
+             sg.Text('', key='レイテンシ', size=(48, 1), font='Default 8', visible=False),
+             sg.ProgressBar(100, orientation='h', size=(12, 12), key='進捗', visible=False),
+             sg.Button('キャンセル', key='キャンセル', size=(8, 1), visible=False)]
         ]
 
         # 全体レイアウト
@@ -112,17 +168,32 @@ class QuickEditorGUI:
             resizable=True,
             finalize=True,
             return_keyboard_events=True,
+            enable_close_attempted_event=self.resident,
             icon=self._get_default_icon()
         )
 
-        # 画像ドラッグ&ドロップを有効化
-        window['画像表示'].bind('<Button-1>', '画像クリック')
-        window['画像表示'].bind('<ButtonRelease-1>', '画像クリックリリース')
-        window['画像表示'].bind('<B1-Motion>', '画像ドラッグ')
+        # 範囲選択 (左ドラッグ)・パン (右ドラッグ)・ズーム (マウスホイール)
+        # イベント名は要素のキー + 修飾子 (例: '画像表示+クリック') になる
+        window['画像表示'].bind('<Button-1>', '+クリック')
+        window['画像表示'].bind('<ButtonRelease-1>', '+クリックリリース')
+        window['画像表示'].bind('<ButtonPress-3>', '+パン開始')
+        window['画像表示'].bind('<B3-Motion>', '+パン')
+        window['画像表示'].bind('<MouseWheel>', '+ホイール')
+        window['画像表示'].bind('<Button-4>', '+ホイール上')
+        window['画像表示'].bind('<Button-5>', '+ホイール下')
+
+        # ズーム (Ctrl+= / Ctrl+-)・全体表示 (Ctrl+0)
+        window.bind('<Control-equal>', 'ズームイン')
+        window.bind('<Control-minus>', 'ズームアウト')
+        window.bind('<Control-0>', '全体表示')
 
         # クリップボードショートカット (Ctrl+V)
         window.bind('<Control-v>', 'ペースト')
 
+        # 元に戻す (Ctrl+Z)・やり直し (Ctrl+Y)
+        window.bind('<Control-z>', '元に戻す')
+        window.bind('<Control-y>', 'やり直し')
+
         return window
 
     def _get_default_icon(self):
@@ -138,65 +209,424 @@ class QuickEditorGUI:
         """GUIイベントループの実行"""
         # 選択領域の追跡用変数
         start_pos = None
+        # まだ処理していない最新のモザイク強度
+        pending_strength = None
+
+        # ウィンドウを描画してから表示完了をアプリケーションに知らせる (起動時間の記録・事前読み込みの開始)
+        self.window.refresh()
+        self.event_handler('ウィンドウ表示', {})
 
         while True:
-            event, values = self.window.read(timeout=100)
-
-            # イベントハンドラーにイベントを渡す
-            if not self.event_handler(event, values):
-                break
-
-            # 画像の選択開始
-            if event == '画像クリック' and self.displayed_image and self.current_mode in ['mosaic', 'paint', 'trim']:
-                start_pos = values['画像クリック']
-                # 選択開始イベントを送信
-                self.event_handler('選択開始', {'選択開始': start_pos})
-
-            # 画像のドラッグ中
-            elif event == '画像ドラッグ' and start_pos and self.current_mode in ['mosaic', 'paint', 'trim']:
-                # ドラッグ中の視覚的フィードバック（将来的に実装）
-                pass
-
-            # 画像の選択終了
-            elif event == '画像クリックリリース' and start_pos and self.current_mode in ['mosaic', 'paint', 'trim']:
-                end_pos = values['画像クリックリリース']
-                # 選択終了イベントを送信
-                self.event_handler('選択終了', {'選択終了': end_pos})
+            timeout = self.slider_debounce_ms if pending_strength is not None else 100
+            event, values = self.window.read(timeout=timeout)
+            if event != sg.TIMEOUT_KEY:
+                self.last_event_time = time.monotonic()
+            if self._posted_events:
+                self._record_queue_delay(event)
+            # 常駐モードで閉じるボタンが押された (ウィンドウを隠すかどうかはアプリケーションが決める)
+            if event == sg.WINDOW_CLOSE_ATTEMPTED_EVENT:
+                event = 'ウィンドウを閉じる'
+
+            # スライダーの値は溜めておき、動きが止まるか別のイベントが来たら最新の値だけを処理
+            if event == 'モザイク強度':
+                if self.current_mode == 'mosaic':
+                    pending_strength = values['モザイク強度']
+                continue
+            if pending_strength is not None:
+                strength, pending_strength = pending_strength, None
+                if not self.event_handler('モザイク強度', {'モザイク強度': strength}):
+                    break
+                if event == sg.TIMEOUT_KEY:
+                    continue
+
+            # 範囲選択 (表示座標で追跡し、確定時に画像座標に変換して渡す)
+            if event == '画像表示+クリック':
+                start_pos = None
+                if self.displayed_image and self.current_mode in ['mosaic', 'paint', 'trim']:
+                    start_pos = self._pointer_position()
+                    self._begin_rubber_band(start_pos)
+                continue
+            if event == '画像表示+クリックリリース':
+                self._clear_rubber_band()
+                if start_pos and self.displayed_image and self.current_mode in ['mosaic', 'paint', 'trim']:
+                    box = self.viewport.to_image_box(start_pos, self._pointer_position())
+                    if box:
+                        self.event_handler('選択開始', {'選択開始': box[:2]})
+                        self.event_handler('選択終了', {'選択終了': box[2:]})
                 start_pos = None
+                continue
+
+            # ズーム・パン (表示だけの操作のためアプリケーションには渡さない)
+            if self._handle_view_event(event):
+                continue
+
+            # レイテンシ表示の切り替え (表示だけの操作のためアプリケーションには渡さない)
+            if event == 'レイテンシ表示':
+                self._toggle_latency_overlay()
+                continue
+
+            # イベントハンドラーにイベントを渡す (色選択は下で値を確認してから渡す。
+            # 待機中はイベントを渡さず、下でアイドルとして1回だけ知らせる)
+            if event not in ('色選択', sg.TIMEOUT_KEY):
+                start = self.profiler.start() if event != sg.TIMEOUT_KEY else None
+                running = self.event_handler(event, values)
+                self.profiler.stop('handler', start, event)
+                if not running:
+                    break
+
+            # 待機中 (イベントなし) の処理
+            if event == sg.TIMEOUT_KEY:
+                # 処理中は進捗バーを進める
+                if self.processing:
+                    self._progress_value = (self._progress_value + 5) % 105
+                    self.window['進捗'].update(current_count=self._progress_value)
+                # 操作が落ち着いたら表示を高品質で作り直す
+                if self._refine_pending:
+                    self._refine_display()
+                # 保留中の処理を実行する機会をアプリケーションに与える
+                self.event_handler('アイドル', {})
+                # レイテンシ表示を定期的に更新
+                if self._profiler_was_enabled is not None:
+                    self._refresh_latency_overlay()
+                continue
 
             # 回転メニューの表示/非表示
-            elif event == '回転メニュー':
+            if event == '回転メニュー':
                 visible = not self.window['回転オプション'].visible
                 self.window['回転オプション'].update(visible=visible)
 
-            # モザイク強度変更時
-            elif event == 'モザイク強度' and self.current_mode == 'mosaic':
-                self.event_handler('モザイク強度', {'モザイク強度': values['モザイク強度']})
-
             # 色選択
             elif event == '色選択ボタン' or (event == '色選択' and values['色選択'] != ''):
                 self.event_handler('色選択', {'色選択': values['色選択']})
 
         self.window.close()
 
-    def update_image(self, image):
+    def update_image(self, image, interactive=False, proxy=None):
         """
         表示画像の更新
 
         Args:
             image: PIL.Image オブジェクト
+            interactive: True の場合は高速な縮小で表示し、高品質な縮小はアイドル時に行う
+            proxy: 作成済みの表示用縮小画像 (読み込み時のプレビューなど、表示サイズに収まるもの)
         """
         if image:
             self.displayed_image = image
             self.original_size = image.size
 
-            # 画像をリサイズして表示
-            display_image = self._resize_image_to_fit(image, self.image_display_size)
-            photo_img = ImageTk.PhotoImage(display_image)
+            # 画像のサイズが変わった場合 (新しい画像・回転・トリミング) は全体表示に戻す
+            self.viewport.set_image_size(image.size)
 
-            self.image_element.update(data=photo_img)
+            # 同じ画像のプロキシがあれば再利用し、なければ縮小して作成
+            if proxy is not None:
+                self._set_proxy(image, proxy)
+                self._refine_pending = False
+
+            self._render(interactive=interactive)
             self.window['ステータス'].update(f'画像サイズ: {image.width}x{image.height} ピクセル')
 
+    def update_region(self, image, box):
+        """
+        変更された矩形だけを再描画して表示画像を更新
+
+        Args:
+            image: 変更後の PIL.Image オブジェクト
+            box: 変更された矩形 (x1, y1, x2, y2) (元画像の座標)
+        """
+        # ズーム中は見えている範囲を描画し直す (プロキシは全体表示に戻したときに作り直す)
+        if not self.viewport.is_fit() and image.size == self.viewport.image_size:
+            self.displayed_image = image
+            self._render()
+            return
+
+        # プロキシと画像の対応が取れない場合は全体を更新
+        source = self._proxy_source
+        if (not box or self.proxy_image is None or source is None
+                or source.size != image.size or source.mode != image.mode):
+            self.update_image(image, interactive=True)
+            return
+
+        start_time = time.perf_counter()
+
+        # 変更矩形を表示座標に変換 (端の画素を含むよう外側に丸める)
+        scale = self.display_scale
+        x1, y1, x2, y2 = box
+        dx1, dy1 = int(x1 * scale), int(y1 * scale)
+        dx2 = min(self.proxy_image.width, int(x2 * scale + 0.999))
+        dy2 = min(self.proxy_image.height, int(y2 * scale + 0.999))
+        region = None
+        if dx2 > dx1 and dy2 > dy1:
+            # 表示矩形に対応する元画像の範囲だけを縮小してプロキシに貼り付け
+            src_box = (dx1 / scale, dy1 / scale, dx2 / scale, dy2 / scale)
+            region = image.resize((dx2 - dx1, dy2 - dy1), PIL.Image.BILINEAR, box=src_box)
+            self.proxy_image.paste(region, (dx1, dy1))
+
+        self.displayed_image = image
+        self._proxy_source = image
+        if self._photo_shows_proxy:
+            # 表示中のPhotoImageにも変更された矩形だけを書き込む
+            if region is not None:
+                self._paste_photo_region(region, (dx1, dy1))
+        else:
+            self._show_display_image(self.proxy_image)
+
+        self._record_display_time(start_time)
+
+    def show_preview(self, preview_image):
+        """
+        表示解像度で加工済みのプレビュー画像をそのまま表示 (縮小処理なし)
+
+        Args:
+            preview_image: get_proxy() の画像に編集を適用した PIL.Image オブジェクト
+        """
+        start_time = time.perf_counter()
+        self._show_display_image(preview_image)
+        self._record_display_time(start_time)
+
+    def get_proxy(self):
+        """
+        現在の表示用縮小画像と縮小率を返す
+
+        Returns:
+            (表示解像度の PIL.Image オブジェクトのコピー, 縮小率) のタプル
+            画像がない場合・ズーム中は (None, 1.0)
+        """
+        if self.proxy_image is None or not self.viewport.is_fit():
+            return None, 1.0
+        return self.proxy_image.copy(), self.display_scale
+
+    def get_tk_root(self):
+        """ウィンドウの Tk ルート (クリップボードの読み込みなどに使用、ウィンドウがない場合は None)"""
+        return getattr(self.window, 'TKroot', None)
+
+    def get_display_stats(self):
+        """直近の表示更新時間の統計 (ミリ秒) を返す"""
+        if not self.display_timings:
+            return {'count': 0, 'last_ms': 0.0, 'mean_ms': 0.0, 'max_ms': 0.0}
+        timings = list(self.display_timings)
+        return {
+            'count': len(timings),
+            'last_ms': timings[-1],
+            'mean_ms': sum(timings) / len(timings),
+            'max_ms': max(timings),
+        }
+
+    def _record_display_time(self, start_time):
+        """表示更新にかかった時間を記録"""
+        elapsed = (time.perf_counter() - start_time) * 1000
+        self.display_timings.append(elapsed)
+        self.profiler.record('display', elapsed)
+
+    def _record_queue_delay(self, event):
+        """
+        別スレッドから送ったイベントが取り出されるまでの待ち時間を記録
+
+        write_event_value のイベントは送った順に届くため、先頭と名前が一致したときだけ記録する
+        """
+        key, posted = self._posted_events[0]
+        if event == key:
+            self._posted_events.popleft()
+            self.profiler.record('queue', (time.perf_counter() - posted) * 1000, key)
+
+    def _toggle_latency_overlay(self):
+        """ステータスバーのレイテンシ表示を切り替える (表示中は計測を有効にする)"""
+        element = self.window['レイテンシ']
+        if self._profiler_was_enabled is None:
+            self._profiler_was_enabled = self.profiler.enabled
+            self.profiler.enabled = True
+            element.update(self.profiler.format_summary(), visible=True)
+        else:
+            self.profiler.enabled = self._profiler_was_enabled
+            self._profiler_was_enabled = None
+            if not self.profiler.enabled:
+                self._posted_events.clear()
+            element.update(visible=False)
+
+    def _refresh_latency_overlay(self):
+        """レイテンシ表示を更新 (集計の負荷を抑えるため latency_refresh_ms ごと)"""
+        now = time.perf_counter()
+        if (now - self._latency_refreshed) * 1000 >= self.latency_refresh_ms:
+            self._latency_refreshed = now
+            self.window['レイテンシ'].update(self.profiler.format_summary())
+
+    def _set_proxy(self, image, proxy_image):
+        """プロキシを設定 (部分更新で書き換えるため元画像とは別のオブジェクトにする)"""
+        if proxy_image is image:
+            proxy_image = image.copy()
+        self.proxy_image = proxy_image
+        self._proxy_source = image
+        self.display_scale = proxy_image.width / image.width
+
+    def _show_display_image(self, display_image, position=None):
+        """
+        表示解像度の画像をキャンバスに表示
+        サイズが同じ場合は既存のPhotoImageに貼り付けて再利用し、キャンバスの画像アイテムは位置だけを更新する
+
+        Args:
+            display_image: 表示する PIL.Image オブジェクト
+            position: 描画位置の表示座標 (x, y) (省略時はビューポートの画像の左上)
+        """
+        if position is None:
+            position = self._display_position()
+        self._photo_shows_proxy = display_image is self.proxy_image
+        if (self._photo is not None and self._photo.width() == display_image.width
+                and self._photo.height() == display_image.height):
+            self._photo.paste(display_image)
+        else:
+            self._photo = ImageTk.PhotoImage(display_image)
+            if self._canvas_image is not None:
+                self.canvas.itemconfig(self._canvas_image, image=self._photo)
+
+        if self._canvas_image is None:
+            self._canvas_image = self.canvas.create_image(position[0], position[1], image=self._photo, anchor='nw')
+            # 選択中の矩形は常に画像の上に表示する
+            if self._band is not None:
+                self.canvas.tag_raise(self._band)
+        else:
+            self.canvas.coords(self._canvas_image, position[0], position[1])
+
+    def _paste_photo_region(self, region, position):
+        """
+        表示中のPhotoImageの矩形だけを書き換える
+
+        ImageTk.PhotoImage.paste は画像全体しか貼り付けられないため、矩形の画像だけの
+        PhotoImageを作り、Tkの photo copy で表示中のPhotoImageの位置に転送する
+
+        Args:
+            region: 書き込む PIL.Image オブジェクト
+            position: 書き込む位置 (表示中の画像の左上からの x, y)
+        """
+        part = ImageTk.PhotoImage(region)
+        self.canvas.tk.call(str(self._photo), 'copy', str(part), '-to', position[0], position[1])
+
+    def _display_position(self):
+        """表示中の画像の左上の表示座標"""
+        if self.viewport.image_size is None:
+            return (0, 0)
+        x, y = self.viewport.to_display((0, 0))
+        return (max(0, round(x)), max(0, round(y)))
+
+    def _begin_rubber_band(self, position):
+        """範囲選択の矩形の表示を開始"""
+        self._clear_rubber_band()
+        self._band_start = position
+        self._band_pointer = position
+        self._band = self.canvas.create_rectangle(position[0], position[1], position[0], position[1],
+                                                  outline='#0078D7', dash=(4, 2), width=1)
+
+    def _on_band_motion(self, tk_event):
+        """
+        左ドラッグ中のマウス移動 (Tkから直接呼ばれる)
+
+        位置を記録するだけで、矩形の描画は次のフレームにまとめて行う
+        """
+        if self._band is None:
+            return
+        self._band_pointer = (tk_event.x, tk_event.y)
+        if self._band_after is None:
+            self._band_after = self.canvas.after(self.overlay_frame_ms, self._draw_rubber_band)
+
+    def _draw_rubber_band(self):
+        """選択中の矩形を最新のポインター位置に合わせる (画像は描き直さない)"""
+        self._band_after = None
+        if self._band is None:
+            return
+        x1, y1 = self._band_start
+        x2, y2 = self._band_pointer
+        self.canvas.coords(self._band, x1, y1, x2, y2)
+
+    def _clear_rubber_band(self):
+        """選択中の矩形を消す"""
+        if self._band_after is not None:
+            self.canvas.after_cancel(self._band_after)
+            self._band_after = None
+        if self._band is not None:
+            self.canvas.delete(self._band)
+            self._band = None
+        self._band_start = None
+        self._band_pointer = None
+
+    def _refine_display(self):
+        """高速縮小で表示中のプロキシを高品質な縮小で作り直す"""
+        self._refine_pending = False
+        if (self._proxy_source is not None and self._proxy_source is self.displayed_image
+                and self.viewport.is_fit()):
+            start_time = time.perf_counter()
+            self._set_proxy(self._proxy_source, self._resize_image_to_fit(self._proxy_source, self.image_display_size))
+            self._show_display_image(self.proxy_image)
+            self._record_display_time(start_time)
+
+    def _pointer_position(self):
+        """直前のマウスイベントの位置 (画像表示エリア内の表示座標)"""
+        tk_event = self.image_element.user_bind_event
+        return (tk_event.x, tk_event.y)
+
+    def _handle_view_event(self, event):
+        """
+        ズーム・パンのイベントを処理
+
+        Returns:
+            ズーム・パンのイベントだった場合は True
+        """
+        if event == '画像表示+パン開始':
+            self._pan_anchor = self._pointer_position()
+            return True
+        if not self.displayed_image:
+            return event in ('画像表示+パン', '画像表示+ホイール', '画像表示+ホイール上', '画像表示+ホイール下',
+                             'ズームイン', 'ズームアウト', '全体表示', '等倍表示')
+
+        changed = False
+        if event == '画像表示+パン':
+            if self._pan_anchor is not None:
+                position = self._pointer_position()
+                changed = self.viewport.pan(position[0] - self._pan_anchor[0], position[1] - self._pan_anchor[1])
+                self._pan_anchor = position
+        elif event in ('画像表示+ホイール', '画像表示+ホイール上', '画像表示+ホイール下'):
+            # Windows・macOSは delta の符号、Linuxはボタン4 (上)・5 (下) で向きを判定
+            zoom_in = event == '画像表示+ホイール上' or (
+                event == '画像表示+ホイール' and self.image_element.user_bind_event.delta > 0)
+            changed = self.viewport.zoom(ZOOM_STEP if zoom_in else 1 / ZOOM_STEP, self._pointer_position())
+        elif event == 'ズームイン':
+            changed = self.viewport.zoom(ZOOM_STEP)
+        elif event == 'ズームアウト':
+            changed = self.viewport.zoom(1 / ZOOM_STEP)
+        elif event == '全体表示':
+            changed = not self.viewport.is_fit()
+            self.viewport.reset()
+        elif event == '等倍表示':
+            changed = self.viewport.zoom_to(1.0)
+        else:
+            return False
+
+        if changed:
+            # ホイール・ドラッグは連続するため高速に縮小し、高品質な縮小はアイドル時に行う
+            self._render(interactive=True)
+            self.window['ステータス'].update(f'表示倍率: {self.viewport.scale * 100:.0f}%')
+        return True
+
+    def _render(self, interactive=False):
+        """
+        ビューポートに合わせて表示を更新
+
+        全体表示ではプロキシ (縮小画像のキャッシュ) を表示し、
+        ズーム中は見えている範囲だけを表示サイズに拡大・縮小して描画する
+        """
+        image = self.displayed_image
+        start_time = time.perf_counter()
+
+        if self.viewport.is_fit():
+            if image is not self._proxy_source or (self._refine_pending and not interactive):
+                self._set_proxy(image, self._resize_image_to_fit(image, self.image_display_size, fast=interactive))
+                self._refine_pending = interactive and self.display_scale < 1
+            self._show_display_image(self.proxy_image)
+        else:
+            box, size, position = self.viewport.render_region()
+            # 拡大時は画素の境界が分かるよう最近傍で補間する
+            resample = PIL.Image.NEAREST if self.viewport.scale >= 2 else PIL.Image.BILINEAR
+            self._show_display_image(image.resize(size, resample, box=box), position)
+
+        self._record_display_time(start_time)
+
     def update_mode(self, mode):
         """
         編集モードの更新と関連UIの表示/非表示
@@ -224,14 +654,14 @@ class QuickEditorGUI:
         file_path = sg.popup_get_file(
             '画像ファイルを選択',
             file_types=(
-                ('画像ファイル', '*.png;*.jpg;*.jpeg;*.bmp;*.gif'),
+                ('画像ファイル', '*.png;*.jpg;*.jpeg;*.bmp;*.gif;*.npy'),
                 ('すべてのファイル', '*.*')
             ),
             no_window=True
         )
         return file_path
 
-    def get_save_path(self, initial_dir=''):
+    def get_save_path(self, initial_dir='', default_extension='.png'):
         """保存ダイアログを表示し、保存先パスを返す"""
         file_path = sg.popup_get_file(
             '画像を保存',
@@ -241,9 +671,10 @@ class QuickEditorGUI:
                 ('JPEG画像', '*.jpg'),
                 ('BMP画像', '*.bmp'),
                 ('GIF画像', '*.gif'),
+                ('WebP画像', '*.webp'),
                 ('すべてのファイル', '*.*')
             ),
-            default_extension='.png',
+            default_extension=default_extension,
             default_path=initial_dir,
             no_window=True
         )
@@ -261,22 +692,58 @@ class QuickEditorGUI:
         """エラーメッセージをポップアップ表示"""
         sg.popup_error(message, title='エラー')
 
-    def show_processing(self, message):
-        """処理中表示の更新"""
+    def show_processing(self, message, cancellable=False):
+        """
+        処理中表示の更新
+
+        Args:
+            message: ステータスバーに表示するメッセージ
+            cancellable: キャンセルボタンを表示するか
+        """
+        self.processing = True
+        self._progress_value = 0
         self.window['ステータス'].update(message)
+        self.window['進捗'].update(current_count=0, visible=True)
+        self.window['キャンセル'].update(visible=cancellable)
         self.window.refresh()
 
-    def hide_processing(self):
+    def hide_processing(self, message='処理完了'):
         """処理中表示の非表示"""
-        self.window['ステータス'].update('処理完了')
+        self.processing = False
+        self.window['進捗'].update(visible=False)
+        self.window['キャンセル'].update(visible=False)
+        self.window['ステータス'].update(message)
+
+    def hide_window(self):
+        """ウィンドウを隠す (常駐モードで閉じるボタンが押された場合、イベントループは動いたまま)"""
+        self.window.hide()
+
+    def show_window(self):
+        """隠したウィンドウを再表示して前面に出す"""
+        self.window.un_hide()
+        self.window.bring_to_front()
+        self.window.force_focus()
+
+    def post_event(self, key, value):
+        """
+        別スレッドからイベントループにイベントを送る (スレッドセーフ)
+
+        Args:
+            key: イベント名
+            value: イベントの値 (values[key] として受け取る)
+        """
+        if self.profiler.enabled:
+            self._posted_events.append((key, time.perf_counter()))
+        self.window.write_event_value(key, value)
 
-    def _resize_image_to_fit(self, image, max_size):
+    def _resize_image_to_fit(self, image, max_size, fast=False):
         """
         画像をウィンドウサイズに合わせてリサイズ
 
         Args:
             image: PIL.Image オブジェクト
             max_size: 最大サイズ (width, height)
+            fast: True の場合は整数倍の間引き (reduce) と BILINEAR で高速に縮小
 
         Returns:
             リサイズされた PIL.Image オブジェクト
@@ -288,8 +755,17 @@ class QuickEditorGUI:
         scale = min(max_width / img_width, max_height / img_height)
 
         if scale < 1:  # リサイズが必要な場合のみ
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            return image.resize((new_width, new_height), PIL.Image.LANCZOS)
+            new_width = max(1, int(img_width * scale))
+            new_height = max(1, int(img_height * scale))
+
+            if fast:
+                # 整数倍の縮小で画素数を減らしてから補間する
+                factor = int(1 / scale)
+                if factor >= 2:
+                    image = image.reduce(factor)
+                return image.resize((new_width, new_height), PIL.Image.BILINEAR)
+
+            # reducing_gap で大きな画像は先に整数倍縮小してからLANCZOSを適用
+            return image.resize((new_width, new_height), PIL.Image.LANCZOS, reducing_gap=3.0)
         else:
             return image
\ No newline at end of file
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ビューポートモジュール
+表示座標と画像座標の変換 (拡大率とオフセットをキャッシュ)、ズーム・パンを扱う
+"""
+
+import math
+
+# 拡大率の上限 (画像1画素を表示の何画素にするか)
+MAX_ZOOM = 16.0
+
+# ズームイン・ズームアウト1回あたりの倍率
+ZOOM_STEP = 1.25
+
+
+class Viewport:
+    """
+    ビューポートクラス
+
+    表示座標 = 画像座標 × scale + offset の関係を保持する
+    画像全体を表示に収める「全体表示」が最小の拡大率で、それ以上はズームとパンで表示範囲を動かす
+    """
+
+    def __init__(self, view_size, center=False):
+        """
+        初期化
+
+        Args:
+            view_size: 表示領域のサイズ (width, height)
+            center: 画像が表示領域より小さい場合に中央に配置するか (False の場合は左上)
+        """
+        self.view_size = view_size
+        self.center = center
+        self.image_size = None
+        self.fit_scale = 1.0
+        self.scale = 1.0
+        self.offset = (0.0, 0.0)
+
+    def set_image_size(self, image_size):
+        """
+        表示する画像のサイズを設定し、サイズが変わった場合は全体表示に戻す
+
+        Returns:
+            全体表示に戻した場合は True
+        """
+        if image_size == self.image_size:
+            return False
+        self.image_size = image_size
+        width, height = image_size
+        # 全体表示は縮小のみ (小さな画像は等倍)
+        self.fit_scale = min(self.view_size[0] / width, self.view_size[1] / height, 1.0)
+        self.reset()
+        return True
+
+    def reset(self):
+        """全体表示に戻す"""
+        self.scale = self.fit_scale
+        self._clamp()
+
+    def is_fit(self):
+        """全体表示中かどうか"""
+        return self.scale <= self.fit_scale
+
+    def zoom(self, factor, anchor=None):
+        """
+        拡大率を factor 倍にする (anchor の表示座標にある画素が動かないように)
+
+        Args:
+            factor: 倍率 (1より大きいとズームイン)
+            anchor: 基準にする表示座標 (省略時は表示領域の中心)
+
+        Returns:
+            拡大率が変わった場合は True
+        """
+        if self.image_size is None:
+            return False
+        new_scale = max(self.fit_scale, min(MAX_ZOOM, self.scale * factor))
+        if math.isclose(new_scale, self.scale):
+            return False
+
+        if anchor is None:
+            anchor = (self.view_size[0] / 2, self.view_size[1] / 2)
+        image_x, image_y = self.to_image(anchor)
+        self.scale = new_scale
+        self.offset = (anchor[0] - image_x * new_scale, anchor[1] - image_y * new_scale)
+        self._clamp()
+        return True
+
+    def zoom_to(self, scale, anchor=None):
+        """拡大率を指定した値にする (1.0 で等倍表示)"""
+        return self.zoom(scale / self.scale, anchor)
+
+    def pan(self, dx, dy):
+        """
+        表示を表示座標で (dx, dy) だけ動かす
+
+        Returns:
+            表示範囲が変わった場合は True
+        """
+        before = self.offset
+        self.offset = (self.offset[0] + dx, self.offset[1] + dy)
+        self._clamp()
+        return self.offset != before
+
+    def to_image(self, point):
+        """表示座標を画像座標 (小数) に変換"""
+        return ((point[0] - self.offset[0]) / self.scale, (point[1] - self.offset[1]) / self.scale)
+
+    def to_display(self, point):
+        """画像座標を表示座標に変換"""
+        return (point[0] * self.scale + self.offset[0], point[1] * self.scale + self.offset[1])
+
+    def to_image_box(self, start, end):
+        """
+        表示座標の2点で指定した矩形を画像座標の矩形に変換 (画像内に制限)
+
+        Args:
+            start: 表示座標 (x, y)
+            end: 表示座標 (x, y)
+
+        Returns:
+            (x1, y1, x2, y2) (整数、右下を含まない)、画像と重ならない場合は None
+        """
+        (ax, ay), (bx, by) = self.to_image(start), self.to_image(end)
+        width, height = self.image_size
+        x1 = max(0, min(width, math.floor(min(ax, bx))))
+        y1 = max(0, min(height, math.floor(min(ay, by))))
+        x2 = max(0, min(width, math.ceil(max(ax, bx))))
+        y2 = max(0, min(height, math.ceil(max(ay, by))))
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return (x1, y1, x2, y2)
+
+    def to_display_box(self, box):
+        """画像座標の矩形を表示座標の矩形に変換"""
+        x1, y1 = self.to_display(box[:2])
+        x2, y2 = self.to_display(box[2:])
+        return (x1, y1, x2, y2)
+
+    def visible_box(self):
+        """表示領域に見えている画像の範囲 (画像座標の小数の矩形)"""
+        width, height = self.image_size
+        x1, y1 = self.to_image((0, 0))
+        x2, y2 = self.to_image(self.view_size)
+        return (max(0.0, x1), max(0.0, y1), min(float(width), x2), min(float(height), y2))
+
+    def render_region(self):
+        """
+        表示に必要な画像の範囲と、その描画サイズ・描画位置を返す
+
+        Image.resize(size, box=範囲) で見えている部分だけを縮小・拡大して描画できる
+
+        Returns:
+            (画像座標の範囲, 描画サイズ (width, height), 描画位置の表示座標 (x, y)) のタプル
+        """
+        box = self.visible_box()
+        dx1, dy1 = self.to_display(box[:2])
+        dx2, dy2 = self.to_display(box[2:])
+        size = (max(1, round(dx2 - dx1)), max(1, round(dy2 - dy1)))
+        return box, size, (round(dx1), round(dy1))
+
+    def _clamp(self):
+        """画像が表示領域からはみ出さないようにオフセットを制限"""
+        if self.image_size is None:
+            return
+        offset = []
+        for axis in (0, 1):
+            scaled = self.image_size[axis] * self.scale
+            view = self.view_size[axis]
+            if scaled <= view:
+                # 表示領域より小さい方向は動かさない
+                offset.append((view - scaled) / 2 if self.center else 0.0)
+            else:
+                offset.append(min(0.0, max(view - scaled, self.offset[axis])))
+        self.offset = tuple(offset)